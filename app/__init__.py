@@ -22,6 +22,13 @@ def create_app(config_name='default'):
     # 确保上传目录存在
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
+    # 按配置在启动时创建对象存储的存储桶
+    if app.config.get('STORAGE_CREATE_BUCKET'):
+        from app.utils.storage import create_storage
+        storage = create_storage(app.config)
+        storage.ensure_bucket()
+        app.extensions['storage'] = storage
+    
     # 初始化扩展
     db.init_app(app)
     Migrate(app, db)
@@ -31,6 +38,10 @@ def create_app(config_name='default'):
     # 导入模型 - 放在这里避免循环导入
     from app.models import User, Course, Homework, Submission, Feedback
     
+    # 注册课程修订号的刷新监听，课程数据变化时使缓存失效；成绩变化时重新计算总评；
+    # 新提交和新反馈在提交事务后发布事件
+    from app.utils import course_cache, final_grades, events  # noqa: F401
+    
     # 注册蓝图
     from app.api.auth import auth as auth_blueprint
     app.register_blueprint(auth_blueprint, url_prefix='/api/auth')
@@ -47,9 +58,21 @@ def create_app(config_name='default'):
     from app.api.feedback import feedback as feedback_blueprint
     app.register_blueprint(feedback_blueprint, url_prefix='/api/feedback')
     
+    from app.api.grading import grading as grading_blueprint
+    app.register_blueprint(grading_blueprint, url_prefix='/api/grading')
+    
+    from app.api.events import events as events_blueprint
+    app.register_blueprint(events_blueprint, url_prefix='/api/events')
+    
     from app.api.users import users as users_blueprint
     app.register_blueprint(users_blueprint, url_prefix='/api/users')
     
+    from app.api.uploads import uploads as uploads_blueprint
+    app.register_blueprint(uploads_blueprint, url_prefix='/api/uploads')
+    
+    from app.api.files import files as files_blueprint
+    app.register_blueprint(files_blueprint, url_prefix='/api/files')
+    
     from app.api.wordpress import wordpress as wordpress_blueprint
     app.register_blueprint(wordpress_blueprint, url_prefix='/api/wordpress')
     
@@ -1,9 +1,17 @@
 # app/api/courses.py
-from flask import Blueprint, request, jsonify, current_app
+from urllib.parse import quote
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+from sqlalchemy.exc import IntegrityError
 from app import db
-from app.models import Course, User, student_courses
-from app.utils.auth import token_required, teacher_required, admin_required
-from app.utils.file_handler import save_file, delete_file
+from app.models import Course, User, FinalGrade, student_courses
+from app.utils.auth import token_required, teacher_required, admin_required, login_or_token_required
+from app.utils.permissions import is_course_teacher
+from app.utils.gradebook import gradebook_csv, gradebook_xlsx, gradebook_matrix
+from app.utils.analytics import course_analytics
+from app.utils.final_grades import refresh_stale_final_grades
+from app.utils.validators import validate_integer, validate_float
+from app.utils.course_cache import cached_course_data
+from app.utils.file_handler import save_file, delete_file, path_from_url
 
 courses = Blueprint('courses', __name__)
 
@@ -80,7 +88,10 @@ def create_course(current_user):
     if 'cover_image' in request.files:
         cover_image = request.files['cover_image']
         if cover_image.filename:
-            file_info = save_file(cover_image, 'image')
+            try:
+                file_info = save_file(cover_image, 'image', public=True, owner_id=current_user.id)
+            except ValueError as e:
+                return jsonify({'message': str(e)}), 400
             if file_info:
                 course.cover_image = file_info['url']
     
@@ -154,18 +165,34 @@ def update_course(current_user, course_id):
     if 'end_date' in data:
         course.end_date = data['end_date'] or None
     
+    # 总评规则
+    if 'drop_lowest' in data:
+        if not validate_integer(data['drop_lowest'], min_value=0):
+            return jsonify({'message': '去掉最低分的作业数必须是非负整数'}), 400
+        course.drop_lowest = int(data['drop_lowest'])
+    
+    for field in ('late_penalty_per_day', 'late_penalty_max'):
+        if field in data:
+            if not validate_float(data[field], min_value=0, max_value=100):
+                return jsonify({'message': '迟交扣分必须在0到100之间'}), 400
+            setattr(course, field, float(data[field]))
+    
     # 处理封面图片
     if 'cover_image' in request.files:
         cover_image = request.files['cover_image']
         if cover_image.filename:
-            # 删除旧图片
-            if course.cover_image:
-                old_path = course.cover_image.replace('/static/uploads/', '')
-                delete_file(old_path)
+            # 保存新图片，图片无效时保留旧图片
+            try:
+                file_info = save_file(cover_image, 'image', public=True, owner_id=current_user.id)
+            except ValueError as e:
+                return jsonify({'message': str(e)}), 400
             
-            # 保存新图片
-            file_info = save_file(cover_image, 'image')
             if file_info:
+                # 删除旧图片
+                if course.cover_image:
+                    old_path = path_from_url(course.cover_image)
+                    if old_path:
+                        delete_file(old_path)
                 course.cover_image = file_info['url']
     
     db.session.commit()
@@ -218,6 +245,133 @@ def get_course_students(current_user, course_id):
     }), 200
 
 
+def _cached_course_response(name, course_id, compute):
+    """返回按课程缓存的计算结果，响应带有以修订号生成的ETag，未变化时返回304"""
+    data, revision = cached_course_data(name, course_id, lambda: compute(course_id))
+    
+    etag = f"{name}-{course_id}-{revision}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify({'course_id': course_id, 'revision': revision, **data})
+    response.set_etag(etag)
+    # 允许缓存，但每次使用前需向服务器验证
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@courses.route('/<int:course_id>/gradebook', methods=['GET'])
+@login_or_token_required
+def get_gradebook(current_user, course_id):
+    """获取课程成绩矩阵（教师）
+    
+    矩阵按行优先展开为列数组，结果按课程缓存，课程数据变化后重新计算。
+    """
+    # 查找课程
+    course = Course.query.get(course_id)
+    if not course:
+        return jsonify({'message': '课程不存在'}), 404
+    
+    # 确认是该课程的教师
+    if not is_course_teacher(current_user, course_id):
+        return jsonify({'message': '您不是该课程的教师'}), 403
+    
+    return _cached_course_response('gradebook', course.id, gradebook_matrix)
+
+
+@courses.route('/<int:course_id>/analytics', methods=['GET'])
+@login_or_token_required
+def get_course_analytics(current_user, course_id):
+    """获取课程成绩分析（教师）
+    
+    包括课程和各作业的分数分布、直方图，学生的z分数、百分位等级和成绩趋势。
+    结果按课程缓存，反馈的创建和修改会使缓存失效。
+    """
+    # 查找课程
+    course = Course.query.get(course_id)
+    if not course:
+        return jsonify({'message': '课程不存在'}), 404
+    
+    # 确认是该课程的教师
+    if not is_course_teacher(current_user, course_id):
+        return jsonify({'message': '您不是该课程的教师'}), 403
+    
+    return _cached_course_response('analytics', course.id, course_analytics)
+
+
+@courses.route('/<int:course_id>/final-grades', methods=['GET'])
+@token_required
+def get_final_grades(current_user, course_id):
+    """获取课程总评成绩
+    
+    教师获取全部学生的总评，学生只能获取自己的。成绩变化时只标记总评过期，
+    读取时重新计算被标记的学生；有作业到了截止时间（未提交的作业改记0分）后
+    重新计算整个课程。
+    """
+    # 查找课程
+    course = Course.query.get(course_id)
+    if not course:
+        return jsonify({'message': '课程不存在'}), 404
+    
+    query = FinalGrade.query.filter_by(course_id=course.id)
+    if current_user.is_student():
+        if current_user not in course.students:
+            return jsonify({'message': '您不是该课程的学生'}), 403
+        query = query.filter_by(student_id=current_user.id)
+    elif not is_course_teacher(current_user, course_id):
+        return jsonify({'message': '您不是该课程的教师'}), 403
+    
+    try:
+        if refresh_stale_final_grades(course.id):
+            db.session.commit()
+    except IntegrityError:
+        # 并发的请求同时写入了总评，使用对方的结果
+        db.session.rollback()
+    
+    return jsonify({
+        'grading_policy': course.to_dict()['grading_policy'],
+        'final_grades': [grade.to_dict() for grade in query.order_by(FinalGrade.student_id)]
+    }), 200
+
+
+# 成绩册导出格式：(生成函数, MIME类型)
+GRADEBOOK_FORMATS = {
+    'csv': (gradebook_csv, 'text/csv'),
+    'xlsx': (gradebook_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+}
+
+
+@courses.route('/<int:course_id>/gradebook.<string:fmt>', methods=['GET'])
+@login_or_token_required
+def export_gradebook(current_user, course_id, fmt):
+    """流式导出课程成绩册（教师）
+    
+    每个选课学生一行，每个作业一列，为该学生最新提交的最新反馈分数。
+    """
+    if fmt not in GRADEBOOK_FORMATS:
+        return jsonify({'message': '不支持的导出格式'}), 404
+    
+    # 查找课程
+    course = Course.query.get(course_id)
+    if not course:
+        return jsonify({'message': '课程不存在'}), 404
+    
+    # 确认是该课程的教师
+    if not is_course_teacher(current_user, course_id):
+        return jsonify({'message': '您不是该课程的教师'}), 403
+    
+    generate, mimetype = GRADEBOOK_FORMATS[fmt]
+    response = Response(stream_with_context(generate(course.id)), mimetype=mimetype)
+    response.headers['Content-Disposition'] = (
+        f"attachment; filename=\"gradebook-{course.id}.{fmt}\"; "
+        f"filename*=UTF-8''{quote(course.name)}.{fmt}"
+    )
+    response.headers['Cache-Control'] = 'no-store'
+    # 关闭nginx缓冲，数据生成后立即发送
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @courses.route('/<int:course_id>/students', methods=['POST'])
 @teacher_required
 def add_course_student(current_user, course_id):
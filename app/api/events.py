@@ -0,0 +1,92 @@
+# app/api/events.py
+import json
+import queue
+import random
+import time
+from flask import Blueprint, request, jsonify, current_app, Response
+from app import db
+from app.models import Course
+from app.utils.auth import login_or_token_required
+from app.utils.permissions import is_course_teacher
+from app.utils.events import hub, Subscription, ensure_listener
+
+events = Blueprint('events', __name__)
+
+
+def _format_event(evt):
+    return f"event: {evt['type']}\ndata: {json.dumps(evt, ensure_ascii=False)}\n\n".encode('utf-8')
+
+
+def _event_stream(subscription, heartbeat, max_seconds):
+    """逐个发送订阅到的事件，空闲时发送注释行保持连接
+
+    连接在 max_seconds 后主动关闭，EventSource会按retry自动重连，
+    避免长连接一直占用工作线程。
+    """
+    try:
+        yield b'retry: 3000\n\n'
+        deadline = time.monotonic() + max_seconds
+        while time.monotonic() < deadline:
+            try:
+                evt = subscription.queue.get(timeout=min(heartbeat, max(deadline - time.monotonic(), 0.1)))
+            except queue.Empty:
+                yield b': keepalive\n\n'
+                continue
+            yield _format_event(evt)
+    finally:
+        hub.unsubscribe(subscription)
+
+
+@events.route('/stream', methods=['GET'])
+@login_or_token_required
+def stream_events(current_user):
+    """新提交和新反馈的事件流（Server-Sent Events）
+    
+    学生收到自己的提交和收到的反馈，教师收到所教课程的提交和反馈，
+    管理员收到所有课程的事件；?course_id= 只接收该课程的事件。
+    浏览器用 EventSource 连接，依靠登录会话认证。
+    每个worker最多保持 SSE_MAX_STREAMS 个连接，超出时返回503。
+    """
+    course_id = request.args.get('course_id', type=int)
+    
+    if course_id is not None:
+        course = Course.query.get(course_id)
+        if not course:
+            return jsonify({'message': '课程不存在'}), 404
+    
+    if current_user.is_student():
+        subscription = Subscription(current_user.id, only_course=course_id)
+    elif course_id is not None:
+        if not is_course_teacher(current_user, course_id):
+            return jsonify({'message': '您不是该课程的教师'}), 403
+        subscription = Subscription(current_user.id, course_ids=[course_id], only_course=course_id)
+    elif current_user.is_admin():
+        subscription = Subscription(current_user.id, all_courses=True)
+    else:
+        course_ids = [cid for (cid,) in db.session.query(Course.id).filter_by(teacher_id=current_user.id)]
+        subscription = Subscription(current_user.id, course_ids=course_ids)
+    
+    ensure_listener()
+    if hub.subscribe(subscription, limit=current_app.config['SSE_MAX_STREAMS']) is None:
+        # 连接数已满，随机推迟重连时间，避免客户端同时重连
+        retry_ms = random.randint(5000, 15000)
+        response = Response(f'retry: {retry_ms}\n\n', status=503, mimetype='text/event-stream')
+        response.headers['Retry-After'] = str(retry_ms // 1000)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    
+    stream = _event_stream(
+        subscription,
+        current_app.config['SSE_HEARTBEAT_SECONDS'],
+        current_app.config['SSE_MAX_SECONDS']
+    )
+    # 事件流不访问数据库，提前归还连接
+    db.session.remove()
+    
+    response = Response(stream, mimetype='text/event-stream')
+    # 客户端在收到第一个事件前断开时生成器不会执行finally，关闭响应时也释放订阅
+    response.call_on_close(lambda: hub.unsubscribe(subscription))
+    response.headers['Cache-Control'] = 'no-cache'
+    # 关闭nginx缓冲，事件产生后立即发送
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
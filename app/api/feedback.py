@@ -3,13 +3,21 @@ from flask import Blueprint, request, jsonify, current_app
 from app import db
 from app.models import Submission, Feedback, Homework, Course
 from app.utils.auth import token_required, teacher_required
-from app.utils.file_handler import save_file
+from app.utils.file_handler import (
+    save_file, save_files, register_uploaded_file, link_uploads, UploadStateError,
+    release_linked_uploads, delete_stored_files
+)
+from app.utils.quota import check_quota
+from app.utils.idempotency import idempotent
+from app.utils.grading_queue import release_claims
+from app.utils.bulk_feedback import create_bulk_feedback, BULK_FEEDBACK_MAX
 import json
 
 feedback = Blueprint('feedback', __name__)
 
 @feedback.route('/', methods=['POST'])
 @teacher_required
+@idempotent
 def create_feedback(current_user):
     """创建新的作业反馈（教师）"""
     # 获取提交ID
@@ -28,6 +36,11 @@ def create_feedback(current_user):
     if course.teacher_id != current_user.id and not current_user.is_admin():
         return jsonify({'message': '您不是该课程的教师'}), 403
     
+    # 检查课程存储配额
+    error = check_quota('course', course.id, request.content_length)
+    if error:
+        return jsonify({'message': error}), 413
+    
     # 获取反馈内容
     score = request.form.get('score')
     comments = request.form.get('comments', '')
@@ -45,26 +58,34 @@ def create_feedback(current_user):
     # 处理上传的文件
     content_data = {}
     
-    # 处理图像上传
-    if 'feedback_images' in request.files:
-        images = request.files.getlist('feedback_images')
-        image_data = []
-        for img in images:
-            if img.filename:
-                file_info = save_file(img, 'image')
-                if file_info:
-                    image_data.append(file_info)
+    try:
+        # 处理已直传到存储的文件
+        image_data = [
+            register_uploaded_file(upload_token, current_user.id, 'image')
+            for upload_token in request.form.getlist('feedback_image_tokens')
+        ]
+        
+        upload_token = request.form.get('feedback_audio_token')
+        if upload_token:
+            content_data['audio'] = register_uploaded_file(upload_token, current_user.id, 'audio')
+        
+        # 并行处理图像上传
+        image_data.extend(save_files(request.files.getlist('feedback_images'), 'image', owner_id=current_user.id))
         
         if image_data:
             content_data['images'] = image_data
-    
-    # 处理音频上传
-    if 'feedback_audio' in request.files:
-        audio = request.files['feedback_audio']
-        if audio.filename:
-            file_info = save_file(audio, 'audio')
-            if file_info:
-                content_data['audio'] = file_info
+        
+        # 处理音频上传
+        if 'feedback_audio' in request.files:
+            audio = request.files['feedback_audio']
+            if audio.filename:
+                file_info = save_file(audio, 'audio', owner_id=current_user.id)
+                if file_info:
+                    content_data['audio'] = file_info
+    except UploadStateError as e:
+        return jsonify({'message': str(e)}), e.status_code
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     
     # 处理文本内容
     text_content = request.form.get('text_content', '')
@@ -90,6 +111,10 @@ def create_feedback(current_user):
         submission.status = 'graded'
     
     db.session.add(feedback)
+    db.session.flush()
+    link_uploads(content_data, feedback_id=feedback.id, course_id=course.id)
+    # 已批改，释放批改队列中的认领
+    release_claims([submission.id])
     db.session.commit()
     
     return jsonify({
@@ -98,6 +123,35 @@ def create_feedback(current_user):
     }), 201
 
 
+@feedback.route('/bulk', methods=['POST'])
+@teacher_required
+@idempotent
+def create_feedback_bulk(current_user):
+    """批量创建反馈（教师）
+    
+    请求JSON: {"items": [{"submission_id", "score", "comments", "requires_revision", "text_content"}]}，
+    只支持文字反馈。全部反馈在一个事务中写入，逐项返回结果。
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({'message': 'items必须是非空列表'}), 400
+    
+    if len(items) > BULK_FEEDBACK_MAX:
+        return jsonify({'message': f'一次最多批改{BULK_FEEDBACK_MAX}个提交'}), 400
+    
+    results = create_bulk_feedback(current_user, items)
+    db.session.commit()
+    
+    created = sum(1 for result in results if result['status'] == 201)
+    return jsonify({
+        'created': created,
+        'failed': len(results) - created,
+        'results': results
+    }), 200
+
+
 @feedback.route('/<int:feedback_id>', methods=['GET'])
 @token_required
 def get_feedback(current_user, feedback_id):
@@ -221,10 +275,16 @@ def delete_feedback(current_user, feedback_id):
     if feedback.teacher_id != current_user.id and not current_user.is_admin():
         return jsonify({'message': '无权删除该反馈'}), 403
     
+    # 释放反馈关联的文件并扣除存储用量
+    paths = release_linked_uploads(feedback_ids=[feedback.id])
+    
     # 删除反馈
     db.session.delete(feedback)
     db.session.commit()
     
+    # 事务提交后再删除文件，回滚时文件仍然可用
+    delete_stored_files(paths)
+    
     return jsonify({
         'message': '反馈删除成功'
     }), 200
@@ -0,0 +1,191 @@
+# app/api/files.py
+from flask import Blueprint, request, jsonify, Response
+from app.models import Submission, Feedback
+from app.utils.auth import login_or_token_required
+from app.utils.file_handler import iter_content_files
+from app.utils.file_delivery import send_stored_file
+from app.utils.image_derivatives import ensure_derivative
+from app.utils.waveform import load_peaks, PEAKS_FORMAT
+from app.utils.permissions import can_view_submission, can_view_feedback
+
+files = Blueprint('files', __name__)
+
+def _find_file(content, file_path):
+    """在内容中查找路径对应的文件元数据，未引用的路径返回None"""
+    for info in iter_content_files(content):
+        if info.get('path') == file_path:
+            return info
+    return None
+
+
+def _send_audio(audio):
+    """发送录音，默认发送紧凑版本，?original=1时发送原文件"""
+    compact = audio.get('compact')
+    if compact and request.args.get('original') != '1':
+        return send_stored_file(compact['path'], mimetype=compact['mime_type'])
+    return send_stored_file(audio['path'], mimetype=audio.get('mime_type'), download_name=audio.get('filename'))
+
+
+def _send_peaks(audio):
+    """返回录音的波形峰值，默认JSON格式，?format=bin返回int8二进制"""
+    try:
+        peaks = load_peaks(audio)
+    except Exception as e:
+        return jsonify({'message': f'无法读取波形数据: {e}'}), 500
+    
+    if request.args.get('format') == 'bin':
+        response = Response(peaks.tobytes(), mimetype='application/octet-stream')
+        response.headers['X-Peaks-Format'] = PEAKS_FORMAT
+    else:
+        response = jsonify({
+            'format': PEAKS_FORMAT,
+            'buckets': peaks.size // 2,
+            'duration': audio.get('duration'),
+            'min': peaks[0::2].tolist(),
+            'max': peaks[1::2].tolist()
+        })
+    
+    response.headers['Cache-Control'] = 'private, max-age=86400'
+    return response
+
+
+def _send_content_file(info, file_path):
+    """发送内容中的文件，指定variant参数时发送对应的WebP衍生图"""
+    variant = request.args.get('variant')
+    if variant:
+        if not info.get('width'):
+            return jsonify({'message': '只有图像文件支持衍生图'}), 400
+        try:
+            derivative_path = ensure_derivative(info, variant)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        return send_stored_file(derivative_path, mimetype='image/webp')
+    
+    return send_stored_file(
+        file_path,
+        mimetype=info.get('mime_type'),
+        download_name=info.get('filename'),
+        as_attachment=request.args.get('download') == '1'
+    )
+
+
+@files.route('/submissions/<int:submission_id>/<path:file_path>', methods=['GET'])
+@login_or_token_required
+def submission_file(current_user, submission_id, file_path):
+    """下载提交中的文件（学生本人、课程教师或管理员）"""
+    # 查找提交
+    submission = Submission.query.get(submission_id)
+    if not submission:
+        return jsonify({'message': '提交不存在'}), 404
+    
+    # 权限检查
+    if not can_view_submission(current_user, submission):
+        return jsonify({'message': '无权查看该提交'}), 403
+    
+    # 只允许下载该提交引用的文件
+    info = _find_file(submission.content_data, file_path)
+    if not info:
+        return jsonify({'message': '文件不存在'}), 404
+    
+    return _send_content_file(info, file_path)
+
+
+@files.route('/feedback/<int:feedback_id>/<path:file_path>', methods=['GET'])
+@login_or_token_required
+def feedback_file(current_user, feedback_id, file_path):
+    """下载反馈中的文件（提交学生、课程教师或管理员）"""
+    # 查找反馈
+    feedback = Feedback.query.get(feedback_id)
+    if not feedback:
+        return jsonify({'message': '反馈不存在'}), 404
+    
+    # 权限检查
+    if not can_view_feedback(current_user, feedback):
+        return jsonify({'message': '无权查看该反馈'}), 403
+    
+    # 只允许下载该反馈引用的文件
+    info = _find_file(feedback.content_data, file_path)
+    if not info:
+        return jsonify({'message': '文件不存在'}), 404
+    
+    return _send_content_file(info, file_path)
+
+
+@files.route('/submissions/<int:submission_id>/audio', methods=['GET'])
+@login_or_token_required
+def stream_submission_audio(current_user, submission_id):
+    """播放提交的录音，支持Range请求以便拖动进度"""
+    # 查找提交
+    submission = Submission.query.get(submission_id)
+    if not submission:
+        return jsonify({'message': '提交不存在'}), 404
+    
+    # 权限检查
+    if not can_view_submission(current_user, submission):
+        return jsonify({'message': '无权查看该提交'}), 403
+    
+    audio = submission.content_data.get('audio')
+    if not audio:
+        return jsonify({'message': '该提交没有录音'}), 404
+    
+    return _send_audio(audio)
+
+
+@files.route('/feedback/<int:feedback_id>/audio', methods=['GET'])
+@login_or_token_required
+def stream_feedback_audio(current_user, feedback_id):
+    """播放反馈的录音，支持Range请求以便拖动进度"""
+    # 查找反馈
+    feedback = Feedback.query.get(feedback_id)
+    if not feedback:
+        return jsonify({'message': '反馈不存在'}), 404
+    
+    # 权限检查
+    if not can_view_feedback(current_user, feedback):
+        return jsonify({'message': '无权查看该反馈'}), 403
+    
+    audio = feedback.content_data.get('audio')
+    if not audio:
+        return jsonify({'message': '该反馈没有录音'}), 404
+    
+    return _send_audio(audio)
+
+
+@files.route('/submissions/<int:submission_id>/audio/peaks', methods=['GET'])
+@login_or_token_required
+def submission_audio_peaks(current_user, submission_id):
+    """获取提交录音的波形峰值"""
+    # 查找提交
+    submission = Submission.query.get(submission_id)
+    if not submission:
+        return jsonify({'message': '提交不存在'}), 404
+    
+    # 权限检查
+    if not can_view_submission(current_user, submission):
+        return jsonify({'message': '无权查看该提交'}), 403
+    
+    audio = submission.content_data.get('audio')
+    if not audio:
+        return jsonify({'message': '该提交没有录音'}), 404
+    
+    return _send_peaks(audio)
+
+
+@files.route('/feedback/<int:feedback_id>/audio/peaks', methods=['GET'])
+@login_or_token_required
+def feedback_audio_peaks(current_user, feedback_id):
+    """获取反馈录音的波形峰值"""
+    # 查找反馈
+    feedback = Feedback.query.get(feedback_id)
+    if not feedback:
+        return jsonify({'message': '反馈不存在'}), 404
+    
+    # 权限检查
+    if not can_view_feedback(current_user, feedback):
+        return jsonify({'message': '无权查看该反馈'}), 403
+    
+    audio = feedback.content_data.get('audio')
+    if not audio:
+        return jsonify({'message': '该反馈没有录音'}), 404
+    
+    return _send_peaks(audio)
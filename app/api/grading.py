@@ -0,0 +1,105 @@
+# app/api/grading.py
+from datetime import datetime
+from flask import Blueprint, request, jsonify, current_app
+from app import db
+from app.models import Course, GradingClaim
+from app.utils.auth import teacher_required
+from app.utils.permissions import is_course_teacher
+from app.utils.grading_queue import claim_submissions, active_claims, renew_claim, release_claims
+
+grading = Blueprint('grading', __name__)
+
+
+def _claim_dict(claim, submission):
+    data = claim.to_dict()
+    data['submission'] = submission.to_dict()
+    return data
+
+
+@grading.route('/claims', methods=['POST'])
+@teacher_required
+def create_claims(current_user):
+    """从批改队列认领下一批未批改的提交（教师）
+    
+    请求JSON: course_id（必填）、count（默认5）、homework_id（可选，只认领该作业）。
+    多名教师可同时认领，不会拿到同一个提交。
+    """
+    data = request.get_json() or {}
+    course_id = data.get('course_id')
+    homework_id = data.get('homework_id')
+    
+    if not course_id:
+        return jsonify({'message': '课程ID为必填项'}), 400
+    
+    try:
+        count = int(data.get('count', 5))
+    except (TypeError, ValueError):
+        return jsonify({'message': '认领数量必须是整数'}), 400
+    
+    max_count = current_app.config['GRADING_CLAIM_MAX']
+    if count < 1 or count > max_count:
+        return jsonify({'message': f'认领数量必须在1到{max_count}之间'}), 400
+    
+    # 查找课程
+    course = Course.query.get(course_id)
+    if not course:
+        return jsonify({'message': '课程不存在'}), 404
+    
+    # 确认是该课程的教师
+    if not is_course_teacher(current_user, course.id):
+        return jsonify({'message': '您不是该课程的教师'}), 403
+    
+    claims = claim_submissions(current_user.id, course.id, count, homework_id=homework_id)
+    db.session.commit()
+    
+    return jsonify({
+        'claims': [_claim_dict(claim, submission) for claim, submission in claims]
+    }), 200
+
+
+@grading.route('/claims', methods=['GET'])
+@teacher_required
+def get_claims(current_user):
+    """获取自己尚未过期的认领（教师），可按 course_id 过滤"""
+    course_id = request.args.get('course_id', type=int)
+    
+    return jsonify({
+        'claims': [_claim_dict(claim, submission) for claim, submission in active_claims(current_user.id, course_id)]
+    }), 200
+
+
+def _get_own_claim(current_user, submission_id):
+    claim = GradingClaim.query.get(submission_id)
+    if not claim or claim.expires_at <= datetime.utcnow():
+        return None, (jsonify({'message': '认领不存在或已过期'}), 404)
+    if claim.grader_id != current_user.id and not current_user.is_admin():
+        return None, (jsonify({'message': '这不是您的认领'}), 403)
+    return claim, None
+
+
+@grading.route('/claims/<int:submission_id>/renew', methods=['POST'])
+@teacher_required
+def renew(current_user, submission_id):
+    """延长认领的有效期（教师）"""
+    claim, error = _get_own_claim(current_user, submission_id)
+    if error:
+        return error
+    
+    renew_claim(claim)
+    db.session.commit()
+    
+    return jsonify({'claim': claim.to_dict()}), 200
+
+
+@grading.route('/claims/<int:submission_id>', methods=['DELETE'])
+@teacher_required
+def release(current_user, submission_id):
+    """放弃认领，提交回到批改队列（教师）"""
+    claim, error = _get_own_claim(current_user, submission_id)
+    if error:
+        return error
+    
+    release_claims([claim.submission_id])
+    db.session.commit()
+    
+    return jsonify({'message': '已放弃认领'}), 200
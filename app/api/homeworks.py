@@ -1,8 +1,15 @@
 # app/api/homeworks.py
-from flask import Blueprint, request, jsonify, current_app
+from urllib.parse import quote
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from app import db
-from app.models import Homework, Course, Submission
-from app.utils.auth import token_required, teacher_required
+from app.models import Homework, Course, Submission, User
+from app.utils.auth import token_required, teacher_required, login_or_token_required
+from app.utils.permissions import is_course_teacher
+from app.utils.query_helpers import latest_submissions_subquery
+from app.utils.statistics import homework_statistics
+from app.utils.validators import validate_float
+from app.utils.submission_export import export_entries
+from app.utils.zipstream import zip_stream
 from datetime import datetime
 
 homeworks = Blueprint('homeworks', __name__)
@@ -65,6 +72,7 @@ def create_homework(current_user):
     course_id = data.get('course_id')
     due_date = data.get('due_date')
     assignment_type = data.get('assignment_type')
+    weight = data.get('weight', 1)
     
     # 验证必填字段
     if not title or not course_id or not assignment_type:
@@ -74,6 +82,10 @@ def create_homework(current_user):
     if assignment_type not in ['essay', 'oral']:
         return jsonify({'message': '不支持的作业类型'}), 400
     
+    # 验证总评权重
+    if not validate_float(weight, min_value=0):
+        return jsonify({'message': '作业权重必须是非负数'}), 400
+    
     # 查找课程
     course = Course.query.get(course_id)
     if not course:
@@ -88,7 +100,8 @@ def create_homework(current_user):
         title=title,
         description=description,
         course_id=course_id,
-        assignment_type=assignment_type
+        assignment_type=assignment_type,
+        weight=float(weight)
     )
     
     # 处理可选字段
@@ -200,6 +213,11 @@ def update_homework(current_user, homework_id):
         else:
             homework.due_date = None
     
+    if 'weight' in data:
+        if not validate_float(data['weight'], min_value=0):
+            return jsonify({'message': '作业权重必须是非负数'}), 400
+        homework.weight = float(data['weight'])
+    
     # 不允许修改作业类型，以防影响已有提交
     
     db.session.commit()
@@ -244,7 +262,10 @@ def delete_homework(current_user, homework_id):
 @homeworks.route('/<int:homework_id>/submissions', methods=['GET'])
 @teacher_required
 def get_homework_submissions(current_user, homework_id):
-    """获取作业的所有提交（教师）"""
+    """获取作业的提交（教师）
+    
+    按学生分页，默认每个学生只返回最新版本，?all_versions=1 返回所有版本（按版本倒序）。
+    """
     # 查找作业
     homework = Homework.query.get(homework_id)
     if not homework:
@@ -255,35 +276,81 @@ def get_homework_submissions(current_user, homework_id):
     if course.teacher_id != current_user.id and not current_user.is_admin():
         return jsonify({'message': '您不是该课程的教师'}), 403
     
-    # 查询提交
-    submissions = Submission.query.filter_by(homework_id=homework_id).all()
+    all_versions = request.args.get('all_versions', '0') in ('1', 'true')
+    
+    # 按学生分页，学生信息随分页查询一并取出
+    submitted = db.session.query(Submission.student_id).filter_by(homework_id=homework_id)
+    page = request.args.get('page', 1, type=int)
+    per_page = min(request.args.get('per_page', 50, type=int), 200)
+    pagination = User.query.filter(User.id.in_(submitted)) \
+        .order_by(User.username, User.id) \
+        .paginate(page=page, per_page=per_page)
+    students = pagination.items
+    
+    # 查询本页学生的提交，分组和排序在数据库中完成
+    query = Submission.query.filter(
+        Submission.homework_id == homework_id,
+        Submission.student_id.in_([student.id for student in students])
+    )
+    if not all_versions:
+        latest = latest_submissions_subquery(homework_id=homework_id)
+        query = query.join(latest, latest.c.id == Submission.id)
+    submissions = query.order_by(Submission.student_id, Submission.version.desc()).all()
     
-    # 按学生分组
-    submissions_by_student = {}
+    submissions_by_student = {student.id: [] for student in students}
     for submission in submissions:
-        student_id = submission.student_id
-        if student_id not in submissions_by_student:
-            submissions_by_student[student_id] = []
-        
-        submissions_by_student[student_id].append(submission.to_dict())
-    
-    # 对每个学生的提交按版本排序
-    for student_id, student_submissions in submissions_by_student.items():
-        submissions_by_student[student_id] = sorted(
-            student_submissions,
-            key=lambda x: x['version'],
-            reverse=True
-        )
+        submissions_by_student[submission.student_id].append(submission.to_dict())
     
     return jsonify({
-        'submissions_by_student': submissions_by_student
+        'students': [
+            {'id': student.id, 'username': student.username, 'email': student.email}
+            for student in students
+        ],
+        'submissions_by_student': submissions_by_student,
+        'total': pagination.total,
+        'pages': pagination.pages,
+        'current_page': page
     }), 200
 
 
+@homeworks.route('/<int:homework_id>/export.zip', methods=['GET'])
+@login_or_token_required
+def export_homework_submissions(current_user, homework_id):
+    """流式导出作业的所有提交文件（教师）
+    
+    默认每个学生只导出最新版本，?versions=all 导出所有版本。
+    压缩包边生成边发送，不使用临时文件。
+    """
+    # 查找作业
+    homework = Homework.query.get(homework_id)
+    if not homework:
+        return jsonify({'message': '作业不存在'}), 404
+    
+    # 确认是该课程的教师
+    if not is_course_teacher(current_user, homework.course_id):
+        return jsonify({'message': '您不是该课程的教师'}), 403
+    
+    latest_only = request.args.get('versions', 'latest') != 'all'
+    stream = zip_stream(export_entries(homework.id, latest_only))
+    
+    filename = f"homework-{homework.id}{'' if latest_only else '-all'}.zip"
+    response = Response(stream_with_context(stream), mimetype='application/zip')
+    response.headers['Content-Disposition'] = (
+        f"attachment; filename=\"{filename}\"; filename*=UTF-8''{quote(homework.title)}.zip"
+    )
+    response.headers['Cache-Control'] = 'no-store'
+    # 关闭nginx缓冲，数据生成后立即发送
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @homeworks.route('/<int:homework_id>/statistics', methods=['GET'])
 @teacher_required
 def get_homework_statistics(current_user, homework_id):
-    """获取作业统计信息（教师）"""
+    """获取作业统计信息（教师）
+    
+    每个选课学生只按最新版本计数，同时返回分数分布（平均数、中位数、p10/p90）。
+    """
     # 查找作业
     homework = Homework.query.get(homework_id)
     if not homework:
@@ -294,37 +361,7 @@ def get_homework_statistics(current_user, homework_id):
     if course.teacher_id != current_user.id and not current_user.is_admin():
         return jsonify({'message': '您不是该课程的教师'}), 403
     
-    # 统计信息
-    total_students = course.students.count()
-    submissions = Submission.query.filter_by(homework_id=homework_id).all()
-    
-    # 按提交状态分组
-    status_counts = {
-        'submitted': 0,
-        'graded': 0,
-        'needs_revision': 0,
-        'revised': 0,
-        'not_submitted': 0
-    }
-    
-    # 提交学生ID集合
-    submitted_student_ids = set()
-    
-    for submission in submissions:
-        submitted_student_ids.add(submission.student_id)
-        status_counts[submission.status] += 1
-    
-    status_counts['not_submitted'] = total_students - len(submitted_student_ids)
-    
-    # 计算提交率
-    submission_rate = len(submitted_student_ids) / total_students if total_students > 0 else 0
-    
     return jsonify({
         'homework': homework.to_dict(),
-        'statistics': {
-            'total_students': total_students,
-            'submitted_students': len(submitted_student_ids),
-            'submission_rate': submission_rate,
-            'status_counts': status_counts
-        }
+        'statistics': homework_statistics(homework)
     }), 200
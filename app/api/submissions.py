@@ -3,7 +3,13 @@ from flask import Blueprint, request, jsonify, current_app
 from app import db
 from app.models import Submission, Homework, User, Course
 from app.utils.auth import token_required, student_required, teacher_required
-from app.utils.file_handler import save_file
+from app.utils.file_handler import (
+    save_file, save_files, register_uploaded_file, link_uploads, UploadStateError,
+    release_linked_uploads, delete_stored_files
+)
+from app.utils.quota import quota_required, check_quota
+from app.utils.idempotency import idempotent
+from app.utils.versioning import add_submission
 import json
 from sqlalchemy import and_, or_
 
@@ -11,6 +17,8 @@ submissions = Blueprint('submissions', __name__)
 
 @submissions.route('/', methods=['POST'])
 @student_required
+@idempotent
+@quota_required
 def create_submission(current_user):
     """创建新作业提交"""
     # 获取作业ID
@@ -28,16 +36,10 @@ def create_submission(current_user):
     if current_user not in course.students and not current_user.is_admin():
         return jsonify({'message': '您不是该课程的学生'}), 403
     
-    # 检查之前的提交
-    prev_submission = Submission.query.filter_by(
-        homework_id=homework_id,
-        student_id=current_user.id
-    ).order_by(Submission.version.desc()).first()
-    
-    # 设置版本号
-    version = 1
-    if prev_submission:
-        version = prev_submission.version + 1
+    # 检查课程存储配额
+    error = check_quota('course', course.id, request.content_length)
+    if error:
+        return jsonify({'message': error}), 413
     
     # 获取附加评论
     comment = request.form.get('comment', '')
@@ -46,47 +48,56 @@ def create_submission(current_user):
     content_data = {}
     
     # 根据作业类型处理不同的上传
-    if homework.assignment_type == 'essay':
-        # 处理图像上传
-        if 'essay_images' in request.files:
-            images = request.files.getlist('essay_images')
-            image_data = []
-            for img in images:
-                if img.filename:
-                    file_info = save_file(img, 'image')
-                    if file_info:
-                        image_data.append(file_info)
+    try:
+        if homework.assignment_type == 'essay':
+            # 处理已直传到存储的图像
+            image_data = [
+                register_uploaded_file(upload_token, current_user.id, 'image')
+                for upload_token in request.form.getlist('essay_image_tokens')
+            ]
+            
+            # 并行处理图像上传
+            image_data.extend(save_files(request.files.getlist('essay_images'), 'image', owner_id=current_user.id))
             
             if image_data:
                 content_data['images'] = image_data
-    
-    elif homework.assignment_type == 'oral':
-        # 处理音频上传
-        if 'oral_audio' in request.files:
-            audio = request.files['oral_audio']
-            if audio.filename:
-                file_info = save_file(audio, 'audio')
-                if file_info:
-                    content_data['audio'] = file_info
+        
+        elif homework.assignment_type == 'oral':
+            # 处理已直传到存储的音频
+            upload_token = request.form.get('oral_audio_token')
+            if upload_token:
+                content_data['audio'] = register_uploaded_file(upload_token, current_user.id, 'audio')
+            
+            # 处理音频上传
+            if 'oral_audio' in request.files:
+                audio = request.files['oral_audio']
+                if audio.filename:
+                    file_info = save_file(audio, 'audio', owner_id=current_user.id)
+                    if file_info:
+                        content_data['audio'] = file_info
+    except UploadStateError as e:
+        return jsonify({'message': str(e)}), e.status_code
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     
     # 处理文本内容
     text_content = request.form.get('text_content', '')
     if text_content:
         content_data['text'] = text_content
     
-    # 创建提交记录
+    # 创建提交记录，版本号在插入时分配
     submission = Submission(
         homework_id=homework_id,
         student_id=current_user.id,
         comment=comment,
-        version=version,
         status='submitted'
     )
     
     # 设置内容
     submission.content_data = content_data
     
-    db.session.add(submission)
+    add_submission(submission)
+    link_uploads(content_data, submission_id=submission.id, course_id=homework.course_id)
     db.session.commit()
     
     return jsonify({
@@ -178,6 +189,7 @@ def get_submission(current_user, submission_id):
 
 @submissions.route('/<int:submission_id>', methods=['PUT'])
 @student_required
+@quota_required
 def update_submission(current_user, submission_id):
     """更新作业提交（仅限学生本人）"""
     # 查找提交
@@ -193,37 +205,42 @@ def update_submission(current_user, submission_id):
     if submission.status not in ['submitted', 'revised']:
         return jsonify({'message': '当前状态不允许修改提交'}), 400
     
+    # 获取作业信息
+    homework = Homework.query.get(submission.homework_id)
+    
+    # 检查课程存储配额
+    error = check_quota('course', homework.course_id, request.content_length)
+    if error:
+        return jsonify({'message': error}), 413
+    
     # 获取提交数据
     comment = request.form.get('comment')
     if comment is not None:
         submission.comment = comment
     
-    # 获取作业信息
-    homework = Homework.query.get(submission.homework_id)
     content_data = submission.content_data
     
     # 根据作业类型处理不同的上传
-    if homework.assignment_type == 'essay':
-        # 处理图像上传
-        if 'essay_images' in request.files:
-            images = request.files.getlist('essay_images')
-            image_data = content_data.get('images', [])
-            for img in images:
-                if img.filename:
-                    file_info = save_file(img, 'image')
+    try:
+        if homework.assignment_type == 'essay':
+            # 并行处理图像上传
+            if 'essay_images' in request.files:
+                image_data = content_data.get('images', [])
+                image_data.extend(save_files(request.files.getlist('essay_images'), 'image', owner_id=current_user.id))
+                content_data['images'] = image_data
+        
+        elif homework.assignment_type == 'oral':
+            # 处理音频上传
+            if 'oral_audio' in request.files:
+                audio = request.files['oral_audio']
+                if audio.filename:
+                    file_info = save_file(audio, 'audio', owner_id=current_user.id)
                     if file_info:
-                        image_data.append(file_info)
-            
-            content_data['images'] = image_data
-    
-    elif homework.assignment_type == 'oral':
-        # 处理音频上传
-        if 'oral_audio' in request.files:
-            audio = request.files['oral_audio']
-            if audio.filename:
-                file_info = save_file(audio, 'audio')
-                if file_info:
-                    content_data['audio'] = file_info
+                        content_data['audio'] = file_info
+    except UploadStateError as e:
+        return jsonify({'message': str(e)}), e.status_code
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     
     # 处理文本内容
     text_content = request.form.get('text_content')
@@ -234,6 +251,8 @@ def update_submission(current_user, submission_id):
     submission.content_data = content_data
     submission.status = 'revised'
     
+    db.session.flush()
+    link_uploads(content_data, submission_id=submission.id, course_id=homework.course_id)
     db.session.commit()
     
     return jsonify({
@@ -255,10 +274,17 @@ def delete_submission(current_user, submission_id):
     if not current_user.is_admin() and submission.student_id != current_user.id:
         return jsonify({'message': '无权删除该提交'}), 403
     
+    # 与提交一起删除的还有其反馈，释放两者关联的文件并扣除存储用量
+    feedback_ids = [f.id for f in submission.feedback]
+    paths = release_linked_uploads([submission.id], feedback_ids)
+    
     # 删除提交
     db.session.delete(submission)
     db.session.commit()
     
+    # 事务提交后再删除文件，回滚时文件仍然可用
+    delete_stored_files(paths)
+    
     return jsonify({
         'message': '提交删除成功'
     }), 200
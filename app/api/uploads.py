@@ -0,0 +1,115 @@
+# app/api/uploads.py
+from flask import Blueprint, request, jsonify, current_app
+from sqlalchemy import func
+from app import db
+from app.models import User, Course, Upload, StorageUsage
+from app.utils.auth import token_required, admin_required
+from app.utils.file_handler import create_upload_ticket
+from app.utils.quota import check_quota
+from app.utils.idempotency import idempotent
+from app.utils.storage import get_storage, StorageError
+
+uploads = Blueprint('uploads', __name__)
+
+@uploads.route('/presign', methods=['POST'])
+@token_required
+@idempotent
+def presign_upload(current_user):
+    """获取直传到存储后端的预签名上传地址
+    
+    客户端使用返回的upload_url直接PUT文件，然后在创建提交或反馈时
+    携带upload_token引用该文件，文件内容不经过Flask进程。
+    """
+    data = request.get_json() or {}
+    filename = data.get('filename')
+    file_type = data.get('file_type', 'image')
+    
+    if not filename:
+        return jsonify({'message': '文件名为必填项'}), 400
+    
+    if file_type not in ['image', 'audio']:
+        return jsonify({'message': '不支持的文件类型'}), 400
+    
+    if not get_storage().supports_presigned:
+        return jsonify({'message': '当前存储后端不支持直传'}), 400
+    
+    # 直传不经过Flask，按客户端声明的文件大小检查配额
+    if current_user.is_student():
+        error = check_quota('user', current_user.id, data.get('size'))
+        if error:
+            return jsonify({'message': error}), 413
+    
+    try:
+        ticket = create_upload_ticket(current_user.id, filename, file_type)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    except StorageError as e:
+        current_app.logger.error(f"生成预签名地址失败: {e}")
+        return jsonify({'message': '生成上传地址失败'}), 500
+    
+    return jsonify(ticket), 200
+
+
+@uploads.route('/quota-report', methods=['GET'])
+@admin_required
+def quota_report(current_user):
+    """存储用量报告（管理员）"""
+    limit = request.args.get('limit', 20, type=int)
+    user_quota = current_app.config['USER_STORAGE_QUOTA']
+    course_quota = current_app.config['COURSE_STORAGE_QUOTA']
+    
+    # 用量最高的用户和课程直接读取计数器
+    top_users = db.session.query(StorageUsage, User.username, User.role) \
+        .join(User, User.id == StorageUsage.scope_id) \
+        .filter(StorageUsage.scope == 'user') \
+        .order_by(StorageUsage.bytes.desc()) \
+        .limit(limit) \
+        .all()
+    
+    top_courses = db.session.query(StorageUsage, Course.name) \
+        .join(Course, Course.id == StorageUsage.scope_id) \
+        .filter(StorageUsage.scope == 'course') \
+        .order_by(StorageUsage.bytes.desc()) \
+        .limit(limit) \
+        .all()
+    
+    # 按文件类型和衍生类型汇总
+    by_type = db.session.query(Upload.file_type, Upload.variant, func.count(Upload.id), func.sum(Upload.size)) \
+        .group_by(Upload.file_type, Upload.variant) \
+        .all()
+    
+    return jsonify({
+        'quota': {
+            'user': user_quota,
+            'course': course_quota
+        },
+        'total_bytes': sum(total or 0 for _, _, _, total in by_type),
+        'total_files': sum(count for _, _, count, _ in by_type),
+        'by_type': [
+            {'file_type': file_type, 'variant': variant, 'files': count, 'bytes': total or 0}
+            for file_type, variant, count, total in by_type
+        ],
+        'users': [
+            {
+                'user_id': usage.scope_id,
+                'username': username,
+                'role': role,
+                'bytes': usage.bytes,
+                'files': usage.files,
+                'quota': (user_quota or None) if role == 'student' else None,
+                'usage_ratio': round(usage.bytes / user_quota, 4) if user_quota and role == 'student' else None
+            }
+            for usage, username, role in top_users
+        ],
+        'courses': [
+            {
+                'course_id': usage.scope_id,
+                'name': name,
+                'bytes': usage.bytes,
+                'files': usage.files,
+                'quota': course_quota or None,
+                'usage_ratio': round(usage.bytes / course_quota, 4) if course_quota else None
+            }
+            for usage, name in top_courses
+        ]
+    }), 200
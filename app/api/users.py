@@ -4,6 +4,8 @@ from app import db
 from app.models import User, Course
 from app.utils.auth import token_required, admin_required
 from app.utils.file_handler import save_file
+from app.utils.quota import quota_required
+from app.utils.idempotency import idempotent
 import re
 
 users = Blueprint('users', __name__)
@@ -193,6 +195,8 @@ def delete_user(current_user, user_id):
 
 @users.route('/avatar', methods=['POST'])
 @token_required
+@idempotent
+@quota_required
 def upload_avatar(current_user):
     """上传头像"""
     if 'avatar' not in request.files:
@@ -203,7 +207,10 @@ def upload_avatar(current_user):
         return jsonify({'message': '未选择文件'}), 400
     
     # 保存头像
-    file_info = save_file(avatar, 'image')
+    try:
+        file_info = save_file(avatar, 'image', public=True, owner_id=current_user.id)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     if not file_info:
         return jsonify({'message': '头像上传失败'}), 500
     
@@ -4,4 +4,10 @@ from .user import User, student_courses
 from .course import Course
 from .homework import Homework
 from .submission import Submission
-from .feedback import Feedback
\ No newline at end of file
+from .feedback import Feedback
+from .upload import Upload
+from .storage_usage import StorageUsage
+from .idempotency_key import IdempotencyKey
+from .course_revision import CourseRevision
+from .final_grade import FinalGrade, StaleFinalGrade
+from .grading_claim import GradingClaim
\ No newline at end of file
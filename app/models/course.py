@@ -11,6 +11,10 @@ class Course(db.Model):
     cover_image = db.Column(db.String(255), nullable=True)
     start_date = db.Column(db.Date, nullable=True)
     end_date = db.Column(db.Date, nullable=True)
+    # 总评规则：去掉最低分的作业数、迟交每天扣分百分比及扣分上限
+    drop_lowest = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    late_penalty_per_day = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    late_penalty_max = db.Column(db.Float, nullable=False, default=100, server_default='100')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -26,6 +30,11 @@ class Course(db.Model):
             'cover_image': self.cover_image,
             'start_date': self.start_date.isoformat() if self.start_date else None,
             'end_date': self.end_date.isoformat() if self.end_date else None,
+            'grading_policy': {
+                'drop_lowest': self.drop_lowest,
+                'late_penalty_per_day': self.late_penalty_per_day,
+                'late_penalty_max': self.late_penalty_max
+            },
             'created_at': self.created_at.isoformat()
         }
     
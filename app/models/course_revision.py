@@ -0,0 +1,13 @@
+from datetime import datetime
+from app import db
+
+class CourseRevision(db.Model):
+    """课程数据的修订号，课程下的作业、提交、反馈或选课变化时递增，用作缓存版本"""
+    __tablename__ = 'course_revisions'
+    
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id', ondelete='CASCADE'), primary_key=True)
+    revision = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<CourseRevision {self.course_id}:{self.revision}>'
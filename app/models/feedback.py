@@ -26,13 +26,15 @@ class Feedback(db.Model):
         self.content = json.dumps(data)
     
     def to_dict(self):
+        from app.utils.file_delivery import delivery_content
+        
         return {
             'id': self.id,
             'submission_id': self.submission_id,
             'teacher_id': self.teacher_id,
             'score': self.score,
             'comments': self.comments,
-            'content': self.content_data,
+            'content': delivery_content(self.content_data, 'feedback', self.id),
             'requires_revision': self.requires_revision,
             'created_at': self.created_at.isoformat()
         }
@@ -0,0 +1,47 @@
+from datetime import datetime
+from app import db
+
+class FinalGrade(db.Model):
+    """按课程评分规则计算出的学生总评成绩，由 app.utils.final_grades 维护"""
+    __tablename__ = 'final_grades'
+    __table_args__ = (
+        db.UniqueConstraint('course_id', 'student_id', name='uq_final_grade_student'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id', ondelete='CASCADE'), nullable=False, index=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    grade = db.Column(db.Float, nullable=True)  # 没有计入的作业时为空
+    counted = db.Column(db.Integer, nullable=False, default=0)  # 计入总评的作业数
+    dropped = db.Column(db.Integer, nullable=False, default=0)  # 按规则去掉的最低分作业数
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'course_id': self.course_id,
+            'student_id': self.student_id,
+            'grade': self.grade,
+            'counted': self.counted,
+            'dropped': self.dropped,
+            'computed_at': self.computed_at.isoformat() if self.computed_at else None
+        }
+    
+    def __repr__(self):
+        return f'<FinalGrade {self.course_id}:{self.student_id} {self.grade}>'
+
+
+class StaleFinalGrade(db.Model):
+    """待重新计算的总评标记
+
+    修改成绩的事务中只追加标记，不在事务内计算总评；
+    读取总评或后台任务执行时再按标记重新计算并删除标记。
+    """
+    __tablename__ = 'stale_final_grades'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id', ondelete='CASCADE'), nullable=False, index=True)
+    student_id = db.Column(db.Integer, nullable=True)  # 为空表示整个课程
+    marked_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<StaleFinalGrade {self.course_id}:{self.student_id}>'
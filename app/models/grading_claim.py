@@ -0,0 +1,24 @@
+from datetime import datetime
+from app import db
+
+class GradingClaim(db.Model):
+    """批改队列中教师对提交的认领，过期后可被其他人重新认领"""
+    __tablename__ = 'grading_claims'
+    
+    submission_id = db.Column(db.Integer, db.ForeignKey('submissions.id', ondelete='CASCADE'), primary_key=True)
+    grader_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id', ondelete='CASCADE'), nullable=False)
+    claimed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def to_dict(self):
+        return {
+            'submission_id': self.submission_id,
+            'grader_id': self.grader_id,
+            'course_id': self.course_id,
+            'claimed_at': self.claimed_at.isoformat() if self.claimed_at else None,
+            'expires_at': self.expires_at.isoformat()
+        }
+    
+    def __repr__(self):
+        return f'<GradingClaim {self.submission_id} by {self.grader_id}>'
@@ -10,6 +10,7 @@ class Homework(db.Model):
     course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
     due_date = db.Column(db.DateTime, nullable=True)
     assignment_type = db.Column(db.String(20), nullable=False)  # 'essay', 'oral'
+    weight = db.Column(db.Float, nullable=False, default=1.0, server_default='1')  # 在总评中的权重
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -24,6 +25,7 @@ class Homework(db.Model):
             'course_id': self.course_id,
             'due_date': self.due_date.isoformat() if self.due_date else None,
             'assignment_type': self.assignment_type,
+            'weight': self.weight,
             'created_at': self.created_at.isoformat()
         }
     
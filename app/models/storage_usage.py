@@ -0,0 +1,27 @@
+from datetime import datetime
+from app import db
+
+class StorageUsage(db.Model):
+    __tablename__ = 'storage_usage'
+    __table_args__ = (
+        db.UniqueConstraint('scope', 'scope_id', name='uq_storage_usage_scope'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(20), nullable=False)  # user, course
+    scope_id = db.Column(db.Integer, nullable=False)
+    bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    files = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'scope': self.scope,
+            'scope_id': self.scope_id,
+            'bytes': self.bytes,
+            'files': self.files,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+    
+    def __repr__(self):
+        return f'<StorageUsage {self.scope}:{self.scope_id} {self.bytes}>'
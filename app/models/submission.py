@@ -4,6 +4,9 @@ from app import db
 
 class Submission(db.Model):
     __tablename__ = 'submissions'
+    __table_args__ = (
+        db.UniqueConstraint('homework_id', 'student_id', 'version', name='uq_submission_version'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     homework_id = db.Column(db.Integer, db.ForeignKey('homeworks.id'), nullable=False)
@@ -29,11 +32,13 @@ class Submission(db.Model):
         self.content = json.dumps(data)
     
     def to_dict(self):
+        from app.utils.file_delivery import delivery_content
+        
         return {
             'id': self.id,
             'homework_id': self.homework_id,
             'student_id': self.student_id,
-            'content': self.content_data,
+            'content': delivery_content(self.content_data, 'submission', self.id),
             'comment': self.comment,
             'version': self.version,
             'status': self.status,
@@ -0,0 +1,93 @@
+from datetime import datetime
+from app import db
+
+class Upload(db.Model):
+    __tablename__ = 'uploads'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey('submissions.id', ondelete='SET NULL'), nullable=True, index=True)
+    feedback_id = db.Column(db.Integer, db.ForeignKey('feedbacks.id', ondelete='SET NULL'), nullable=True, index=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id', ondelete='SET NULL'), nullable=True, index=True)  # 计入配额的课程
+    parent_id = db.Column(db.Integer, db.ForeignKey('uploads.id', ondelete='SET NULL'), nullable=True, index=True)  # 衍生文件所属的原文件
+    variant = db.Column(db.String(20), default='original')  # original, full, preview, thumb, compact, peaks
+    file_type = db.Column(db.String(20), nullable=False)  # image, audio
+    path = db.Column(db.String(255), unique=True, nullable=False)
+    filename = db.Column(db.String(255), nullable=True)
+    mime_type = db.Column(db.String(100), nullable=True)
+    size = db.Column(db.BigInteger, nullable=False, default=0)
+    sha256 = db.Column(db.String(64), nullable=True, index=True)
+    width = db.Column(db.Integer, nullable=True)
+    height = db.Column(db.Integer, nullable=True)
+    duration = db.Column(db.Float, nullable=True)  # 秒
+    bitrate = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    # 衍生文件关系
+    # 每个文件单独计入配额并单独释放，删除原文件记录不会删除衍生文件记录
+    derivatives = db.relationship('Upload', backref=db.backref('parent', remote_side=[id]),
+                                  passive_deletes=True)
+    
+    @classmethod
+    def from_file_info(cls, info, owner_id, file_type):
+        """根据save_file返回的元数据创建原文件及其衍生文件的记录"""
+        upload = cls(
+            owner_id=owner_id,
+            variant='original',
+            file_type=file_type,
+            path=info['path'],
+            filename=info.get('filename'),
+            mime_type=info.get('mime_type'),
+            size=info.get('size') or 0,
+            sha256=info.get('sha256'),
+            width=info.get('width'),
+            height=info.get('height'),
+            duration=info.get('duration'),
+            bitrate=info.get('bitrate')
+        )
+        
+        extras = dict(info.get('derivatives') or {})
+        for variant in ('compact', 'peaks'):
+            if info.get(variant):
+                extras[variant] = info[variant]
+        
+        for variant, extra in extras.items():
+            upload.derivatives.append(cls(
+                owner_id=owner_id,
+                variant=variant,
+                file_type=file_type,
+                path=extra['path'],
+                mime_type=extra.get('mime_type') or ('image/webp' if file_type == 'image' else 'application/octet-stream'),
+                size=extra.get('size') or 0,
+                width=extra.get('width'),
+                height=extra.get('height'),
+                duration=info.get('duration') if variant == 'compact' else None,
+                bitrate=extra.get('bitrate')
+            ))
+        
+        return upload
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'owner_id': self.owner_id,
+            'submission_id': self.submission_id,
+            'feedback_id': self.feedback_id,
+            'course_id': self.course_id,
+            'parent_id': self.parent_id,
+            'variant': self.variant,
+            'file_type': self.file_type,
+            'path': self.path,
+            'filename': self.filename,
+            'mime_type': self.mime_type,
+            'size': self.size,
+            'sha256': self.sha256,
+            'width': self.width,
+            'height': self.height,
+            'duration': self.duration,
+            'bitrate': self.bitrate,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+    
+    def __repr__(self):
+        return f'<Upload {self.path}>'
@@ -0,0 +1,162 @@
+# app/utils/analytics.py
+import warnings
+import numpy as np
+from app import db
+from app.models import User, student_courses
+from app.utils.gradebook import course_homeworks
+from app.utils.query_helpers import latest_scores_subquery
+
+# 直方图分箱：0-10, 10-20, ..., 90-100（最后一箱包含100分）
+HISTOGRAM_BINS = np.linspace(0, 100, 11)
+
+# 分数分布中计算的分位数
+DISTRIBUTION_PERCENTILES = {'p10': 10, 'p25': 25, 'median': 50, 'p75': 75, 'p90': 90}
+
+
+def _to_list(values, digits=2):
+    """转换为JSON可用的列表，NaN转为None"""
+    values = np.round(np.asarray(values, dtype=np.float64), digits)
+    return [None if np.isnan(value) else float(value) for value in values.ravel()]
+
+
+def load_score_matrix(course_id, students, homeworks):
+    """一次查询取出课程的最新分数，构造 学生 × 作业 的分数矩阵，未批改为NaN"""
+    row_index = {student_id: i for i, student_id in enumerate(students)}
+    column_index = {homework_id: j for j, homework_id in enumerate(homeworks)}
+    scores = latest_scores_subquery(course_id=course_id)
+
+    rows = db.session.query(scores.c.student_id, scores.c.homework_id, scores.c.score) \
+        .filter(scores.c.score.isnot(None)) \
+        .all()
+    rows = [row for row in rows if row[0] in row_index]
+
+    matrix = np.full((len(students), len(homeworks)), np.nan)
+    if rows:
+        student_ids, homework_ids, values = zip(*rows)
+        matrix[
+            np.fromiter((row_index[i] for i in student_ids), dtype=np.intp, count=len(rows)),
+            np.fromiter((column_index[i] for i in homework_ids), dtype=np.intp, count=len(rows))
+        ] = np.array(values, dtype=np.float64)
+    return matrix
+
+
+def column_histograms(matrix):
+    """每列的分数直方图，返回 作业数 × 分箱数 的计数矩阵"""
+    nbins = len(HISTOGRAM_BINS) - 1
+    rows, columns = np.nonzero(~np.isnan(matrix))
+    bins = np.clip(np.searchsorted(HISTOGRAM_BINS, matrix[rows, columns], side='right') - 1, 0, nbins - 1)
+    counts = np.bincount(columns * nbins + bins, minlength=matrix.shape[1] * nbins)
+    return counts.reshape(matrix.shape[1], nbins)
+
+
+def column_percentile_ranks(matrix):
+    """每个分数在所在列中的百分位等级（0-100），相同分数取中间等级"""
+    ranks = np.full(matrix.shape, np.nan)
+    for j in range(matrix.shape[1]):
+        column = matrix[:, j]
+        valid = ~np.isnan(column)
+        if not valid.any():
+            continue
+        ordered = np.sort(column[valid])
+        below = np.searchsorted(ordered, column[valid], side='left')
+        at_or_below = np.searchsorted(ordered, column[valid], side='right')
+        ranks[valid, j] = (below + at_or_below) / 2 / ordered.size * 100
+    return ranks
+
+
+def _distribution(matrix, axis=None):
+    """按列（axis=0）或整体计算数量、平均数、标准差、极值和分位数"""
+    count = np.sum(~np.isnan(matrix), axis=axis)
+    names = ['mean', 'std', 'min', 'max'] + list(DISTRIBUTION_PERCENTILES)
+    if not matrix.size:
+        empty = np.full(matrix.shape[1], np.nan) if axis == 0 else np.nan
+        return {'count': count, **{name: empty for name in names}}
+
+    with warnings.catch_warnings():
+        # 没有分数的列结果为NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        stats = {
+            'count': count,
+            'mean': np.nanmean(matrix, axis=axis),
+            'std': np.nanstd(matrix, axis=axis),
+            'min': np.nanmin(matrix, axis=axis),
+            'max': np.nanmax(matrix, axis=axis)
+        }
+        for name, q in DISTRIBUTION_PERCENTILES.items():
+            stats[name] = np.nanpercentile(matrix, q, axis=axis)
+    return stats
+
+
+def _trend_slopes(values):
+    """每行对作业序号的最小二乘斜率，有效值少于两个的行为NaN"""
+    mask = ~np.isnan(values)
+    x = np.broadcast_to(np.arange(values.shape[1], dtype=np.float64), values.shape) * mask
+    y = np.where(mask, values, 0.0)
+    n = mask.sum(axis=1)
+    sx, sy = x.sum(axis=1), y.sum(axis=1)
+    sxx, sxy = (x * x).sum(axis=1), (x * y).sum(axis=1)
+    denominator = n * sxx - sx * sx
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where((n >= 2) & (denominator > 0), (n * sxy - sx * sy) / denominator, np.nan)
+
+
+def course_analytics(course_id):
+    """计算课程的成绩分析
+
+    分数取每个选课学生在每个作业上最新提交的最新反馈，全部计算在NumPy中向量化完成。
+    z分数以作业为单位标准化；学生的趋势为其z分数随作业顺序（按截止日期）的斜率，
+    正值表示相对全班的排名在上升。矩阵类结果按行优先展开，与成绩矩阵接口一致。
+
+    Returns:
+        dict: 课程、各作业、各学生的统计，以及 z_scores、percentile_ranks 矩阵
+    """
+    homeworks = course_homeworks(course_id)
+    students = db.session.query(User.id, User.username) \
+        .join(student_courses, student_courses.c.student_id == User.id) \
+        .filter(student_courses.c.course_id == course_id) \
+        .order_by(User.username, User.id) \
+        .all()
+
+    matrix = load_score_matrix(course_id, [student_id for student_id, _ in students], [h.id for h in homeworks])
+
+    per_homework = _distribution(matrix, axis=0)
+    overall = _distribution(matrix)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z_scores = np.where(per_homework['std'] > 0, (matrix - per_homework['mean']) / per_homework['std'], 0.0)
+    z_scores[np.isnan(matrix)] = np.nan
+    percentile_ranks = column_percentile_ranks(matrix)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        student_mean = np.nanmean(matrix, axis=1)
+        student_z = np.nanmean(z_scores, axis=1)
+    student_rank = column_percentile_ranks(student_mean[:, np.newaxis])[:, 0]
+
+    histogram = column_histograms(matrix)
+
+    return {
+        'shape': list(matrix.shape),
+        'histogram_bins': _to_list(HISTOGRAM_BINS),
+        'course': {
+            **{name: _to_list([value])[0] for name, value in overall.items() if name != 'count'},
+            'count': int(overall['count']),
+            'histogram': histogram.sum(axis=0).tolist()
+        },
+        'homeworks': {
+            'id': [homework.id for homework in homeworks],
+            'title': [homework.title for homework in homeworks],
+            **{name: _to_list(values) for name, values in per_homework.items() if name != 'count'},
+            'count': per_homework['count'].tolist(),
+            'histogram': histogram.tolist()
+        },
+        'students': {
+            'id': [student_id for student_id, _ in students],
+            'username': [username for _, username in students],
+            'mean': _to_list(student_mean),
+            'mean_z': _to_list(student_z, 3),
+            'percentile_rank': _to_list(student_rank, 1),
+            'trend': _to_list(_trend_slopes(z_scores), 3)
+        },
+        'z_scores': _to_list(z_scores, 3),
+        'percentile_ranks': _to_list(percentile_ranks, 1)
+    }
@@ -0,0 +1,63 @@
+# app/utils/audio_transcoder.py
+import os
+import subprocess
+from flask import current_app
+from app.utils.storage import get_storage
+
+# 紧凑版本的MIME类型
+COMPACT_MIME_TYPE = 'audio/webm'
+
+
+def compact_key(key):
+    """紧凑版本的存储键，与原文件位于同一目录"""
+    stem = key.rsplit('.', 1)[0]
+    return f"{stem}.opus.webm"
+
+
+def transcode_audio(src_path, key, duration=None):
+    """将音频转码为响度归一化的Opus/WebM紧凑版本
+
+    使用ffmpeg的loudnorm滤镜（EBU R128）统一响度，输出单声道Opus，
+    适合语音作业，体积约为WAV的十分之一以下。
+
+    Args:
+        src_path: 原音频的本地路径
+        key: 原音频的存储键
+        duration: 音频时长（秒），用于计算实际码率
+
+    Returns:
+        dict: 紧凑版本的元数据（path、url、mime_type、size、bitrate等）
+    """
+    storage = get_storage()
+    ckey = compact_key(key)
+    bitrate = current_app.config['AUDIO_OPUS_BITRATE']
+    loudness = current_app.config['AUDIO_TARGET_LOUDNESS']
+    
+    with storage.staging(ckey, COMPACT_MIME_TYPE) as out_path:
+        command = [
+            'ffmpeg', '-nostdin', '-hide_banner', '-loglevel', 'error', '-y',
+            '-i', src_path,
+            '-vn', '-ac', '1',
+            '-af', f'loudnorm=I={loudness}:TP=-1.5:LRA=11',
+            '-c:a', 'libopus', '-b:a', bitrate, '-application', 'voip',
+            '-f', 'webm', out_path
+        ]
+        subprocess.run(
+            command,
+            check=True,
+            capture_output=True,
+            timeout=current_app.config['AUDIO_TRANSCODE_TIMEOUT']
+        )
+        size = os.path.getsize(out_path)
+    
+    result = {
+        'path': ckey,
+        'url': storage.url(ckey),
+        'mime_type': COMPACT_MIME_TYPE,
+        'codec': 'opus',
+        'size': size,
+        'loudness': loudness
+    }
+    if duration:
+        result['bitrate'] = int(size * 8 / duration)
+    return result
@@ -65,6 +65,26 @@ def token_required(f):
     
     return decorated
 
+def login_or_token_required(f):
+    """JWT令牌或登录会话验证装饰器
+
+    用于浏览器直接加载的资源（如<img>、<audio>），
+    这些请求无法携带Authorization头，只能依赖登录会话。
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        from flask_login import current_user as session_user
+        
+        if 'Authorization' in request.headers:
+            return token_required(f)(*args, **kwargs)
+        
+        if not session_user.is_authenticated:
+            return jsonify({'message': '需要认证'}), 401
+        
+        return f(session_user._get_current_object(), *args, **kwargs)
+    
+    return decorated
+
 def admin_required(f):
     """管理员权限验证装饰器"""
     @wraps(f)
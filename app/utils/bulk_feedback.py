@@ -0,0 +1,145 @@
+# app/utils/bulk_feedback.py
+import json
+from datetime import datetime
+from sqlalchemy import insert, update, case
+from app import db
+from app.models import Submission, Feedback, Homework, Course
+from app.utils.course_cache import bump_course_revision
+from app.utils.final_grades import mark_final_grades_stale
+from app.utils.grading_queue import release_claims
+from app.utils.events import queue_event
+
+# 单次批量批改最多的提交数
+BULK_FEEDBACK_MAX = 500
+
+
+def _parse_item(item):
+    """校验单条批改数据
+
+    Returns:
+        tuple: (整理后的数据, 错误信息)，两者只有一个不为None
+    """
+    if not isinstance(item, dict):
+        return None, '格式不正确'
+
+    try:
+        submission_id = int(item.get('submission_id'))
+    except (TypeError, ValueError):
+        return None, '提交ID为必填项'
+
+    score = item.get('score')
+    if score is not None:
+        try:
+            score = float(score)
+        except (TypeError, ValueError):
+            return None, '分数格式不正确'
+        if score < 0 or score > 100:
+            return None, '分数必须在0-100之间'
+
+    content = {}
+    if item.get('text_content'):
+        content['text'] = str(item['text_content'])
+
+    return {
+        'submission_id': submission_id,
+        'score': score,
+        'comments': item.get('comments') or '',
+        'requires_revision': bool(item.get('requires_revision', False)),
+        'content': json.dumps(content)
+    }, None
+
+
+def create_bulk_feedback(current_user, items):
+    """在一个事务中批量创建反馈，由调用方提交事务
+
+    一次查询校验全部提交的权限，反馈用一条 executemany 插入，
+    提交状态用一条 CASE 语句更新。批量写入绕过了ORM的刷新事件，
+    这里显式递增课程修订号、标记需要重新计算的总评、释放批改队列中的认领并登记事件。
+
+    Args:
+        current_user: 当前教师
+        items: 每项包含 submission_id、score、comments、requires_revision、text_content
+
+    Returns:
+        list: 与items一一对应的结果，包含 index、submission_id、status，
+            成功时有 feedback_id，失败时有 message
+    """
+    results = [None] * len(items)
+    parsed = {}
+    for index, item in enumerate(items):
+        data, error = _parse_item(item)
+        if error:
+            submission_id = item.get('submission_id') if isinstance(item, dict) else None
+            results[index] = {'index': index, 'submission_id': submission_id, 'status': 400, 'message': error}
+        elif data['submission_id'] in parsed:
+            results[index] = {'index': index, 'submission_id': data['submission_id'], 'status': 409,
+                              'message': '同一提交在请求中重复出现'}
+        else:
+            parsed[data['submission_id']] = (index, data)
+
+    # 一次查询取出全部提交及其所属课程
+    targets = {}
+    if parsed:
+        rows = db.session.query(Submission.id, Submission.student_id, Course.id, Course.teacher_id) \
+            .join(Homework, Homework.id == Submission.homework_id) \
+            .join(Course, Course.id == Homework.course_id) \
+            .filter(Submission.id.in_(list(parsed))) \
+            .all()
+        targets = {row[0]: row[1:] for row in rows}
+
+    accepted = []
+    for submission_id, (index, data) in parsed.items():
+        target = targets.get(submission_id)
+        if target is None:
+            results[index] = {'index': index, 'submission_id': submission_id, 'status': 404, 'message': '提交不存在'}
+        elif target[2] != current_user.id and not current_user.is_admin():
+            results[index] = {'index': index, 'submission_id': submission_id, 'status': 403,
+                              'message': '您不是该课程的教师'}
+        else:
+            accepted.append((index, data))
+
+    if not accepted:
+        return results
+
+    now = datetime.utcnow()
+    rows = [dict(data, teacher_id=current_user.id, created_at=now, updated_at=now) for _, data in accepted]
+    created = db.session.execute(insert(Feedback).returning(Feedback.id, Feedback.submission_id), rows)
+    feedback_ids = {submission_id: feedback_id for feedback_id, submission_id in created}
+
+    statuses = {
+        data['submission_id']: 'needs_revision' if data['requires_revision'] else 'graded'
+        for _, data in accepted
+    }
+    db.session.execute(
+        update(Submission)
+        .where(Submission.id.in_(list(statuses)))
+        .values(status=case(statuses, value=Submission.id), updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+
+    students_by_course = {}
+    for submission_id in statuses:
+        student_id, course_id, _ = targets[submission_id]
+        students_by_course.setdefault(course_id, set()).add(student_id)
+    for course_id, student_ids in sorted(students_by_course.items()):
+        bump_course_revision(course_id)
+        mark_final_grades_stale(course_id, student_ids)
+    release_claims(statuses)
+
+    for _, data in accepted:
+        student_id, course_id, _ = targets[data['submission_id']]
+        queue_event('feedback.created', course_id, student_id, {
+            'feedback_id': feedback_ids.get(data['submission_id']),
+            'submission_id': data['submission_id'],
+            'score': data['score'],
+            'requires_revision': data['requires_revision']
+        })
+
+    for index, data in accepted:
+        results[index] = {
+            'index': index,
+            'submission_id': data['submission_id'],
+            'status': 201,
+            'feedback_id': feedback_ids.get(data['submission_id'])
+        }
+    return results
@@ -0,0 +1,138 @@
+# app/utils/course_cache.py
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import event, update, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app import db
+from app.models import Course, Homework, Submission, Feedback, CourseRevision
+
+_lock = threading.Lock()
+
+
+def _course_id_of(session, obj):
+    """找出被修改对象所属的课程"""
+    if isinstance(obj, Course):
+        return obj.id
+    if isinstance(obj, Homework):
+        return obj.course_id
+    if isinstance(obj, Feedback):
+        obj = session.get(Submission, obj.submission_id) if obj.submission_id else None
+    if isinstance(obj, Submission) and obj.homework_id:
+        homework = session.get(Homework, obj.homework_id)
+        return homework.course_id if homework else None
+    return None
+
+
+def _bump(connection, course_id):
+    stmt = update(CourseRevision.__table__) \
+        .where(CourseRevision.__table__.c.course_id == course_id) \
+        .values(revision=CourseRevision.__table__.c.revision + 1, updated_at=datetime.utcnow())
+    if connection.execute(stmt).rowcount:
+        return
+    
+    try:
+        with connection.begin_nested():
+            connection.execute(insert(CourseRevision.__table__).values(
+                course_id=course_id, revision=1, updated_at=datetime.utcnow()
+            ))
+    except IntegrityError:
+        # 并发请求已创建了修订号
+        connection.execute(stmt)
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_changed_courses(session, flush_context, instances):
+    changed = session.info.setdefault('changed_courses', set())
+    with session.no_autoflush:
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, (Course, Homework, Submission, Feedback)):
+                # dirty中可能包含没有实际修改的对象
+                if obj in session.dirty and not session.is_modified(obj):
+                    continue
+                if isinstance(obj, Course) and obj in session.deleted:
+                    continue
+                changed.add(_course_id_of(session, obj))
+    changed.discard(None)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_changed_courses(session):
+    # 修订号在业务事务提交之后用单独的短事务递增，不会在业务事务中
+    # 持有修订号行的锁，同一课程的并发写入不会因此串行
+    changed = session.info.pop('changed_courses', None)
+    if not changed:
+        return
+    bind = session.get_bind()
+    engine = getattr(bind, 'engine', bind)
+    try:
+        with engine.begin() as connection:
+            for course_id in sorted(changed):
+                _bump(connection, course_id)
+    except Exception as e:
+        # 业务数据已提交，递增失败只会让缓存晚一些失效
+        current_app.logger.warning(f"递增课程修订号失败: {e}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_courses(session):
+    session.info.pop('changed_courses', None)
+
+
+def bump_course_revision(course_id, session=None):
+    """标记课程数据已变化，用于绕过ORM的批量写入，修订号在事务提交后递增"""
+    (session or db.session).info.setdefault('changed_courses', set()).add(course_id)
+
+
+def get_course_revision(course_id):
+    revision = db.session.query(CourseRevision.revision) \
+        .filter_by(course_id=course_id) \
+        .scalar()
+    return revision or 0
+
+
+def _get_cache():
+    app = current_app._get_current_object()
+    cache = app.extensions.get('course_cache')
+    if cache is None:
+        with _lock:
+            cache = app.extensions.setdefault('course_cache', OrderedDict())
+    return cache
+
+
+def cached_course_data(name, course_id, compute):
+    """按课程缓存计算结果
+
+    缓存保存在进程内，以课程修订号作为版本，每次读取只需查询一次修订号；
+    课程数据在任一进程中被修改后，所有进程的旧缓存都会失效。
+
+    Args:
+        name: 缓存的数据类型，如 'gradebook'
+        course_id: 课程ID
+        compute: 无参数的计算函数
+
+    Returns:
+        tuple: (计算结果, 修订号)
+    """
+    revision = get_course_revision(course_id)
+    cache = _get_cache()
+    key = (name, course_id)
+    
+    with _lock:
+        entry = cache.get(key)
+        if entry and entry[0] == revision:
+            cache.move_to_end(key)
+            return entry[1], revision
+    
+    value = compute()
+    
+    with _lock:
+        cache[key] = (revision, value)
+        cache.move_to_end(key)
+        # 超出容量时淘汰最久未使用的条目
+        while len(cache) > current_app.config['COURSE_CACHE_SIZE']:
+            cache.popitem(last=False)
+    
+    return value, revision
@@ -0,0 +1,200 @@
+# app/utils/events.py
+import json
+import queue
+import select
+import threading
+import time
+from flask import current_app
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from app import db
+from app.models import Homework, Submission, Feedback
+
+# 每个订阅者最多缓存的未发送事件数，客户端太慢时丢弃新事件
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# LISTEN连接断开后重连前的等待时间（秒）
+LISTEN_RETRY_SECONDS = 5
+
+
+class Subscription:
+    """一个SSE连接的事件订阅
+
+    接收与用户本人有关的事件，以及 course_ids 中课程（all_courses 时为所有课程）的事件；
+    设置 only_course 时只接收该课程的事件。
+    """
+
+    def __init__(self, user_id, course_ids=None, all_courses=False, only_course=None):
+        self.user_id = user_id
+        self.course_ids = set(course_ids or [])
+        self.all_courses = all_courses
+        self.only_course = only_course
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def matches(self, evt):
+        if self.only_course is not None and evt.get('course_id') != self.only_course:
+            return False
+        if evt.get('user_id') == self.user_id:
+            return True
+        return self.all_courses or evt.get('course_id') in self.course_ids
+
+
+class EventHub:
+    """进程内的事件分发"""
+
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, subscription, limit=None):
+        """登记订阅，已达到 limit 个订阅时不登记并返回None"""
+        with self._lock:
+            if limit is not None and len(self._subscriptions) >= limit:
+                return None
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, evt):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.matches(evt):
+                try:
+                    subscription.queue.put_nowait(evt)
+                except queue.Full:
+                    pass
+
+
+hub = EventHub()
+_listener_lock = threading.Lock()
+_listener_started = False
+
+
+def uses_pg_notify(app=None):
+    """PostgreSQL上通过 LISTEN/NOTIFY 在进程间传递事件，其他数据库只在本进程内分发"""
+    app = app or current_app
+    backend = app.config['EVENT_BUS']
+    if backend == 'auto':
+        return db.engine.dialect.name == 'postgresql'
+    return backend == 'postgres'
+
+
+def _listen(app):
+    """后台线程：LISTEN事件频道，把其他进程（以及本进程）发出的通知分发给本进程的订阅者"""
+    channel = app.config['EVENT_CHANNEL']
+    while True:
+        try:
+            with app.app_context():
+                raw = db.engine.raw_connection()
+            try:
+                connection = raw.driver_connection
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{channel}"')
+                while True:
+                    if select.select([connection], [], [], LISTEN_RETRY_SECONDS) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        notify = connection.notifies.pop(0)
+                        try:
+                            hub.publish(json.loads(notify.payload))
+                        except ValueError:
+                            continue
+            finally:
+                raw.invalidate()
+        except Exception as e:
+            app.logger.warning(f'事件频道监听中断，{LISTEN_RETRY_SECONDS}秒后重连: {e}')
+            time.sleep(LISTEN_RETRY_SECONDS)
+
+
+def ensure_listener():
+    """在本进程中启动LISTEN线程（只启动一次，在第一个订阅时调用）"""
+    global _listener_started
+    if _listener_started or not uses_pg_notify():
+        return
+    with _listener_lock:
+        if _listener_started:
+            return
+        app = current_app._get_current_object()
+        threading.Thread(target=_listen, args=(app,), name='event-listener', daemon=True).start()
+        _listener_started = True
+
+
+def queue_event(evt_type, course_id, user_id, data, session=None):
+    """登记一个在事务提交后发布的事件，用于绕过ORM的批量写入
+
+    Args:
+        evt_type: 事件类型，如 'submission.created'
+        course_id: 所属课程，所教教师会收到
+        user_id: 相关学生，本人会收到
+        data: 事件内容，需保持简短（NOTIFY的内容不能超过8000字节）
+    """
+    (session or db.session).info.setdefault('pending_events', []).append({
+        'type': evt_type,
+        'course_id': course_id,
+        'user_id': user_id,
+        'data': data
+    })
+
+
+def _homework_of(session, submission_id):
+    submission = session.get(Submission, submission_id)
+    homework = session.get(Homework, submission.homework_id) if submission else None
+    return submission, homework
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_events(session, flush_context):
+    for obj in session.new:
+        if isinstance(obj, Submission):
+            homework = session.get(Homework, obj.homework_id)
+            queue_event('submission.created', homework.course_id if homework else None, obj.student_id, {
+                'submission_id': obj.id,
+                'homework_id': int(obj.homework_id),
+                'version': obj.version,
+                'status': obj.status
+            }, session)
+        elif isinstance(obj, Feedback):
+            submission, homework = _homework_of(session, obj.submission_id)
+            if submission is None:
+                continue
+            queue_event('feedback.created', homework.course_id if homework else None, submission.student_id, {
+                'feedback_id': obj.id,
+                'submission_id': int(obj.submission_id),
+                'homework_id': submission.homework_id,
+                'score': obj.score,
+                'requires_revision': bool(obj.requires_revision)
+            }, session)
+
+
+@event.listens_for(Session, 'before_commit')
+def _notify_events(session):
+    # NOTIFY在事务内发出，提交后才送达，回滚则丢弃
+    if session.new:
+        session.flush()
+    events = session.info.get('pending_events')
+    if not events or not uses_pg_notify():
+        return
+    session.info.pop('pending_events')
+    connection = session.connection()
+    for evt in events:
+        connection.execute(text('SELECT pg_notify(:channel, :payload)'), {
+            'channel': current_app.config['EVENT_CHANNEL'],
+            'payload': json.dumps(evt)
+        })
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_events(session):
+    for evt in session.info.pop('pending_events', None) or []:
+        hub.publish(evt)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_events(session):
+    session.info.pop('pending_events', None)
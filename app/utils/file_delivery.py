@@ -0,0 +1,220 @@
+# app/utils/file_delivery.py
+import os
+import copy
+import mimetypes
+from urllib.parse import quote
+from flask import current_app, redirect, request, url_for, has_request_context, Response
+from werkzeug.http import http_date, parse_date
+from app.utils.storage import get_storage
+
+# 非sendfile情况下每次读取的块大小
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _iter_file_range(f, length):
+    """从文件当前位置起读取指定长度的数据块"""
+    try:
+        while length > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def _if_range_matches(etag, last_modified):
+    """检查If-Range条件，不匹配时应忽略Range返回完整内容"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"'):
+        # If-Range要求强比较
+        return if_range == etag
+    date = parse_date(if_range)
+    return date is not None and int(date.timestamp()) == int(last_modified)
+
+
+def send_ranged_file(path, mimetype, download_name=None, as_attachment=False):
+    """发送本地文件，支持Range/206、ETag和If-Range
+
+    服务器提供wsgi.file_wrapper（如gunicorn）时，定位到起始偏移后交给
+    file_wrapper并设置Content-Length，由服务器通过sendfile发送，
+    数据不经过Python进程复制。
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = f'"{size:x}-{stat.st_mtime_ns:x}"'
+    
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime)
+    }
+    if download_name:
+        disposition = 'attachment' if as_attachment else 'inline'
+        headers['Content-Disposition'] = f"{disposition}; filename*=UTF-8''{quote(download_name)}"
+    
+    # 条件请求：内容未变化时返回304
+    if etag in [t.strip() for t in request.headers.get('If-None-Match', '').split(',')]:
+        return Response(status=304, headers=headers)
+    
+    start, end = 0, size
+    status = 200
+    
+    byte_range = request.range
+    if byte_range is not None and byte_range.units == 'bytes' and _if_range_matches(etag, stat.st_mtime):
+        # 多段Range不常见，按完整内容返回
+        if len(byte_range.ranges) == 1:
+            span = byte_range.range_for_length(size)
+            if span is None:
+                headers['Content-Range'] = f'bytes */{size}'
+                return Response(status=416, headers=headers)
+            start, end = span
+            status = 206
+            headers['Content-Range'] = f'bytes {start}-{end - 1}/{size}'
+    
+    f = open(path, 'rb')
+    f.seek(start)
+    length = end - start
+    
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    if file_wrapper is not None:
+        # 服务器按Content-Length截断，支持时使用sendfile
+        body = file_wrapper(f, STREAM_CHUNK_SIZE)
+    else:
+        body = _iter_file_range(f, length)
+    
+    response = Response(body, status=status, mimetype=mimetype, headers=headers, direct_passthrough=True)
+    response.content_length = length
+    return response
+
+
+def send_stored_file(key, mimetype=None, download_name=None, as_attachment=False):
+    """发送已存储的文件
+
+    权限检查应在调用前完成。本地存储且启用X-Accel-Redirect时，
+    由nginx直接从磁盘发送文件（零拷贝）；对象存储重定向到预签名地址；
+    其余情况（开发环境）由Flask发送。
+    """
+    storage = get_storage()
+    mimetype = mimetype or mimetypes.guess_type(key)[0] or 'application/octet-stream'
+    
+    if storage.local_path(key) is None:
+        return redirect(storage.presigned_get(key, filename=download_name))
+    
+    if current_app.config['USE_X_ACCEL_REDIRECT']:
+        response = Response(mimetype=mimetype)
+        prefix = current_app.config['X_ACCEL_REDIRECT_PREFIX'].rstrip('/')
+        response.headers['X-Accel-Redirect'] = f"{prefix}/{quote(key)}"
+        if download_name:
+            disposition = 'attachment' if as_attachment else 'inline'
+            response.headers['Content-Disposition'] = f"{disposition}; filename*=UTF-8''{quote(download_name)}"
+    else:
+        response = send_ranged_file(
+            storage.local_path(key),
+            mimetype,
+            download_name=download_name,
+            as_attachment=as_attachment
+        )
+    
+    # 受保护的文件只允许浏览器缓存，不允许共享缓存
+    response.headers['Cache-Control'] = 'private, max-age=3600'
+    return response
+
+
+def preload_links(content, rel='preload', limit=6):
+    """根据 delivery_content 处理后的内容生成 Link 头的资源提示
+
+    图片提示预览尺寸的衍生图，录音提示波形数据（播放器首先加载），
+    录音本身体积较大，不提前加载。
+
+    Args:
+        content: delivery_content 返回的内容
+        rel: 'preload'（当前页面）或 'prefetch'（下一个页面）
+        limit: 最多提示的图片数
+
+    Returns:
+        list: Link 头的各项
+    """
+    links = []
+    for info in (content or {}).get('images') or []:
+        if len(links) >= limit:
+            break
+        url = ((info.get('derivatives') or {}).get('preview') or {}).get('url') or info.get('url')
+        if url:
+            links.append(f'<{url}>; rel={rel}; as=image')
+    
+    audio = (content or {}).get('audio') or {}
+    if audio.get('peaks_url'):
+        links.append(f'<{audio["peaks_url"]}>; rel={rel}; as=fetch; crossorigin=use-credentials')
+    return links
+
+
+def delivery_content(content, owner_type, owner_id):
+    """将内容中的文件URL替换为带权限检查的下载地址
+
+    Args:
+        content: 提交或反馈的内容字典
+        owner_type: 'submission' 或 'feedback'
+        owner_id: 提交或反馈的ID
+
+    Returns:
+        dict: 替换URL后的内容副本
+    """
+    if not content or not has_request_context():
+        return content
+    
+    from app.utils.file_handler import iter_content_files
+    
+    if owner_type == 'submission':
+        id_field = 'submission_id'
+        endpoint = 'files.submission_file'
+        audio_endpoint = 'files.stream_submission_audio'
+        peaks_endpoint = 'files.submission_audio_peaks'
+    else:
+        id_field = 'feedback_id'
+        endpoint = 'files.feedback_file'
+        audio_endpoint = 'files.stream_feedback_audio'
+        peaks_endpoint = 'files.feedback_audio_peaks'
+    
+    from app.utils.image_derivatives import DERIVATIVE_SIZES
+    
+    content = copy.deepcopy(content)
+    
+    # 录音默认播放紧凑版本，原文件通过original_url访问
+    audio = content.get('audio')
+    if audio and audio.get('path'):
+        audio['original_url'] = url_for(endpoint, file_path=audio['path'], **{id_field: owner_id})
+        audio['url'] = url_for(audio_endpoint, **{id_field: owner_id})
+        if audio.get('compact'):
+            audio['compact']['url'] = audio['url']
+        audio['peaks_url'] = url_for(peaks_endpoint, **{id_field: owner_id})
+    
+    for info in iter_content_files(content):
+        if not info.get('path') or info is audio:
+            continue
+        
+        info['url'] = url_for(endpoint, file_path=info['path'], **{id_field: owner_id})
+        
+        # 图像提供各尺寸衍生图地址和srcset，历史图片首次访问时生成
+        if info.get('width'):
+            recorded = info.get('derivatives') or {}
+            derivatives = {}
+            for variant, max_side in DERIVATIVE_SIZES.items():
+                width = recorded[variant]['width'] if variant in recorded else min(max_side, info['width'])
+                derivatives[variant] = {
+                    **recorded.get(variant, {}),
+                    'url': url_for(endpoint, file_path=info['path'], variant=variant, **{id_field: owner_id}),
+                    'width': width
+                }
+            info['derivatives'] = derivatives
+            
+            # 小图的各级衍生图宽度相同，srcset中每个宽度只保留一项
+            srcset = {}
+            for d in sorted(derivatives.values(), key=lambda d: d['width']):
+                srcset.setdefault(d['width'], d['url'])
+            info['srcset'] = ', '.join(f"{url} {width}w" for width, url in srcset.items())
+    return content
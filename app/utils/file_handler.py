@@ -1,24 +1,116 @@
 # app/utils/file_handler.py
 import os
 import uuid
+import hashlib
+import jwt
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from werkzeug.utils import secure_filename
 from flask import current_app
-from datetime import datetime
+from datetime import datetime, timedelta
 import magic
 from PIL import Image
 from pydub import AudioSegment
+from sqlalchemy import func, or_
+from app import db
+from app.models import Upload, User
+from app.utils.storage import get_storage
+from app.utils.image_derivatives import DERIVATIVE_SIZES, derivative_key, generate_derivatives
+from app.utils.image_normalizer import normalize_image
+from app.utils.audio_transcoder import compact_key, transcode_audio
+from app.utils.waveform import peaks_key, generate_peaks
+from app.utils.media_workers import run_media_task
+from app.utils.quota import add_usage, check_quota
+
+class UploadStateError(ValueError):
+    """取决于存储或配额当前状态的上传错误，状态变化后重试可能成功
+    
+    Attributes:
+        status_code: 返回给客户端的HTTP状态码
+    """
+    
+    def __init__(self, message, status_code=409):
+        super().__init__(message)
+        self.status_code = status_code
+
+# 扩展名到MIME类型的映射（libmagic不可用或直传文件时使用）
+MIME_TYPES = {
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+    'mp3': 'audio/mpeg',
+    'wav': 'audio/wav',
+    'ogg': 'audio/ogg'
+}
 
 def allowed_file(filename, allowed_extensions):
     """检查文件扩展名是否在允许列表中"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
-def save_file(file, file_type='image'):
+def get_allowed_extensions(file_type):
+    """获取文件类型允许的扩展名"""
+    if file_type == 'image':
+        return current_app.config['ALLOWED_IMAGE_EXTENSIONS']
+    elif file_type == 'audio':
+        return current_app.config['ALLOWED_AUDIO_EXTENSIONS']
+    raise ValueError(f"不支持的文件类型: {file_type}")
+
+def shard_dirs(filename, depth):
+    """根据文件名（UUID）的十六进制前缀生成分片目录，如 ab/cd
+    
+    衍生文件与原文件共用UUID，因此总是落在同一目录下。
+    文件名不是UUID时返回None。
+    """
+    stem = filename.split('.', 1)[0].replace('-', '').lower()
+    if len(stem) < depth * 2 or any(c not in '0123456789abcdef' for c in stem):
+        return None
+    return '/'.join(stem[i * 2:i * 2 + 2] for i in range(depth))
+
+def build_file_key(file_type, ext, public=False):
+    """为新文件生成存储键
+
+    Args:
+        file_type: 文件类型，'image' 或 'audio'
+        ext: 文件扩展名
+        public: 是否为公开文件（头像、课程封面），公开文件由nginx直接提供
+
+    Returns:
+        tuple: (唯一文件名, 存储键)
+    """
+    unique_filename = f"{str(uuid.uuid4())}.{ext}"
+    
+    if current_app.config['UPLOAD_LAYOUT'] == 'hash':
+        # 按文件名的十六进制前缀分散到多级目录，避免单个目录文件过多
+        shards = shard_dirs(unique_filename, current_app.config['UPLOAD_SHARD_DEPTH'])
+        key = f"{file_type}/{shards}/{unique_filename}"
+    else:
+        # 创建基于日期的目录结构
+        date_str = datetime.now().strftime('%Y%m%d')
+        key = f"{file_type}/{date_str}/{unique_filename}"
+    if public:
+        key = f"public/{key}"
+    return unique_filename, key
+
+def file_sha256(file_path):
+    """分块计算文件的SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def save_file(file, file_type='image', public=False, owner_id=None):
     """保存上传的文件
     
     Args:
         file: 上传的文件对象
         file_type: 文件类型，'image' 或 'audio'
+        public: 是否为公开文件（头像、课程封面），
+            其余文件只能通过带权限检查的下载接口访问
+        owner_id: 上传者ID，提供时在uploads表中登记文件（需由调用方提交事务）
         
     Returns:
         dict: 包含存储路径和元数据的字典
@@ -27,12 +119,7 @@ def save_file(file, file_type='image'):
         return None
     
     # 检查文件类型
-    if file_type == 'image':
-        allowed_extensions = current_app.config['ALLOWED_IMAGE_EXTENSIONS']
-    elif file_type == 'audio':
-        allowed_extensions = current_app.config['ALLOWED_AUDIO_EXTENSIONS']
-    else:
-        raise ValueError(f"不支持的文件类型: {file_type}")
+    allowed_extensions = get_allowed_extensions(file_type)
     
     if not allowed_file(file.filename, allowed_extensions):
         raise ValueError(f"不允许的文件类型. 允许的类型: {', '.join(allowed_extensions)}")
@@ -42,72 +129,248 @@ def save_file(file, file_type='image'):
     
     # 创建唯一的文件名
     ext = filename.rsplit('.', 1)[1].lower()
-    unique_filename = f"{str(uuid.uuid4())}.{ext}"
+    unique_filename, key = build_file_key(file_type, ext, public)
     
-    # 创建基于日期的目录结构
-    date_str = datetime.now().strftime('%Y%m%d')
-    rel_path = os.path.join(file_type, date_str)
-    abs_path = os.path.join(current_app.config['UPLOAD_FOLDER'], rel_path)
+    storage = get_storage()
     
-    # 确保目录存在
-    os.makedirs(abs_path, exist_ok=True)
+    # 在本地路径上完成写入和分析，非本地后端在退出时上传
+    # 扩展名已通过白名单校验，按扩展名设置对象的Content-Type
+    with storage.staging(key, MIME_TYPES.get(ext, 'application/octet-stream')) as file_path:
+        file.save(file_path)
+        
+        # 规范化图像：限制像素、按EXIF旋转、去除元数据
+        normalize_stats = None
+        if file_type == 'image':
+            normalize_stats = run_media_task(normalize_image, file_path)
+            if normalize_stats['bytes_saved']:
+                current_app.logger.info(
+                    f"图像规范化节省 {normalize_stats['bytes_saved']} 字节: {key}"
+                )
+        
+        # 获取MIME类型
+        try:
+            mime_type = magic.from_file(file_path, mime=True)
+        except Exception:
+            # 如果libmagic不可用，尝试基于扩展名猜测
+            mime_type = MIME_TYPES.get(ext, 'application/octet-stream')
+        
+        # 获取文件元数据
+        result = {
+            'filename': filename,
+            'unique_filename': unique_filename,
+            'path': key,
+            'url': storage.url(key),
+            'mime_type': mime_type,
+            'size': os.path.getsize(file_path),
+            'sha256': file_sha256(file_path),
+            'upload_time': datetime.now().isoformat()
+        }
+        
+        # 处理特定类型的文件
+        if file_type == 'image':
+            result.update({
+                'original_size': normalize_stats['original_size'],
+                'bytes_saved': normalize_stats['bytes_saved']
+            })
+            
+            try:
+                with Image.open(file_path) as img:
+                    result.update({
+                        'width': img.width,
+                        'height': img.height,
+                        'format': img.format
+                    })
+            except Exception as e:
+                print(f"无法处理图像文件: {e}")
+            
+            # 生成缩略图等衍生图，失败时仍保留原图
+            # 公开文件（头像、封面）只保存URL，不会引用衍生图
+            if current_app.config['IMAGE_DERIVATIVES_ON_INGEST'] and not public and 'width' in result:
+                try:
+                    result['derivatives'] = run_media_task(generate_derivatives, file_path, key)
+                except Exception as e:
+                    current_app.logger.warning(f"生成衍生图失败: {e}")
+        
+        elif file_type == 'audio':
+            try:
+                audio = AudioSegment.from_file(file_path)
+                result.update({
+                    'duration': len(audio) / 1000.0,  # 以秒为单位
+                    'channels': audio.channels,
+                    'frame_rate': audio.frame_rate,
+                    'sample_width': audio.sample_width
+                })
+            except Exception as e:
+                print(f"无法处理音频文件: {e}")
+            
+            if result.get('duration'):
+                result['bitrate'] = int(result['size'] * 8 / result['duration'])
+            
+            # 生成紧凑版本，失败时仍保留原文件
+            if current_app.config['AUDIO_TRANSCODE_ENABLED']:
+                try:
+                    result['compact'] = run_media_task(
+                        transcode_audio, file_path, key, result.get('duration')
+                    )
+                except Exception as e:
+                    current_app.logger.warning(f"音频转码失败: {e}")
+            
+            # 预先计算波形峰值，播放器无需下载整个文件即可绘制波形
+            try:
+                result['peaks'] = run_media_task(generate_peaks, file_path, key)
+            except Exception as e:
+                current_app.logger.warning(f"提取波形失败: {e}")
     
-    # 保存文件
-    file_path = os.path.join(abs_path, unique_filename)
-    file.save(file_path)
+    if owner_id is not None:
+        record_upload(result, owner_id, file_type)
     
-    # 获取MIME类型
-    try:
-        mime_type = magic.from_file(file_path, mime=True)
-    except Exception:
-        # 如果libmagic不可用，尝试基于扩展名猜测
-        mime_types = {
-            'jpg': 'image/jpeg',
-            'jpeg': 'image/jpeg',
-            'png': 'image/png',
-            'gif': 'image/gif',
-            'mp3': 'audio/mpeg',
-            'wav': 'audio/wav',
-            'ogg': 'audio/ogg'
-        }
-        mime_type = mime_types.get(ext, 'application/octet-stream')
+    return result
+
+def save_files(files, file_type='image', owner_id=None):
+    """并行保存同一请求中的多个上传文件
     
-    # 获取文件元数据
-    result = {
-        'filename': filename,
-        'unique_filename': unique_filename,
-        'path': os.path.join(rel_path, unique_filename),
-        'url': f"/static/uploads/{rel_path}/{unique_filename}",
-        'mime_type': mime_type,
-        'size': os.path.getsize(file_path),
-        'upload_time': datetime.now().isoformat()
-    }
+    使用有限大小的线程池同时处理多个文件，请求耗时取决于最慢的文件，
+    而不是所有文件耗时之和。
     
-    # 处理特定类型的文件
-    if file_type == 'image':
+    Args:
+        files: 上传的文件对象列表，未选择文件的项会被忽略
+        file_type: 文件类型，'image' 或 'audio'
+        owner_id: 上传者ID，提供时在uploads表中登记文件
+        
+    Returns:
+        list: 与输入顺序一致的元数据字典列表
+        
+    Raises:
+        ValueError: 任一文件校验失败，此时已保存的文件会被删除
+        UploadStateError: 任一文件因存储等原因保存失败（503），此时已保存的文件会被删除
+    """
+    files = [f for f in files if f and f.filename]
+    if not files:
+        return []
+    
+    app = current_app._get_current_object()
+    
+    def task(file):
+        with app.app_context():
+            return save_file(file, file_type)
+    
+    max_workers = min(len(files), app.config['INGEST_WORKERS'])
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ingest') as executor:
+        futures = [executor.submit(task, file) for file in files]
+    
+    results = []
+    error = None
+    for future in futures:
         try:
-            with Image.open(file_path) as img:
-                result.update({
-                    'width': img.width,
-                    'height': img.height,
-                    'format': img.format
-                })
+            results.append(future.result())
         except Exception as e:
-            print(f"无法处理图像文件: {e}")
+            error = error or e
     
-    elif file_type == 'audio':
+    # 任一文件失败时清理已保存的文件，避免留下孤立文件
+    if error:
+        for info in results:
+            if info:
+                for path in file_info_paths(info):
+                    delete_file(path)
+        if isinstance(error, ValueError):
+            raise error
+        # 存储或处理异常转换为调用方统一处理的错误，不向客户端暴露内部信息
+        current_app.logger.error(f"保存上传文件失败: {error!r}")
+        raise UploadStateError('文件保存失败，请稍后重试', 503) from error
+    
+    # 数据库会话不能跨线程使用，在当前线程中统一登记
+    results = [info for info in results if info]
+    if owner_id is not None:
+        for info in results:
+            record_upload(info, owner_id, file_type)
+    
+    return results
+
+def record_upload(info, owner_id, file_type):
+    """在uploads表中登记文件及其衍生文件，并计入上传者的存储用量（由调用方提交事务）"""
+    upload = Upload.from_file_info(info, owner_id, file_type)
+    db.session.add(upload)
+    
+    rows = [upload] + list(upload.derivatives)
+    add_usage('user', owner_id, sum(row.size for row in rows), len(rows))
+    return upload
+
+def link_uploads(content, submission_id=None, feedback_id=None, course_id=None):
+    """将内容引用的文件关联到提交或反馈，并计入课程的存储用量
+    
+    提交或反馈及待登记的文件需已写入数据库（flush）。
+    """
+    paths = content_paths(content)
+    if not paths:
+        return
+    
+    values = {'submission_id': submission_id} if submission_id else {'feedback_id': feedback_id}
+    if course_id:
+        # 只统计尚未计入课程的文件，重复关联不会重复计数
+        nbytes, nfiles = db.session.query(func.coalesce(func.sum(Upload.size), 0), func.count(Upload.id)) \
+            .filter(Upload.path.in_(paths), Upload.course_id.is_(None)) \
+            .one()
+        add_usage('course', course_id, nbytes, nfiles)
+        values['course_id'] = course_id
+    
+    Upload.query.filter(Upload.path.in_(paths)).update(values, synchronize_session=False)
+
+def release_upload(file_path):
+    """删除文件的uploads记录，并从上传者和课程的存储用量中扣除"""
+    upload = Upload.query.filter_by(path=file_path).first()
+    if not upload:
+        return
+    
+    add_usage('user', upload.owner_id, -upload.size, -1)
+    add_usage('course', upload.course_id, -upload.size, -1)
+    Upload.query.filter_by(id=upload.id).delete(synchronize_session=False)
+
+def release_linked_uploads(submission_ids=(), feedback_ids=()):
+    """删除提交或反馈关联文件的uploads记录，并从上传者和课程的存储用量中扣除
+    
+    与删除提交或反馈在同一事务中执行（由调用方提交事务），
+    存储中的文件需在事务提交后通过delete_stored_files删除。
+    
+    Returns:
+        list: 需要从存储中删除的路径（包括按需生成的衍生文件）
+    """
+    conditions = []
+    if submission_ids:
+        conditions.append(Upload.submission_id.in_(submission_ids))
+    if feedback_ids:
+        conditions.append(Upload.feedback_id.in_(feedback_ids))
+    if not conditions:
+        return []
+    
+    uploads = Upload.query.filter(or_(*conditions)).all()
+    if not uploads:
+        return []
+    
+    usage = Counter()
+    files = Counter()
+    paths = []
+    for upload in uploads:
+        for scope, scope_id in (('user', upload.owner_id), ('course', upload.course_id)):
+            usage[scope, scope_id] += upload.size
+            files[scope, scope_id] += 1
+        paths.append(upload.path)
+        if upload.variant == 'original':
+            paths.extend(derived_paths(upload.path))
+    
+    for (scope, scope_id), nbytes in usage.items():
+        add_usage(scope, scope_id, -nbytes, -files[scope, scope_id])
+    Upload.query.filter(Upload.id.in_([upload.id for upload in uploads])) \
+        .delete(synchronize_session=False)
+    return sorted(set(paths))
+
+def delete_stored_files(paths):
+    """从存储中删除文件，删除失败的文件留给孤立文件清理处理"""
+    storage = get_storage()
+    for path in paths:
         try:
-            audio = AudioSegment.from_file(file_path)
-            result.update({
-                'duration': len(audio) / 1000.0,  # 以秒为单位
-                'channels': audio.channels,
-                'frame_rate': audio.frame_rate,
-                'sample_width': audio.sample_width
-            })
+            storage.delete(path)
         except Exception as e:
-            print(f"无法处理音频文件: {e}")
-    
-    return result
+            current_app.logger.warning(f"删除文件失败 {path}: {e}")
 
 def delete_file(file_path):
     """删除文件
@@ -119,11 +382,146 @@ def delete_file(file_path):
         bool: 是否成功删除
     """
     try:
-        abs_path = os.path.join(current_app.config['UPLOAD_FOLDER'], file_path)
-        if os.path.exists(abs_path):
-            os.remove(abs_path)
-            return True
-        return False
+        release_upload(file_path)
+        return get_storage().delete(file_path)
     except Exception as e:
         print(f"删除文件时出错: {e}")
-        return False
\ No newline at end of file
+        return False
+
+def iter_content_files(content):
+    """遍历提交或反馈内容中的所有文件元数据"""
+    for image in content.get('images') or []:
+        yield image
+    if content.get('audio'):
+        yield content['audio']
+
+def file_info_paths(info):
+    """获取单个文件元数据对应的所有存储路径（包括衍生文件）"""
+    paths = set()
+    if info.get('path'):
+        paths.add(info['path'])
+    for derivative in (info.get('derivatives') or {}).values():
+        paths.add(derivative['path'])
+    for extra in ('compact', 'peaks'):
+        if info.get(extra):
+            paths.add(info[extra]['path'])
+    return paths
+
+def derived_paths(path):
+    """原文件可能按需生成的衍生文件路径（衍生图、紧凑音频、波形）
+    
+    历史文件的衍生文件在首次访问时才生成，不会记录在content中。
+    """
+    for variant in DERIVATIVE_SIZES:
+        yield derivative_key(path, variant)
+    yield compact_key(path)
+    yield peaks_key(path)
+
+def content_paths(content):
+    """获取提交或反馈内容引用的所有存储路径（包括衍生文件）"""
+    paths = set()
+    for info in iter_content_files(content):
+        paths |= file_info_paths(info)
+    return paths
+
+def path_from_url(url):
+    """从文件URL反解出存储路径，无法识别时返回None"""
+    return get_storage().key_from_url(url)
+
+def create_upload_ticket(user_id, filename, file_type='image'):
+    """为直传到存储后端的上传生成预签名地址和上传凭证
+    
+    Args:
+        user_id: 上传者ID
+        filename: 原始文件名
+        file_type: 文件类型，'image' 或 'audio'
+        
+    Returns:
+        dict: 包含上传地址、存储路径和上传凭证的字典
+    """
+    allowed_extensions = get_allowed_extensions(file_type)
+    if not filename or not allowed_file(filename, allowed_extensions):
+        raise ValueError(f"不允许的文件类型. 允许的类型: {', '.join(allowed_extensions)}")
+    
+    filename = secure_filename(filename)
+    ext = filename.rsplit('.', 1)[1].lower()
+    unique_filename, key = build_file_key(file_type, ext)
+    mime_type = MIME_TYPES.get(ext, 'application/octet-stream')
+    expires_in = current_app.config['PRESIGNED_URL_EXPIRES']
+    
+    storage = get_storage()
+    upload_url = storage.presigned_put(key, content_type=mime_type, expires_in=expires_in)
+    
+    # 上传凭证绑定上传者和存储路径，防止提交时引用他人的文件
+    payload = {
+        'exp': datetime.utcnow() + timedelta(seconds=expires_in),
+        'sub': user_id,
+        'key': key,
+        'filename': filename,
+        'file_type': file_type
+    }
+    upload_token = jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')
+    
+    return {
+        'method': 'PUT',
+        'upload_url': upload_url,
+        'headers': {'Content-Type': mime_type},
+        'path': key,
+        'expires_in': expires_in,
+        'upload_token': upload_token
+    }
+
+def register_uploaded_file(upload_token, user_id, file_type='image'):
+    """登记已直传到存储后端的文件
+    
+    Args:
+        upload_token: create_upload_ticket生成的上传凭证
+        user_id: 当前用户ID，必须与凭证中的上传者一致
+        file_type: 期望的文件类型
+        
+    Returns:
+        dict: 与save_file格式一致的元数据字典
+        
+    Raises:
+        ValueError: 上传凭证无效或与当前请求不匹配
+        UploadStateError: 文件尚未上传，或大小超出限制或配额
+    """
+    try:
+        payload = jwt.decode(upload_token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+    except jwt.InvalidTokenError:
+        raise ValueError('上传凭证无效或已过期')
+    
+    if payload.get('sub') != user_id or payload.get('file_type') != file_type:
+        raise ValueError('上传凭证与当前请求不匹配')
+    
+    key = payload['key']
+    storage = get_storage()
+    head = storage.head(key)
+    if head is None:
+        raise UploadStateError('文件尚未上传到存储', 409)
+    
+    ext = key.rsplit('.', 1)[1].lower()
+    result = {
+        'filename': payload['filename'],
+        'unique_filename': key.rsplit('/', 1)[-1],
+        'path': key,
+        'url': storage.url(key),
+        'mime_type': head.get('mime_type') or MIME_TYPES.get(ext, 'application/octet-stream'),
+        'size': head['size'],
+        'upload_time': datetime.now().isoformat()
+    }
+    
+    # 同一凭证重复提交时只登记一次
+    if not Upload.query.filter_by(path=key).first():
+        # 预签名时只能检查客户端声明的大小，登记前按存储中的实际大小重新检查
+        error = None
+        if head['size'] > current_app.config['MAX_CONTENT_LENGTH']:
+            error = f"文件大小超出限制（{current_app.config['MAX_CONTENT_LENGTH'] / 1024 / 1024:.0f} MB）"
+        elif db.session.get(User, user_id).is_student():
+            error = check_quota('user', user_id, head['size'])
+        if error:
+            storage.delete(key)
+            raise UploadStateError(error, 413)
+        record_upload(result, user_id, file_type)
+    
+    return result
@@ -0,0 +1,260 @@
+# app/utils/final_grades.py
+from datetime import datetime
+import numpy as np
+from sqlalchemy import event, func, insert
+from sqlalchemy.orm import Session
+from app import db
+from app.models import Course, Homework, Submission, Feedback, FinalGrade, StaleFinalGrade, student_courses
+from app.utils.gradebook import course_homeworks
+from app.utils.query_helpers import latest_scores_subquery
+
+SECONDS_PER_DAY = 86400
+
+
+def compute_final_grades(scores, submitted, late_days, weights, due_passed,
+                         drop_lowest=0, late_penalty_per_day=0, late_penalty_max=100):
+    """对 学生 × 作业 的分数矩阵一次性计算总评
+
+    规则依次为：迟交按天数扣除分数的百分比（不超过上限）；截止后仍未提交的作业记0分，
+    已提交未批改或未到截止时间的作业不计入；每个学生去掉最低的若干个计入分数
+    （至少保留一个）；剩余作业按权重加权平均。
+
+    Args:
+        scores: 分数矩阵，未批改为NaN
+        submitted: 是否有提交的布尔矩阵
+        late_days: 迟交天数矩阵（不足一天按一天计）
+        weights: 每个作业的权重
+        due_passed: 每个作业是否已过截止时间
+        drop_lowest: 去掉最低分的作业数
+        late_penalty_per_day: 迟交每天扣除的百分比
+        late_penalty_max: 迟交扣分的百分比上限
+
+    Returns:
+        tuple: (总评数组，没有计入作业的为NaN, 计入作业数数组, 去掉作业数数组)
+    """
+    penalty = np.minimum(late_days * late_penalty_per_day, late_penalty_max) / 100
+    effective = scores * (1 - np.clip(penalty, 0, 1))
+    effective = np.where(~submitted & due_passed[np.newaxis, :], 0.0, effective)
+    counted = ~np.isnan(effective) & (weights > 0)[np.newaxis, :]
+
+    dropped = np.zeros(scores.shape[0], dtype=np.int64)
+    if drop_lowest and scores.size:
+        dropped = np.minimum(drop_lowest, np.maximum(counted.sum(axis=1) - 1, 0))
+        # 计入的分数从低到高排在前面，按名次去掉最低的若干个
+        order = np.argsort(np.where(counted, effective, np.inf), axis=1, kind='stable')
+        ranks = np.empty_like(order)
+        np.put_along_axis(ranks, order, np.broadcast_to(np.arange(scores.shape[1]), order.shape), axis=1)
+        counted &= ranks >= dropped[:, np.newaxis]
+
+    counted_weights = np.where(counted, weights[np.newaxis, :], 0.0)
+    total_weight = counted_weights.sum(axis=1)
+    weighted = (np.where(counted, effective, 0.0) * counted_weights).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        grades = np.where(total_weight > 0, weighted / total_weight, np.nan)
+    return grades, counted.sum(axis=1), dropped
+
+
+def load_grade_inputs(course_id, homeworks, student_ids):
+    """一次查询取出学生最新提交的分数和提交时间，构造计算总评所需的矩阵"""
+    row_index = {student_id: i for i, student_id in enumerate(student_ids)}
+    column_index = {homework.id: j for j, homework in enumerate(homeworks)}
+    shape = (len(student_ids), len(homeworks))
+
+    scores = np.full(shape, np.nan)
+    submitted_at = np.full(shape, np.datetime64('NaT'), dtype='datetime64[s]')
+
+    if student_ids and homeworks:
+        latest = latest_scores_subquery(course_id=course_id, student_ids=student_ids)
+        rows = db.session.query(latest.c.student_id, latest.c.homework_id, latest.c.score, latest.c.submitted_at)
+        for student_id, homework_id, score, created_at in rows:
+            if student_id not in row_index:
+                continue
+            index = row_index[student_id], column_index[homework_id]
+            scores[index] = np.nan if score is None else score
+            submitted_at[index] = created_at
+
+    due_dates = np.array([homework.due_date for homework in homeworks], dtype='datetime64[s]')
+    late_seconds = (submitted_at - due_dates[np.newaxis, :]).astype(np.float64)
+    late_seconds[np.isnat(submitted_at) | np.isnat(due_dates)[np.newaxis, :]] = 0
+    late_days = np.ceil(np.maximum(late_seconds, 0) / SECONDS_PER_DAY)
+
+    return scores, ~np.isnat(submitted_at), late_days
+
+
+def recompute_final_grades(course_id, student_ids=None):
+    """重新计算并保存课程的总评成绩，由调用方提交事务
+
+    Args:
+        course_id: 课程ID
+        student_ids: 只重新计算这些学生，默认为全部选课学生；不再选课的学生的总评会被删除
+
+    Returns:
+        int: 计算的学生数
+    """
+    course = db.session.get(Course, course_id)
+    if course is None:
+        return 0
+
+    homeworks = course_homeworks(course_id)
+    enrolled = db.session.query(student_courses.c.student_id) \
+        .filter(student_courses.c.course_id == course_id)
+    if student_ids is not None:
+        enrolled = enrolled.filter(student_courses.c.student_id.in_(student_ids))
+    students = sorted(student_id for (student_id,) in enrolled)
+
+    scores, submitted, late_days = load_grade_inputs(course_id, homeworks, students)
+    now = datetime.utcnow()
+    grades, counted, dropped = compute_final_grades(
+        scores, submitted, late_days,
+        weights=np.array([homework.weight for homework in homeworks], dtype=np.float64),
+        due_passed=np.array([bool(homework.due_date and homework.due_date <= now) for homework in homeworks]),
+        drop_lowest=course.drop_lowest,
+        late_penalty_per_day=course.late_penalty_per_day,
+        late_penalty_max=course.late_penalty_max
+    )
+
+    existing = FinalGrade.query.filter_by(course_id=course_id)
+    if student_ids is not None:
+        existing = existing.filter(FinalGrade.student_id.in_(student_ids))
+    existing = {row.student_id: row for row in existing}
+
+    for i, student_id in enumerate(students):
+        row = existing.pop(student_id, None) or FinalGrade(course_id=course_id, student_id=student_id)
+        row.grade = None if np.isnan(grades[i]) else round(float(grades[i]), 2)
+        row.counted = int(counted[i])
+        row.dropped = int(dropped[i])
+        row.computed_at = now
+        db.session.add(row)
+
+    for row in existing.values():
+        db.session.delete(row)
+
+    return len(students)
+
+
+def _deadline_passed_since_compute(course_id):
+    """上次计算后是否有作业到了截止时间（未提交的作业改记0分），从未计算过时也返回True"""
+    oldest = db.session.query(func.min(FinalGrade.computed_at)) \
+        .filter(FinalGrade.course_id == course_id) \
+        .scalar()
+    if oldest is None:
+        return True
+    passed = db.session.query(Homework.id).filter(
+        Homework.course_id == course_id,
+        Homework.due_date > oldest,
+        Homework.due_date <= datetime.utcnow()
+    ).first()
+    return passed is not None
+
+
+def refresh_stale_final_grades(course_id):
+    """按过期标记重新计算总评，由调用方提交事务
+
+    只重新计算被标记的学生；标记了整个课程，或上次计算后有作业到了截止时间时
+    重新计算整个课程。计算后删除已处理的标记，计算期间新增的标记保留到下一次。
+
+    Returns:
+        bool: 是否重新计算
+    """
+    marks = db.session.query(StaleFinalGrade.id, StaleFinalGrade.student_id) \
+        .filter(StaleFinalGrade.course_id == course_id) \
+        .all()
+    
+    if any(student_id is None for _, student_id in marks) or _deadline_passed_since_compute(course_id):
+        recompute_final_grades(course_id)
+    elif marks:
+        recompute_final_grades(course_id, sorted({student_id for _, student_id in marks}))
+    else:
+        return False
+    
+    if marks:
+        StaleFinalGrade.query.filter(StaleFinalGrade.id.in_([mark_id for mark_id, _ in marks])) \
+            .delete(synchronize_session=False)
+    return True
+
+
+def refresh_all_stale_final_grades():
+    """后台任务：处理所有课程的过期标记，每个课程单独提交
+
+    Returns:
+        int: 重新计算的课程数
+    """
+    count = 0
+    for (course_id,) in db.session.query(Course.id).order_by(Course.id).all():
+        if refresh_stale_final_grades(course_id):
+            count += 1
+        db.session.commit()
+    return count
+
+
+def mark_final_grades_stale(course_id, student_ids=None, session=None):
+    """在本事务中标记需要重新计算的总评，也用于绕过ORM的批量写入
+
+    标记在事务提交时写入stale_final_grades表，与成绩修改一起提交或回滚。
+
+    Args:
+        student_ids: 受影响的学生，默认为整个课程
+    """
+    stale = (session or db.session).info.setdefault('stale_final_grades', {})
+    if student_ids is None or course_id in stale and stale[course_id] is None:
+        stale[course_id] = None
+    else:
+        stale.setdefault(course_id, set()).update(student_ids)
+
+
+def _submission_scope(session, submission):
+    """提交所属的课程和学生"""
+    homework = session.get(Homework, submission.homework_id) if submission and submission.homework_id else None
+    if homework is None:
+        return None, None
+    return homework.course_id, submission.student_id
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_stale_final_grades(session, flush_context, instances):
+    with session.no_autoflush:
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+            if isinstance(obj, Feedback):
+                submission = session.get(Submission, obj.submission_id) if obj.submission_id else None
+                course_id, student_id = _submission_scope(session, submission)
+            elif isinstance(obj, Submission):
+                course_id, student_id = _submission_scope(session, obj)
+            elif isinstance(obj, Homework):
+                course_id, student_id = obj.course_id, None
+            elif isinstance(obj, Course) and obj not in session.new and obj not in session.deleted:
+                # 评分规则或选课学生变化
+                course_id, student_id = obj.id, None
+            else:
+                continue
+            if course_id is not None:
+                mark_final_grades_stale(course_id, None if student_id is None else [student_id], session)
+
+
+@event.listens_for(Session, 'before_commit')
+def _persist_stale_final_grades(session):
+    # before_commit在提交前的最后一次flush之前触发，先写入待提交的修改以收集受影响的学生；
+    # 事务内只追加过期标记，不计算总评，也不锁定总评行
+    if session.new or session.dirty or session.deleted:
+        session.flush()
+    stale = session.info.pop('stale_final_grades', None)
+    if not stale:
+        return
+    rows = []
+    for course_id, student_ids in sorted(stale.items()):
+        # 本事务中删除的课程不需要标记
+        if session.get(Course, course_id) is None:
+            continue
+        if student_ids is None:
+            rows.append({'course_id': course_id, 'student_id': None, 'marked_at': datetime.utcnow()})
+        else:
+            rows.extend({'course_id': course_id, 'student_id': student_id, 'marked_at': datetime.utcnow()}
+                        for student_id in sorted(student_ids))
+    if rows:
+        session.execute(insert(StaleFinalGrade), rows)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_stale_final_grades(session):
+    session.info.pop('stale_final_grades', None)
@@ -0,0 +1,215 @@
+# app/utils/gradebook.py
+import re
+from xml.sax.saxutils import escape
+from sqlalchemy import and_
+from app import db
+from app.models import Homework, User, student_courses
+from app.utils.query_helpers import latest_scores_subquery, latest_graded_scores_subquery
+from app.utils.submission_export import csv_line
+from app.utils.zipstream import zip_stream, IterReader
+
+# 每批从数据库读取的行数
+GRADEBOOK_BATCH_SIZE = 500
+
+# 成绩矩阵中状态码对应的提交状态
+STATUS_LABELS = ['submitted', 'graded', 'needs_revision', 'revised']
+
+# XML 1.0不允许的控制字符
+_ILLEGAL_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def course_homeworks(course_id):
+    """课程的作业列表，即成绩册的列"""
+    return Homework.query.filter_by(course_id=course_id) \
+        .order_by(Homework.due_date.is_(None), Homework.due_date, Homework.id) \
+        .all()
+
+
+def iter_gradebook_rows(course_id, homeworks):
+    """按学生流式生成成绩册的行
+
+    选课学生左连接每个作业最近一个已批改版本的分数，批改后重新提交
+    但尚未批改的作业仍显示之前的分数。结果按学生排序，
+    同一学生的行是连续的，逐个学生拼装后立即输出。
+
+    Yields:
+        list: [学生ID, 用户名, 邮箱, 各作业分数...]，没有成绩的作业为None
+    """
+    scores = latest_graded_scores_subquery(course_id=course_id)
+    column_index = {homework.id: i for i, homework in enumerate(homeworks)}
+
+    rows = db.session.query(User.id, User.username, User.email, scores.c.homework_id, scores.c.score) \
+        .join(student_courses, student_courses.c.student_id == User.id) \
+        .outerjoin(scores, scores.c.student_id == User.id) \
+        .filter(student_courses.c.course_id == course_id) \
+        .order_by(User.username, User.id) \
+        .yield_per(GRADEBOOK_BATCH_SIZE)
+
+    current = None
+    for student_id, username, email, homework_id, score in rows:
+        if current is None or current[0] != student_id:
+            if current is not None:
+                yield current
+            current = [student_id, username, email] + [None] * len(homeworks)
+        if homework_id in column_index:
+            current[3 + column_index[homework_id]] = score
+
+    if current is not None:
+        yield current
+
+
+def gradebook_matrix(course_id):
+    """计算课程的 学生 × 作业 成绩矩阵
+
+    一次分组查询取出每个学生在每个作业上的最新提交，结果按行优先
+    展开为定长的列数组，第 i 个学生第 j 个作业位于下标 i * 作业数 + j。
+    状态以 STATUS_LABELS 中的下标表示，没有提交的格子各数组均为None。
+
+    Returns:
+        dict: shape、homeworks、students 以及 status、score、versions、late 数组
+    """
+    homeworks = course_homeworks(course_id)
+    students = db.session.query(User.id, User.username) \
+        .join(student_courses, student_courses.c.student_id == User.id) \
+        .filter(student_courses.c.course_id == course_id) \
+        .order_by(User.username, User.id) \
+        .all()
+
+    row_index = {student_id: i for i, (student_id, _) in enumerate(students)}
+    column_index = {homework.id: j for j, homework in enumerate(homeworks)}
+    status_codes = {status: code for code, status in enumerate(STATUS_LABELS)}
+    width = len(homeworks)
+    size = len(students) * width
+
+    matrix = {
+        'status': [None] * size,
+        'score': [None] * size,
+        'versions': [None] * size,
+        'late': [None] * size
+    }
+
+    scores = latest_scores_subquery(course_id=course_id)
+    late = and_(Homework.due_date.isnot(None), scores.c.submitted_at > Homework.due_date)
+    rows = db.session.query(
+        scores.c.student_id,
+        scores.c.homework_id,
+        scores.c.status,
+        scores.c.score,
+        scores.c.version_count,
+        late
+    ).join(Homework, Homework.id == scores.c.homework_id)
+
+    for student_id, homework_id, status, score, version_count, is_late in rows:
+        # 已退课学生的提交不在矩阵中
+        if student_id not in row_index:
+            continue
+        index = row_index[student_id] * width + column_index[homework_id]
+        matrix['status'][index] = status_codes.get(status)
+        matrix['score'][index] = score
+        matrix['versions'][index] = version_count
+        matrix['late'][index] = bool(is_late)
+
+    return {
+        'shape': [len(students), width],
+        'status_labels': STATUS_LABELS,
+        'homeworks': {
+            'id': [homework.id for homework in homeworks],
+            'title': [homework.title for homework in homeworks],
+            'due_date': [homework.due_date.isoformat() if homework.due_date else None for homework in homeworks]
+        },
+        'students': {
+            'id': [student_id for student_id, _ in students],
+            'username': [username for _, username in students]
+        },
+        **matrix
+    }
+
+
+def gradebook_header(homeworks):
+    return ['student_id', 'username', 'email'] + [homework.title for homework in homeworks]
+
+
+def gradebook_csv(course_id):
+    """生成CSV格式成绩册的字节块"""
+    homeworks = course_homeworks(course_id)
+    # 带BOM，Excel可以正确识别中文
+    yield b'\xef\xbb\xbf' + csv_line(gradebook_header(homeworks))
+
+    for row in iter_gradebook_rows(course_id, homeworks):
+        yield csv_line(['' if value is None else value for value in row])
+
+
+def _xlsx_cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    text = escape(_ILLEGAL_XML_CHARS.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return ('<row>' + ''.join(_xlsx_cell(value) for value in values) + '</row>').encode('utf-8')
+
+
+def _xlsx_sheet(course_id, homeworks):
+    """逐行生成工作表XML，使用内联字符串，不需要共享字符串表"""
+    yield (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<sheetData>'
+    ).encode('utf-8')
+    yield _xlsx_row(gradebook_header(homeworks))
+    for row in iter_gradebook_rows(course_id, homeworks):
+        yield _xlsx_row(row)
+    yield b'</sheetData></worksheet>'
+
+
+_XLSX_STATIC_PARTS = [
+    ('[Content_Types].xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+     '<Default Extension="xml" ContentType="application/xml"/>'
+     '<Override PartName="/xl/workbook.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+     '<Override PartName="/xl/worksheets/sheet1.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+     '</Types>'),
+    ('_rels/.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+     'Target="xl/workbook.xml"/>'
+     '</Relationships>'),
+    ('xl/workbook.xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+     'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+     '<sheets><sheet name="Gradebook" sheetId="1" r:id="rId1"/></sheets>'
+     '</workbook>'),
+    ('xl/_rels/workbook.xml.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+     'Target="worksheets/sheet1.xml"/>'
+     '</Relationships>'),
+]
+
+
+def gradebook_xlsx(course_id):
+    """生成XLSX格式成绩册的字节块
+
+    XLSX是包含若干XML文件的ZIP包，工作表XML边查询边生成并压缩输出。
+    """
+    homeworks = course_homeworks(course_id)
+
+    def entries():
+        for name, xml in _XLSX_STATIC_PARTS:
+            data = xml.encode('utf-8')
+            yield name, IterReader([data]), len(data), None
+        yield 'xl/worksheets/sheet1.xml', IterReader(_xlsx_sheet(course_id, homeworks)), 0, None
+
+    return zip_stream(entries())
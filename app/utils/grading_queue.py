@@ -0,0 +1,189 @@
+# app/utils/grading_queue.py
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import exists, func, select, insert, or_, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from app import db
+from app.models import Submission, Homework, GradingClaim
+
+# 等待批改的提交状态
+UNGRADED_STATUSES = ('submitted', 'revised')
+
+
+def _insert_claims(rows, now):
+    """插入认领，已存在的认领只有在过期时才会被替换
+
+    使用 INSERT ... ON CONFLICT DO UPDATE ... WHERE expires_at <= now，
+    冲突的认领行被并发事务锁定时会等待其提交，再按最新数据判断是否过期，
+    因此不会覆盖别人刚刚认领的提交。
+
+    Returns:
+        set: 实际认领到的提交ID
+    """
+    table = GradingClaim.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as upsert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as upsert
+    else:
+        # 不支持ON CONFLICT的数据库逐行在保存点内删除过期认领后插入
+        claimed = set()
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(table.delete().where(
+                        table.c.submission_id == row['submission_id'], table.c.expires_at <= now
+                    ))
+                    db.session.execute(insert(table).values(row))
+                claimed.add(row['submission_id'])
+            except IntegrityError:
+                continue
+        return claimed
+
+    stmt = upsert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.submission_id],
+        set_={name: stmt.excluded[name] for name in ('grader_id', 'course_id', 'claimed_at', 'expires_at')},
+        where=table.c.expires_at <= now
+    ).returning(table.c.submission_id)
+    return {submission_id for (submission_id,) in db.session.execute(stmt)}
+
+
+def claim_submissions(grader_id, course_id, count, homework_id=None):
+    """从批改队列中认领若干个未批改的提交，由调用方提交事务
+
+    只认领每个学生的最新版本，按作业截止时间、提交时间先后排序。
+    用 SELECT ... FOR UPDATE SKIP LOCKED 锁定候选提交，并发认领的教师
+    会跳过彼此正在认领的行，不用互相等待。READ COMMITTED 下锁定后不会重新检查
+    认领条件，刚被其他教师认领并提交的行仍可能被选中，写入认领时
+    只替换已过期的认领，这样的行不会被认领，因此返回的数量可能少于count。
+    认领在 GRADING_LEASE_SECONDS 后过期，过期的认领可以被重新认领。
+
+    Returns:
+        list: 新认领的 (GradingClaim, Submission)
+    """
+    now = datetime.utcnow()
+    newer = aliased(Submission)
+
+    query = Submission.query \
+        .join(Homework, Homework.id == Submission.homework_id) \
+        .filter(
+            Homework.course_id == course_id,
+            Submission.status.in_(UNGRADED_STATUSES),
+            ~exists().where(
+                newer.homework_id == Submission.homework_id,
+                newer.student_id == Submission.student_id,
+                newer.version > Submission.version
+            ),
+            ~exists().where(
+                GradingClaim.submission_id == Submission.id,
+                GradingClaim.expires_at > now
+            )
+        )
+    if homework_id is not None:
+        query = query.filter(Submission.homework_id == homework_id)
+
+    submissions = query \
+        .order_by(Homework.due_date.is_(None), Homework.due_date, Submission.created_at, Submission.id) \
+        .limit(count) \
+        .with_for_update(skip_locked=True, of=Submission) \
+        .all()
+    if not submissions:
+        return []
+
+    expires_at = now + timedelta(seconds=current_app.config['GRADING_LEASE_SECONDS'])
+    claimed = _insert_claims([{
+        'submission_id': submission.id,
+        'grader_id': grader_id,
+        'course_id': course_id,
+        'claimed_at': now,
+        'expires_at': expires_at
+    } for submission in submissions], now)
+    if not claimed:
+        return []
+
+    # 会话中可能缓存着被替换的过期认领，重新加载
+    claims = {
+        claim.submission_id: claim
+        for claim in GradingClaim.query
+        .filter(GradingClaim.submission_id.in_(claimed))
+        .populate_existing()
+    }
+    return [(claims[submission.id], submission) for submission in submissions if submission.id in claimed]
+
+
+def submission_with_next(submission_id, grader_id):
+    """一次查询取出提交及批改队列中的下一个待批改提交
+
+    下一个提交按批改队列的顺序（作业截止时间、提交时间）用 lead() 窗口函数确定，
+    只考虑同一课程中每个学生的最新版本，跳过其他教师尚未过期的认领。
+
+    Returns:
+        tuple: (提交, 下一个提交)，不存在时为None
+    """
+    current = aliased(Submission)
+    newer = aliased(Submission)
+    course_id = select(Homework.course_id) \
+        .join(current, current.homework_id == Homework.id) \
+        .where(current.id == submission_id) \
+        .scalar_subquery()
+
+    pending = and_(
+        Submission.status.in_(UNGRADED_STATUSES),
+        ~exists().where(
+            newer.homework_id == Submission.homework_id,
+            newer.student_id == Submission.student_id,
+            newer.version > Submission.version
+        ),
+        ~exists().where(
+            GradingClaim.submission_id == Submission.id,
+            GradingClaim.grader_id != grader_id,
+            GradingClaim.expires_at > datetime.utcnow()
+        )
+    )
+    next_id = func.lead(Submission.id).over(
+        order_by=(Homework.due_date.is_(None), Homework.due_date, Submission.created_at, Submission.id)
+    ).label('next_id')
+    queue = db.session.query(Submission.id, next_id) \
+        .join(Homework, Homework.id == Submission.homework_id) \
+        .filter(Homework.course_id == course_id, or_(Submission.id == submission_id, pending)) \
+        .subquery()
+
+    following = aliased(Submission)
+    row = db.session.query(Submission, following) \
+        .join(queue, queue.c.id == Submission.id) \
+        .outerjoin(following, following.id == queue.c.next_id) \
+        .filter(Submission.id == submission_id) \
+        .first()
+    return (row[0], row[1]) if row else (None, None)
+
+
+def active_claims(grader_id, course_id=None):
+    """教师尚未过期的认领，按过期时间排序"""
+    query = db.session.query(GradingClaim, Submission) \
+        .join(Submission, Submission.id == GradingClaim.submission_id) \
+        .filter(GradingClaim.grader_id == grader_id, GradingClaim.expires_at > datetime.utcnow())
+    if course_id is not None:
+        query = query.filter(GradingClaim.course_id == course_id)
+    return query.order_by(GradingClaim.expires_at, GradingClaim.submission_id).all()
+
+
+def renew_claim(claim):
+    """延长认领的有效期"""
+    claim.expires_at = datetime.utcnow() + timedelta(seconds=current_app.config['GRADING_LEASE_SECONDS'])
+    return claim
+
+
+def release_claims(submission_ids):
+    """释放提交的认领，提交被批改后调用
+
+    Returns:
+        int: 释放的认领数
+    """
+    if not submission_ids:
+        return 0
+    return GradingClaim.query \
+        .filter(GradingClaim.submission_id.in_(list(submission_ids))) \
+        .delete(synchronize_session=False)
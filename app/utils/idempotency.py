@@ -0,0 +1,131 @@
+# app/utils/idempotency.py
+import hashlib
+from functools import wraps
+from datetime import datetime, timedelta
+from flask import current_app, request, jsonify
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+# 除成功响应外只保存由请求内容决定的错误，重试同一请求必然得到相同结果；
+# 权限、冲突、配额等错误（403/409/413）可能随服务器状态变化，不保存
+REPLAYABLE_ERROR_CODES = (400, 422)
+
+
+def _fingerprint():
+    return hashlib.sha256(f"{request.method} {request.path}".encode('utf-8')).hexdigest()
+
+
+def _claim(user_id, key, fingerprint):
+    """登记一个处理中的幂等键
+
+    Returns:
+        tuple: (新登记的记录, 已存在的记录)，两者只有一个不为None
+    """
+    now = datetime.utcnow()
+    existing = IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+    
+    if existing:
+        # 过期的键，或处理中途崩溃遗留的键，可以重新使用
+        lock_timeout = timedelta(seconds=current_app.config['IDEMPOTENCY_LOCK_TIMEOUT'])
+        abandoned = existing.status == 'processing' and existing.created_at < now - lock_timeout
+        if existing.expires_at > now and not abandoned:
+            return None, existing
+        db.session.delete(existing)
+        db.session.flush()
+    
+    record = IdempotencyKey(
+        user_id=user_id,
+        key=key,
+        request_fingerprint=fingerprint,
+        status='processing',
+        created_at=now,
+        expires_at=now + timedelta(seconds=current_app.config['IDEMPOTENCY_KEY_TTL'])
+    )
+    db.session.add(record)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # 并发的重复请求已登记了同一个键
+        db.session.rollback()
+        return None, IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+    return record, None
+
+
+def _replay(record, fingerprint):
+    if record is None or record.request_fingerprint != fingerprint:
+        return jsonify({'message': '幂等键已用于其他请求'}), 422
+    
+    if record.status != 'completed':
+        return jsonify({'message': '相同的请求正在处理中，请稍后重试'}), 409
+    
+    response = current_app.response_class(
+        record.response_body,
+        status=record.response_code,
+        mimetype='application/json'
+    )
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(f):
+    """幂等请求装饰器
+
+    客户端在请求头中携带Idempotency-Key时，同一用户重复发送的请求
+    直接返回第一次的响应，不会再次解析上传文件或创建记录。
+    只保存成功（2xx）和请求参数错误（400/422）的响应，其余响应
+    不会保存，客户端可以使用同一个键重试。
+    需放在token_required等认证装饰器之后。
+    """
+    @wraps(f)
+    def decorated(current_user, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return f(current_user, *args, **kwargs)
+        
+        if len(key) > 255:
+            return jsonify({'message': '幂等键过长'}), 400
+        
+        fingerprint = _fingerprint()
+        record, existing = _claim(current_user.id, key, fingerprint)
+        if record is None:
+            return _replay(existing, fingerprint)
+        
+        try:
+            response = current_app.make_response(f(current_user, *args, **kwargs))
+        except Exception:
+            db.session.rollback()
+            IdempotencyKey.query.filter_by(id=record.id).delete()
+            db.session.commit()
+            raise
+        
+        if not 200 <= response.status_code < 300:
+            # 处理失败时丢弃处理函数已写入的内容，只提交幂等键本身，与不带幂等键的请求一致
+            db.session.rollback()
+        
+        if not (200 <= response.status_code < 300 or response.status_code in REPLAYABLE_ERROR_CODES):
+            IdempotencyKey.query.filter_by(id=record.id).delete()
+        else:
+            record.status = 'completed'
+            record.response_code = response.status_code
+            record.response_body = response.get_data(as_text=True)
+        db.session.commit()
+        
+        return response
+    
+    return decorated
+
+
+def purge_expired_keys():
+    """删除过期的幂等键
+
+    Returns:
+        int: 删除的数量
+    """
+    count = IdempotencyKey.query \
+        .filter(IdempotencyKey.expires_at < datetime.utcnow()) \
+        .delete(synchronize_session=False)
+    db.session.commit()
+    return count
@@ -0,0 +1,106 @@
+# app/utils/image_derivatives.py
+import os
+from flask import current_app
+from PIL import Image, ImageOps
+from app.utils.storage import get_storage
+from app.utils.media_workers import run_media_task
+
+# 衍生图规格：名称 -> 最长边像素，按从大到小的顺序逐级缩放
+DERIVATIVE_SIZES = {
+    'full': 2048,
+    'preview': 1024,
+    'thumb': 320
+}
+
+
+def derivative_key(key, variant):
+    """衍生图的存储键，与原图位于同一目录"""
+    stem = key.rsplit('.', 1)[0]
+    return f"{stem}.{variant}.webp"
+
+
+def _open_normalized(src_path):
+    """打开图像，按EXIF方向旋转并转换为WebP支持的颜色模式"""
+    with Image.open(src_path) as img:
+        # 历史图片未经过规范化，需要按EXIF方向旋转
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'transparency' in img.info or img.mode in ('LA', 'PA') else 'RGB')
+        img.load()
+    return img
+
+
+def _save_derivative(img, key, variant):
+    """将缩放后的图像保存为衍生图，返回元数据"""
+    storage = get_storage()
+    dkey = derivative_key(key, variant)
+    with storage.staging(dkey, 'image/webp') as path:
+        img.save(path, 'WEBP', quality=current_app.config['WEBP_QUALITY'], method=4)
+        size = os.path.getsize(path)
+    
+    return {
+        'path': dkey,
+        'url': storage.url(dkey),
+        'width': img.width,
+        'height': img.height,
+        'size': size
+    }
+
+
+def generate_derivatives(src_path, key):
+    """为图像生成各尺寸的WebP衍生图
+    
+    Args:
+        src_path: 原图的本地路径
+        key: 原图的存储键
+        
+    Returns:
+        dict: 衍生图名称 -> 元数据（path、url、width、height、size）
+    """
+    derivatives = {}
+    
+    # 每一级从上一级缩放，避免每次都从原图缩放
+    current = _open_normalized(src_path)
+    for variant, max_side in DERIVATIVE_SIZES.items():
+        if max(current.size) > max_side:
+            current = current.copy()
+            current.thumbnail((max_side, max_side), Image.LANCZOS)
+        derivatives[variant] = _save_derivative(current, key, variant)
+    
+    return derivatives
+
+
+def generate_derivative(src_path, key, variant):
+    """只生成指定规格的衍生图，返回元数据"""
+    img = _open_normalized(src_path)
+    max_side = DERIVATIVE_SIZES[variant]
+    if max(img.size) > max_side:
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+    return _save_derivative(img, key, variant)
+
+
+def ensure_derivative(info, variant):
+    """获取图像的衍生图存储键，不存在时按需生成（用于历史图片）
+    
+    生成的衍生图保存在存储中，之后的请求直接使用，相当于磁盘缓存。
+    衍生图写完后才出现在最终位置（本地存储原子替换，S3上传完成后对象才可见），
+    并发请求不会读到不完整的文件。
+    
+    Returns:
+        str: 衍生图存储键
+    """
+    if variant not in DERIVATIVE_SIZES:
+        raise ValueError(f"不支持的衍生图规格: {variant}")
+    
+    recorded = (info.get('derivatives') or {}).get(variant)
+    if recorded:
+        return recorded['path']
+    
+    storage = get_storage()
+    dkey = derivative_key(info['path'], variant)
+    if storage.exists(dkey):
+        return dkey
+    
+    with storage.local_copy(info['path']) as src_path:
+        run_media_task(generate_derivative, src_path, info['path'], variant)
+    return dkey
@@ -0,0 +1,91 @@
+# app/utils/image_normalizer.py
+import os
+from flask import current_app
+from PIL import Image, ImageOps
+
+# 重新编码时各格式的保存参数
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 90, 'optimize': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 90, 'method': 4}
+}
+
+
+def normalize_image(file_path):
+    """规范化上传的图像（原地覆盖）
+
+    - 超过像素预算的图像直接拒绝，防止解压炸弹
+    - JPEG使用draft按比例缩小解码，超大照片不会完整解码到内存
+    - 按EXIF方向旋转，并去除EXIF等元数据（保留ICC色彩配置）
+    - 最长边限制为IMAGE_MAX_SIDE
+
+    Args:
+        file_path: 图像的本地路径
+
+    Returns:
+        dict: original_size、size、bytes_saved 以及是否重新编码
+
+    Raises:
+        ValueError: 图像无法识别或像素超出预算
+    """
+    max_pixels = current_app.config['IMAGE_MAX_PIXELS']
+    max_side = current_app.config['IMAGE_MAX_SIDE']
+    original_size = os.path.getsize(file_path)
+    stats = {'original_size': original_size, 'size': original_size, 'bytes_saved': 0, 'normalized': False}
+    
+    try:
+        img = Image.open(file_path)
+    except Image.DecompressionBombError:
+        raise ValueError('图像像素超出限制')
+    except OSError:
+        raise ValueError('无法识别的图像文件')
+    
+    with img:
+        fmt = img.format
+        width, height = img.size
+        
+        # 动图只做像素检查，不重新编码
+        if getattr(img, 'is_animated', False):
+            if width * height > max_pixels:
+                raise ValueError('图像像素超出限制')
+            return stats
+        
+        # JPEG可以在解码时按1/2、1/4、1/8缩小
+        if fmt == 'JPEG' and max(width, height) > max_side:
+            ratio = max_side / max(width, height)
+            img.draft('RGB', (int(width * ratio), int(height * ratio)))
+        
+        if img.size[0] * img.size[1] > max_pixels:
+            raise ValueError('图像像素超出限制')
+        
+        exif = img.getexif()
+        has_metadata = bool(exif) or any(k in img.info for k in ('exif', 'xmp', 'XML:com.adobe.xmp'))
+        needs_resize = max(width, height) > max_side
+        
+        if not (has_metadata or needs_resize) or fmt not in SAVE_OPTIONS:
+            return stats
+        
+        icc_profile = img.info.get('icc_profile')
+        img = ImageOps.exif_transpose(img)
+        if max(img.size) > max_side:
+            img.thumbnail((max_side, max_side), Image.LANCZOS)
+        
+        if fmt == 'JPEG' and img.mode not in ('RGB', 'L', 'CMYK'):
+            img = img.convert('RGB')
+        
+        options = dict(SAVE_OPTIONS[fmt])
+        if icc_profile:
+            options['icc_profile'] = icc_profile
+        
+        # 先写入临时文件再替换，避免失败时损坏原文件
+        tmp_path = f"{file_path}.tmp"
+        try:
+            img.save(tmp_path, fmt, **options)
+            os.replace(tmp_path, file_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    size = os.path.getsize(file_path)
+    stats.update({'size': size, 'bytes_saved': original_size - size, 'normalized': True})
+    return stats
@@ -0,0 +1,40 @@
+# app/utils/media_workers.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+_lock = threading.Lock()
+
+
+def get_media_executor():
+    """获取当前应用的媒体处理线程池（每个进程只创建一次）
+
+    线程池大小由MEDIA_WORKERS限制，同一进程中同时解码的图像、音频数量
+    不会超过该值，避免大量并发上传时内存暴涨。
+    """
+    app = current_app._get_current_object()
+    executor = app.extensions.get('media_executor')
+    if executor is None:
+        with _lock:
+            executor = app.extensions.get('media_executor')
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=app.config['MEDIA_WORKERS'],
+                    thread_name_prefix='media'
+                )
+                app.extensions['media_executor'] = executor
+    return executor
+
+
+def run_media_task(func, *args, **kwargs):
+    """在媒体处理线程池中执行任务并等待结果
+
+    任务在应用上下文中执行，异常会原样抛出给调用方。
+    """
+    app = current_app._get_current_object()
+    
+    def task():
+        with app.app_context():
+            return func(*args, **kwargs)
+    
+    return get_media_executor().submit(task).result()
@@ -0,0 +1,34 @@
+# app/utils/permissions.py
+from app.models import Homework, Course, Submission
+
+
+def is_course_teacher(user, course_id):
+    """检查用户是否为课程教师（管理员视为所有课程的教师）"""
+    if user.is_admin():
+        return True
+    course = Course.query.get(course_id)
+    return course is not None and course.teacher_id == user.id
+
+
+def can_view_submission(user, submission):
+    """检查用户是否有权查看提交及其附件
+
+    学生只能查看自己的提交，教师只能查看自己课程的提交，管理员不受限制。
+    """
+    if user.is_admin():
+        return True
+    
+    if user.is_student():
+        return submission.student_id == user.id
+    
+    if user.is_teacher():
+        homework = Homework.query.get(submission.homework_id)
+        return is_course_teacher(user, homework.course_id)
+    
+    return False
+
+
+def can_view_feedback(user, feedback):
+    """检查用户是否有权查看反馈及其附件（与所属提交的权限一致）"""
+    submission = Submission.query.get(feedback.submission_id)
+    return submission is not None and can_view_submission(user, submission)
@@ -0,0 +1,121 @@
+# app/utils/query_helpers.py
+from sqlalchemy import func, and_, select
+from app import db
+from app.models import Submission, Feedback, Homework
+
+
+def latest_submissions_subquery(course_id=None, homework_id=None, student_ids=None):
+    """每个学生在每个作业上的最新版本提交
+
+    使用 row_number() 窗口函数在数据库中完成分组取最新，
+    返回的子查询包含 id、homework_id、student_id、version、status、created_at 列，
+    以及该学生在该作业上的提交次数 version_count。
+    """
+    partition = (Submission.homework_id, Submission.student_id)
+    rank = func.row_number().over(
+        partition_by=partition,
+        order_by=Submission.version.desc()
+    ).label('rank')
+    version_count = func.count().over(partition_by=partition).label('version_count')
+    
+    query = db.session.query(
+        Submission.id,
+        Submission.homework_id,
+        Submission.student_id,
+        Submission.version,
+        Submission.status,
+        Submission.created_at,
+        version_count,
+        rank
+    )
+    if course_id is not None:
+        query = query.join(Homework, Homework.id == Submission.homework_id) \
+            .filter(Homework.course_id == course_id)
+    if homework_id is not None:
+        query = query.filter(Submission.homework_id == homework_id)
+    if student_ids is not None:
+        query = query.filter(Submission.student_id.in_(student_ids))
+    
+    ranked = query.subquery()
+    return db.session.query(ranked).filter(ranked.c.rank == 1).subquery()
+
+
+def latest_feedback_subquery(submission_ids=None):
+    """每个提交的最新反馈，包含 id、submission_id、score、requires_revision、created_at 列
+
+    Args:
+        submission_ids: 可选，限定提交ID的子查询，避免对整个反馈表做窗口计算
+    """
+    rank = func.row_number().over(
+        partition_by=Feedback.submission_id,
+        order_by=(Feedback.created_at.desc(), Feedback.id.desc())
+    ).label('rank')
+    
+    query = db.session.query(
+        Feedback.id,
+        Feedback.submission_id,
+        Feedback.score,
+        Feedback.requires_revision,
+        Feedback.created_at,
+        rank
+    )
+    if submission_ids is not None:
+        query = query.filter(Feedback.submission_id.in_(submission_ids))
+    
+    ranked = query.subquery()
+    return db.session.query(ranked).filter(ranked.c.rank == 1).subquery()
+
+
+def latest_scores_subquery(course_id=None, homework_id=None, student_ids=None):
+    """每个学生在每个作业上最新提交的状态和最新反馈分数
+
+    返回的子查询包含 student_id、homework_id、submission_id、version、
+    version_count、status、submitted_at、score 列，未批改的提交score为NULL。
+    """
+    latest = latest_submissions_subquery(course_id=course_id, homework_id=homework_id, student_ids=student_ids)
+    feedback = latest_feedback_subquery(submission_ids=select(latest.c.id))
+    
+    return db.session.query(
+        latest.c.student_id,
+        latest.c.homework_id,
+        latest.c.id.label('submission_id'),
+        latest.c.version,
+        latest.c.version_count,
+        latest.c.status,
+        latest.c.created_at.label('submitted_at'),
+        feedback.c.score
+    ).outerjoin(feedback, feedback.c.submission_id == latest.c.id).subquery()
+
+
+def latest_graded_scores_subquery(course_id=None, homework_id=None, student_ids=None):
+    """每个学生在每个作业上最近一个已批改版本的分数
+
+    学生在批改后重新提交时，最新版本尚未批改，成绩仍以最近一个
+    有分数的版本为准。返回的子查询包含 student_id、homework_id、
+    submission_id、version、score 列。
+    """
+    submissions = select(Submission.id)
+    if course_id is not None:
+        submissions = submissions.join(Homework, Homework.id == Submission.homework_id) \
+            .where(Homework.course_id == course_id)
+    if homework_id is not None:
+        submissions = submissions.where(Submission.homework_id == homework_id)
+    if student_ids is not None:
+        submissions = submissions.where(Submission.student_id.in_(student_ids))
+    feedback = latest_feedback_subquery(submission_ids=submissions)
+    
+    rank = func.row_number().over(
+        partition_by=(Submission.homework_id, Submission.student_id),
+        order_by=Submission.version.desc()
+    ).label('rank')
+    ranked = db.session.query(
+        Submission.student_id,
+        Submission.homework_id,
+        Submission.id.label('submission_id'),
+        Submission.version,
+        feedback.c.score,
+        rank
+    ).join(feedback, feedback.c.submission_id == Submission.id) \
+        .filter(feedback.c.score.isnot(None)) \
+        .subquery()
+    return db.session.query(ranked).filter(ranked.c.rank == 1).subquery()
@@ -0,0 +1,104 @@
+# app/utils/quota.py
+from functools import wraps
+from datetime import datetime
+from flask import current_app, request, jsonify
+from sqlalchemy import update, func
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import StorageUsage, Upload
+
+# 配额范围对应的配置项和提示名称
+QUOTA_SCOPES = {
+    'user': ('USER_STORAGE_QUOTA', '个人'),
+    'course': ('COURSE_STORAGE_QUOTA', '课程')
+}
+
+
+def add_usage(scope, scope_id, nbytes, nfiles=0):
+    """原子地调整存储用量计数器
+
+    使用 bytes = bytes + n 形式的UPDATE，并发请求不会互相覆盖。
+    计数器与业务数据在同一事务中提交，请求失败回滚时计数器一并回滚。
+    """
+    if not scope_id or (not nbytes and not nfiles):
+        return
+    
+    stmt = update(StorageUsage) \
+        .where(StorageUsage.scope == scope, StorageUsage.scope_id == scope_id) \
+        .values(bytes=StorageUsage.bytes + nbytes,
+                files=StorageUsage.files + nfiles,
+                updated_at=datetime.utcnow())
+    if db.session.execute(stmt).rowcount:
+        return
+    
+    try:
+        with db.session.begin_nested():
+            db.session.add(StorageUsage(scope=scope, scope_id=scope_id, bytes=nbytes, files=nfiles))
+    except IntegrityError:
+        # 并发请求已创建了计数器
+        db.session.execute(stmt)
+
+
+def get_usage(scope, scope_id):
+    """获取已用字节数"""
+    used = db.session.query(StorageUsage.bytes) \
+        .filter_by(scope=scope, scope_id=scope_id) \
+        .scalar()
+    return used or 0
+
+
+def check_quota(scope, scope_id, incoming):
+    """检查写入incoming字节后是否超出配额
+
+    Returns:
+        str: 超出配额时的错误信息，否则为None
+    """
+    config_key, label = QUOTA_SCOPES[scope]
+    limit = current_app.config[config_key]
+    if not limit or not scope_id:
+        return None
+    
+    used = get_usage(scope, scope_id)
+    if used + (incoming or 0) > limit:
+        return (f"{label}存储空间不足（已用 {used / 1024 / 1024:.1f} MB，"
+                f"上限 {limit / 1024 / 1024:.0f} MB）")
+    return None
+
+
+def quota_required(f):
+    """学生存储配额检查装饰器
+
+    按Content-Length在读取请求体之前检查，超出配额的上传不会被解析和保存。
+    需放在token_required等认证装饰器之后。
+    """
+    @wraps(f)
+    def decorated(current_user, *args, **kwargs):
+        if current_user.is_student():
+            error = check_quota('user', current_user.id, request.content_length)
+            if error:
+                return jsonify({'message': error}), 413
+        return f(current_user, *args, **kwargs)
+    
+    return decorated
+
+
+def recount_usage():
+    """根据uploads表重建所有计数器，用于修正计数偏差
+
+    Returns:
+        int: 重建的计数器数量
+    """
+    StorageUsage.query.delete(synchronize_session=False)
+    
+    count = 0
+    for scope, column in (('user', Upload.owner_id), ('course', Upload.course_id)):
+        rows = db.session.query(column, func.sum(Upload.size), func.count(Upload.id)) \
+            .filter(column.isnot(None)) \
+            .group_by(column) \
+            .all()
+        for scope_id, nbytes, nfiles in rows:
+            db.session.add(StorageUsage(scope=scope, scope_id=scope_id, bytes=nbytes or 0, files=nfiles))
+            count += 1
+    
+    db.session.commit()
+    return count
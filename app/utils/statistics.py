@@ -0,0 +1,101 @@
+# app/utils/statistics.py
+from sqlalchemy import func, distinct
+from app import db
+from app.models import student_courses
+from app.utils.query_helpers import latest_scores_subquery
+
+SUBMISSION_STATUSES = ['submitted', 'graded', 'needs_revision', 'revised']
+
+# 成绩分布中计算的分位数
+SCORE_QUANTILES = {'p10': 0.1, 'median': 0.5, 'p90': 0.9}
+
+
+def percentile(values, q):
+    """已排序数值的分位数，与 percentile_cont 一样在相邻两个值之间线性插值"""
+    if not values:
+        return None
+    position = q * (len(values) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def homework_statistics(homework):
+    """统计作业的提交状态和成绩分布
+
+    只统计选课学生每人的最新版本提交，分数取该版本的最新反馈。
+    PostgreSQL 上用 GROUP BY ROLLUP 在一次查询中同时得到各状态计数和
+    整体的分位数；其他数据库不支持有序集聚合，分位数另用一次只取分数列的查询计算。
+
+    Returns:
+        dict: total_students、submitted_students、submission_rate、status_counts、scores
+    """
+    scores = latest_scores_subquery(homework_id=homework.id)
+    enrolled = db.session.query(func.count()) \
+        .select_from(student_courses) \
+        .filter(student_courses.c.course_id == homework.course_id) \
+        .scalar_subquery()
+    use_rollup = db.session.get_bind().dialect.name == 'postgresql'
+
+    columns = [
+        scores.c.status,
+        func.count().label('submissions'),
+        func.count(distinct(scores.c.student_id)).label('students'),
+        func.count(scores.c.score).label('graded'),
+        func.sum(scores.c.score).label('score_sum'),
+        enrolled.label('enrolled')
+    ]
+    if use_rollup:
+        columns += [
+            func.percentile_cont(q).within_group(scores.c.score).label(name)
+            for name, q in SCORE_QUANTILES.items()
+        ]
+        # 汇总行的 GROUPING(status) 为1，不会与状态本身为NULL的分组混淆
+        columns.append(func.grouping(scores.c.status).label('is_total'))
+
+    query = db.session.query(*columns) \
+        .join(student_courses, student_courses.c.student_id == scores.c.student_id) \
+        .filter(student_courses.c.course_id == homework.course_id)
+    rows = query.group_by(func.rollup(scores.c.status) if use_rollup else scores.c.status).all()
+
+    status_counts = dict.fromkeys(SUBMISSION_STATUSES, 0)
+    submitted_students = graded = 0
+    score_sum = 0.0
+    quantiles = dict.fromkeys(SCORE_QUANTILES)
+    total_students = None
+
+    for row in rows:
+        total_students = row.enrolled
+        if use_rollup and row.is_total:
+            # ROLLUP的汇总行
+            quantiles = {name: getattr(row, name) for name in SCORE_QUANTILES}
+            continue
+        status_counts[row.status] = status_counts.get(row.status, 0) + row.submissions
+        submitted_students += row.students
+        graded += row.graded
+        score_sum += row.score_sum or 0
+
+    if total_students is None:
+        # 没有提交时分组查询没有结果行
+        total_students = db.session.query(enrolled).scalar()
+
+    if not use_rollup and graded:
+        values = [value for (value,) in db.session.query(scores.c.score)
+                  .join(student_courses, student_courses.c.student_id == scores.c.student_id)
+                  .filter(student_courses.c.course_id == homework.course_id, scores.c.score.isnot(None))
+                  .order_by(scores.c.score)]
+        quantiles = {name: percentile(values, q) for name, q in SCORE_QUANTILES.items()}
+
+    status_counts['not_submitted'] = total_students - submitted_students
+
+    return {
+        'total_students': total_students,
+        'submitted_students': submitted_students,
+        'submission_rate': submitted_students / total_students if total_students > 0 else 0,
+        'status_counts': status_counts,
+        'scores': {
+            'graded_students': graded,
+            'mean': score_sum / graded if graded else None,
+            **quantiles
+        }
+    }
@@ -0,0 +1,419 @@
+# app/utils/storage.py
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from flask import current_app
+
+
+class StorageError(Exception):
+    """存储后端错误"""
+
+
+class StorageBackend:
+    """存储后端基类
+
+    所有文件都通过相对键（如 image/20240101/xxx.jpg）访问，
+    元数据中的 path 即为键，url 由后端生成。
+    """
+
+    # 是否支持预签名直传
+    supports_presigned = False
+
+    def local_path(self, key):
+        """返回键对应的本地文件路径，非本地后端返回None"""
+        return None
+
+    def ensure_bucket(self):
+        """创建存储位置（目录或存储桶），已存在时不做修改
+
+        Returns:
+            bool: 是否新建
+        """
+        return False
+
+    @contextmanager
+    def staging(self, key, content_type=None):
+        """提供一个可写的本地路径，退出时保存到键对应的位置"""
+        raise NotImplementedError
+
+    def save(self, src_path, key, content_type=None):
+        """将本地文件保存到指定键"""
+        raise NotImplementedError
+
+    @contextmanager
+    def local_copy(self, key):
+        """提供文件的本地只读路径，非本地后端下载到临时文件"""
+        fd, tmp_path = tempfile.mkstemp(suffix=os.path.splitext(key)[1])
+        try:
+            with os.fdopen(fd, 'wb') as tmp, self.open(key) as src:
+                shutil.copyfileobj(src, tmp)
+            yield tmp_path
+        finally:
+            os.remove(tmp_path)
+
+    def open(self, key):
+        """以二进制只读方式打开文件"""
+        raise NotImplementedError
+
+    def exists(self, key):
+        raise NotImplementedError
+
+    def size(self, key):
+        raise NotImplementedError
+
+    def head(self, key):
+        """返回文件的大小和类型，不存在时返回None"""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """删除文件，返回是否成功删除"""
+        raise NotImplementedError
+
+    def url(self, key):
+        """生成文件的访问URL"""
+        raise NotImplementedError
+
+    def iter_keys(self, prefix=''):
+        """按键的字典序遍历所有文件
+
+        Yields:
+            tuple: (键, 修改时间戳, 文件大小)
+        """
+        raise NotImplementedError
+
+    def move(self, key, new_key):
+        """移动文件到新的键"""
+        raise NotImplementedError
+
+    def copy(self, key, new_key):
+        """复制文件到新的键"""
+        raise NotImplementedError
+
+    def presigned_put(self, key, content_type=None, expires_in=None):
+        """生成直传到存储的预签名PUT地址"""
+        raise StorageError('当前存储后端不支持预签名上传')
+
+    def presigned_get(self, key, expires_in=None, filename=None):
+        """生成直接从存储下载的预签名GET地址"""
+        raise StorageError('当前存储后端不支持预签名下载')
+
+    def key_from_url(self, url):
+        """从后端生成的URL反解出键，无法识别时返回None"""
+        return None
+
+
+class LocalStorage(StorageBackend):
+    """本地文件系统存储，文件位于UPLOAD_FOLDER下"""
+
+    def __init__(self, root, url_prefix='/static/uploads'):
+        self.root = root
+        self.url_prefix = url_prefix.rstrip('/')
+
+    def ensure_bucket(self):
+        if os.path.isdir(self.root):
+            return False
+        os.makedirs(self.root, exist_ok=True)
+        return True
+
+    def local_path(self, key):
+        path = os.path.normpath(os.path.join(self.root, key))
+        # 防止路径穿越
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise StorageError(f'非法的文件路径: {key}')
+        return path
+
+    @contextmanager
+    def staging(self, key, content_type=None):
+        path = self.local_path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # 先写入同目录下的隐藏临时文件，完成后原子替换到最终路径，
+        # 并发读取者不会看到写了一半的文件；临时文件保留扩展名供格式识别使用
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix=os.path.splitext(key)[1])
+        os.close(fd)
+        try:
+            yield tmp_path
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        finally:
+            # 写入失败时清理残留文件
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def save(self, src_path, key, content_type=None):
+        with self.staging(key, content_type) as tmp_path:
+            shutil.copyfile(src_path, tmp_path)
+
+    @contextmanager
+    def local_copy(self, key):
+        yield self.local_path(key)
+
+    def open(self, key):
+        return open(self.local_path(key), 'rb')
+
+    def exists(self, key):
+        return os.path.exists(self.local_path(key))
+
+    def size(self, key):
+        return os.path.getsize(self.local_path(key))
+
+    def head(self, key):
+        path = self.local_path(key)
+        if not os.path.exists(path):
+            return None
+        return {'size': os.path.getsize(path), 'mime_type': None}
+
+    def delete(self, key):
+        path = self.local_path(key)
+        if os.path.exists(path):
+            os.remove(path)
+            return True
+        return False
+
+    def url(self, key):
+        return f"{self.url_prefix}/{key}"
+
+    def iter_keys(self, prefix=''):
+        start = self.local_path(prefix) if prefix else self.root
+        yield from self._walk(start, prefix.rstrip('/'))
+
+    def _walk(self, directory, rel_dir):
+        try:
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            return
+        
+        # 目录按“名称/”排序，保证输出的键整体按字典序排列
+        def sort_key(entry):
+            return entry.name + '/' if entry.is_dir(follow_symlinks=False) else entry.name
+        
+        for entry in sorted(entries, key=sort_key):
+            key = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                yield from self._walk(entry.path, key)
+            elif entry.is_file(follow_symlinks=False):
+                stat = entry.stat()
+                yield key, stat.st_mtime, stat.st_size
+
+    def move(self, key, new_key):
+        new_path = self.local_path(new_key)
+        os.makedirs(os.path.dirname(new_path), exist_ok=True)
+        os.replace(self.local_path(key), new_path)
+
+    def copy(self, key, new_key):
+        new_path = self.local_path(new_key)
+        os.makedirs(os.path.dirname(new_path), exist_ok=True)
+        try:
+            # 同一文件系统上使用硬链接，不复制数据
+            os.link(self.local_path(key), new_path)
+        except FileExistsError:
+            pass
+        except OSError:
+            shutil.copy2(self.local_path(key), new_path)
+
+    def key_from_url(self, url):
+        if url and url.startswith(self.url_prefix + '/'):
+            return url[len(self.url_prefix) + 1:]
+        return None
+
+
+class S3Storage(StorageBackend):
+    """S3兼容对象存储（AWS S3、MinIO等）"""
+
+    supports_presigned = True
+
+    def __init__(self, bucket, endpoint_url=None, region=None,
+                 access_key=None, secret_key=None, public_url=None,
+                 prefix='', expires_in=3600, presign_endpoint_url=None):
+        try:
+            import boto3
+            from botocore.config import Config as BotoConfig
+        except ImportError:
+            raise StorageError('使用S3存储需要安装boto3')
+
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.public_url = public_url.rstrip('/') if public_url else None
+        self.expires_in = expires_in
+        self.region = region
+
+        def make_client(url):
+            return boto3.client(
+                's3',
+                endpoint_url=url,
+                region_name=region,
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+                # MinIO等自建服务需要path风格的地址
+                config=BotoConfig(signature_version='s3v4', s3={'addressing_style': 'path'})
+            )
+
+        self.client = make_client(endpoint_url)
+        # 签名包含主机名，内网地址（如 http://minio:9000）签出的URL浏览器无法使用，
+        # 预签名地址需用浏览器可访问的公网地址签名；签名只在本地计算，不会连接该地址
+        if presign_endpoint_url and presign_endpoint_url != endpoint_url:
+            self.presign_client = make_client(presign_endpoint_url)
+        else:
+            self.presign_client = self.client
+
+    def _object_key(self, key):
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def ensure_bucket(self):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_bucket(Bucket=self.bucket)
+            return False
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in ('404', 'NoSuchBucket', 'NotFound'):
+                raise
+
+        params = {'Bucket': self.bucket}
+        # us-east-1 不接受 LocationConstraint
+        if self.region and self.region != 'us-east-1':
+            params['CreateBucketConfiguration'] = {'LocationConstraint': self.region}
+        try:
+            self.client.create_bucket(**params)
+        except ClientError as e:
+            # 多个进程同时启动时可能已被其他进程创建
+            if e.response.get('Error', {}).get('Code') not in ('BucketAlreadyOwnedByYou', 'BucketAlreadyExists'):
+                raise
+            return False
+        return True
+
+    @contextmanager
+    def staging(self, key, content_type=None):
+        ext = os.path.splitext(key)[1]
+        fd, tmp_path = tempfile.mkstemp(suffix=ext)
+        os.close(fd)
+        try:
+            yield tmp_path
+            self.save(tmp_path, key, content_type)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def save(self, src_path, key, content_type=None):
+        extra_args = {'ContentType': content_type} if content_type else None
+        self.client.upload_file(src_path, self.bucket, self._object_key(key), ExtraArgs=extra_args)
+
+    def open(self, key):
+        response = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))
+        return response['Body']
+
+    def _head(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def exists(self, key):
+        return self._head(key) is not None
+
+    def size(self, key):
+        head = self._head(key)
+        if head is None:
+            raise StorageError(f'文件不存在: {key}')
+        return head['ContentLength']
+
+    def head(self, key):
+        head = self._head(key)
+        if head is None:
+            return None
+        return {'size': head['ContentLength'], 'mime_type': head.get('ContentType')}
+
+    def delete(self, key):
+        if not self.exists(key):
+            return False
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+        return True
+
+    def url(self, key):
+        if self.public_url:
+            return f"{self.public_url}/{self._object_key(key)}"
+        # 私有存储桶没有固定地址，由下载接口生成预签名地址
+        return f"s3://{self.bucket}/{self._object_key(key)}"
+
+    def iter_keys(self, prefix=''):
+        # S3按键的字典序返回对象
+        paginator = self.client.get_paginator('list_objects_v2')
+        full_prefix = self._object_key(prefix) if prefix else (f"{self.prefix}/" if self.prefix else '')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=full_prefix):
+            for obj in page.get('Contents', []):
+                key = obj['Key'][len(self.prefix) + 1:] if self.prefix else obj['Key']
+                yield key, obj['LastModified'].timestamp(), obj['Size']
+
+    def move(self, key, new_key):
+        self.copy(key, new_key)
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+    def copy(self, key, new_key):
+        self.client.copy_object(
+            Bucket=self.bucket,
+            Key=self._object_key(new_key),
+            CopySource={'Bucket': self.bucket, 'Key': self._object_key(key)}
+        )
+
+    def key_from_url(self, url):
+        for base in filter(None, [self.public_url, f"s3://{self.bucket}"]):
+            if url and url.startswith(base + '/'):
+                object_key = url[len(base) + 1:]
+                if self.prefix and object_key.startswith(self.prefix + '/'):
+                    object_key = object_key[len(self.prefix) + 1:]
+                return object_key
+        return None
+
+    def presigned_put(self, key, content_type=None, expires_in=None):
+        params = {'Bucket': self.bucket, 'Key': self._object_key(key)}
+        if content_type:
+            params['ContentType'] = content_type
+        return self.presign_client.generate_presigned_url(
+            'put_object', Params=params, ExpiresIn=expires_in or self.expires_in
+        )
+
+    def presigned_get(self, key, expires_in=None, filename=None):
+        params = {'Bucket': self.bucket, 'Key': self._object_key(key)}
+        if filename:
+            params['ResponseContentDisposition'] = f'inline; filename="{filename}"'
+        return self.presign_client.generate_presigned_url(
+            'get_object', Params=params, ExpiresIn=expires_in or self.expires_in
+        )
+
+
+def create_storage(config):
+    """根据配置创建存储后端"""
+    backend = config.get('STORAGE_BACKEND', 'local')
+
+    if backend == 'local':
+        return LocalStorage(
+            config['UPLOAD_FOLDER'],
+            url_prefix=config.get('UPLOAD_URL_PREFIX', '/static/uploads')
+        )
+
+    if backend == 's3':
+        return S3Storage(
+            bucket=config['S3_BUCKET'],
+            endpoint_url=config.get('S3_ENDPOINT_URL'),
+            region=config.get('S3_REGION'),
+            access_key=config.get('S3_ACCESS_KEY'),
+            secret_key=config.get('S3_SECRET_KEY'),
+            public_url=config.get('S3_PUBLIC_URL'),
+            prefix=config.get('S3_PREFIX', ''),
+            expires_in=config.get('PRESIGNED_URL_EXPIRES', 3600),
+            presign_endpoint_url=config.get('S3_PRESIGN_ENDPOINT_URL')
+        )
+
+    raise StorageError(f'不支持的存储后端: {backend}')
+
+
+def get_storage():
+    """获取当前应用的存储后端（每个应用实例只创建一次）"""
+    storage = current_app.extensions.get('storage')
+    if storage is None:
+        storage = create_storage(current_app.config)
+        current_app.extensions['storage'] = storage
+    return storage
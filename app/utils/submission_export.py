@@ -0,0 +1,113 @@
+# app/utils/submission_export.py
+import io
+import csv
+import json
+import tempfile
+from sqlalchemy import func, and_
+from app import db
+from app.models import Submission, Feedback, User
+from app.utils.file_handler import iter_content_files
+from app.utils.storage import get_storage
+
+# 每批从数据库读取的提交数
+EXPORT_BATCH_SIZE = 100
+
+# 清单超过该大小时转存到临时文件
+MANIFEST_SPOOL_SIZE = 1024 * 1024
+
+MANIFEST_HEADER = [
+    'student_id', 'username', 'version', 'status', 'score', 'submitted_at',
+    'archive_path', 'filename', 'mime_type', 'size', 'note'
+]
+
+
+def csv_line(row):
+    """将一行数据编码为CSV字节串"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(row)
+    return buffer.getvalue().encode('utf-8')
+
+
+def _safe_name(name):
+    """去掉压缩包路径中的分隔符和上级目录引用"""
+    name = str(name).replace('/', '_').replace('\\', '_').strip()
+    return name if name not in ('', '.', '..') else '_'
+
+
+def iter_export_submissions(homework_id, latest_only=True):
+    """按学生名和版本流式读取作业的提交及最新反馈分数"""
+    latest_score = db.session.query(Feedback.score) \
+        .filter(Feedback.submission_id == Submission.id) \
+        .order_by(Feedback.created_at.desc(), Feedback.id.desc()) \
+        .limit(1) \
+        .correlate(Submission) \
+        .scalar_subquery()
+
+    query = db.session.query(Submission, User.username, latest_score) \
+        .join(User, User.id == Submission.student_id) \
+        .filter(Submission.homework_id == homework_id)
+
+    if latest_only:
+        latest = db.session.query(
+            Submission.student_id,
+            func.max(Submission.version).label('version')
+        ).filter(Submission.homework_id == homework_id) \
+            .group_by(Submission.student_id) \
+            .subquery()
+        query = query.join(latest, and_(
+            latest.c.student_id == Submission.student_id,
+            latest.c.version == Submission.version
+        ))
+
+    return query.order_by(User.username, Submission.student_id, Submission.version.desc()) \
+        .yield_per(EXPORT_BATCH_SIZE)
+
+
+def export_entries(homework_id, latest_only=True):
+    """生成作业导出压缩包的条目
+
+    每个学生一个目录（用户名-ID），其下按版本分目录存放原始文件和文本内容，
+    最后附加manifest.csv清单。一次只打开一个文件。
+
+    Yields:
+        tuple: (压缩包内路径, 文件对象, 文件大小, 修改时间)，供zip_stream使用
+    """
+    storage = get_storage()
+    manifest = tempfile.SpooledTemporaryFile(max_size=MANIFEST_SPOOL_SIZE)
+    # 带BOM，Excel可以正确识别中文
+    manifest.write(b'\xef\xbb\xbf' + csv_line(MANIFEST_HEADER))
+
+    for submission, username, score in iter_export_submissions(homework_id, latest_only):
+        folder = f"{_safe_name(username)}-{submission.student_id}/v{submission.version}"
+        base_row = [
+            submission.student_id, username, submission.version, submission.status,
+            score if score is not None else '',
+            submission.created_at.isoformat() if submission.created_at else ''
+        ]
+
+        try:
+            content = json.loads(submission.content) if submission.content else {}
+        except ValueError:
+            content = {}
+
+        if content.get('text'):
+            data = content['text'].encode('utf-8')
+            arcname = f"{folder}/text.txt"
+            manifest.write(csv_line(base_row + [arcname, '', 'text/plain', len(data), '']))
+            yield arcname, io.BytesIO(data), len(data), submission.created_at
+
+        for index, info in enumerate(iter_content_files(content), start=1):
+            filename = info.get('filename') or info['path'].rsplit('/', 1)[-1]
+            arcname = f"{folder}/{index:02d}-{_safe_name(filename)}"
+            try:
+                fileobj = storage.open(info['path'])
+            except Exception:
+                manifest.write(csv_line(base_row + ['', filename, info.get('mime_type'), info.get('size'), 'missing']))
+                continue
+
+            manifest.write(csv_line(base_row + [arcname, filename, info.get('mime_type'), info.get('size'), '']))
+            yield arcname, fileobj, info.get('size'), submission.created_at
+
+    size = manifest.tell()
+    manifest.seek(0)
+    yield 'manifest.csv', manifest, size, None
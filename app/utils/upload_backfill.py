@@ -0,0 +1,139 @@
+# app/utils/upload_backfill.py
+import os
+import json
+from app import db
+from app.models import Submission, Feedback, Homework, User, Course, Upload
+from app.utils.file_handler import MIME_TYPES, file_sha256, path_from_url
+from app.utils.storage import get_storage
+
+
+def _existing_paths(paths):
+    if not paths:
+        return set()
+    return {path for (path,) in db.session.query(Upload.path).filter(Upload.path.in_(paths))}
+
+
+def _content_files(content):
+    """遍历内容中的文件元数据及其文件类型"""
+    for image in content.get('images') or []:
+        yield image, 'image'
+    if content.get('audio'):
+        yield content['audio'], 'audio'
+
+
+def _stored_sha256(path):
+    try:
+        with get_storage().local_copy(path) as local_path:
+            return file_sha256(local_path)
+    except Exception:
+        return None
+
+
+def _add_upload(info, owner_id, file_type, compute_hash, stats, **links):
+    if compute_hash and not info.get('sha256'):
+        info = dict(info, sha256=_stored_sha256(info['path']))
+
+    upload = Upload.from_file_info(info, owner_id, file_type)
+    for row in [upload] + list(upload.derivatives):
+        for name, value in links.items():
+            setattr(row, name, value)
+    db.session.add(upload)
+    stats['uploads'] += 1 + len(upload.derivatives)
+
+
+def _backfill_content(model, owner_column, link, batch_size, compute_hash, stats, progress):
+    last_id = 0
+    while True:
+        query = db.session.query(model.id, owner_column, Homework.course_id, model.content)
+        if model is Feedback:
+            query = query.join(Submission, Submission.id == Feedback.submission_id)
+        rows = query.join(Homework, Homework.id == Submission.homework_id) \
+            .filter(model.id > last_id, model.content.isnot(None)) \
+            .order_by(model.id) \
+            .limit(batch_size) \
+            .all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        records = []
+        for row_id, owner_id, course_id, content in rows:
+            try:
+                content = json.loads(content)
+            except ValueError:
+                continue
+            records.append((row_id, owner_id, course_id, list(_content_files(content))))
+
+        existing = _existing_paths([info['path'] for *_, files in records for info, _ in files if info.get('path')])
+        for row_id, owner_id, course_id, files in records:
+            for info, file_type in files:
+                if not info.get('path') or info['path'] in existing:
+                    continue
+                existing.add(info['path'])
+                _add_upload(info, owner_id, file_type, compute_hash, stats, **{link: row_id, 'course_id': course_id})
+
+        db.session.commit()
+        stats['records'] += len(rows)
+        if progress:
+            progress(model.__tablename__, last_id, stats)
+
+
+def _backfill_urls(model, owner_column, url_column, batch_size, compute_hash, stats, progress):
+    storage = get_storage()
+    last_id = 0
+    while True:
+        rows = db.session.query(model.id, owner_column, url_column) \
+            .filter(model.id > last_id, url_column.isnot(None)) \
+            .order_by(model.id) \
+            .limit(batch_size) \
+            .all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        keys = [(owner_id, path_from_url(url)) for _, owner_id, url in rows]
+        existing = _existing_paths([key for _, key in keys if key])
+        for owner_id, key in keys:
+            if not key or key in existing or owner_id is None:
+                continue
+            head = storage.head(key)
+            if head is None:
+                stats['missing'] += 1
+                continue
+            existing.add(key)
+            ext = key.rsplit('.', 1)[-1].lower()
+            info = {
+                'path': key,
+                'filename': os.path.basename(key),
+                'mime_type': head.get('mime_type') or MIME_TYPES.get(ext, 'application/octet-stream'),
+                'size': head['size']
+            }
+            _add_upload(info, owner_id, 'image', compute_hash, stats)
+
+        db.session.commit()
+        stats['records'] += len(rows)
+        if progress:
+            progress(model.__tablename__, last_id, stats)
+
+
+def backfill_uploads(batch_size=500, compute_hash=False, progress=None):
+    """根据已有的提交、反馈、头像和课程封面补全uploads表
+
+    已登记的文件会被跳过，可以重复执行。完成后需重建存储用量计数器。
+
+    Args:
+        batch_size: 每批处理的记录数
+        compute_hash: 是否读取文件计算SHA-256（需要读取全部文件，较慢）
+        progress: 进度回调，参数为(表名, 已处理到的ID, 统计信息)
+
+    Returns:
+        dict: 统计信息
+    """
+    stats = {'records': 0, 'uploads': 0, 'missing': 0}
+
+    _backfill_content(Submission, Submission.student_id, 'submission_id', batch_size, compute_hash, stats, progress)
+    _backfill_content(Feedback, Feedback.teacher_id, 'feedback_id', batch_size, compute_hash, stats, progress)
+    _backfill_urls(User, User.id, User.avatar_url, batch_size, compute_hash, stats, progress)
+    _backfill_urls(Course, Course.teacher_id, Course.cover_image, batch_size, compute_hash, stats, progress)
+
+    return stats
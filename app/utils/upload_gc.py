@@ -0,0 +1,121 @@
+# app/utils/upload_gc.py
+import json
+import time
+from app import db
+from app.models import Submission, Feedback, User, Course
+from app.utils.file_handler import (
+    content_paths, derived_paths, iter_content_files, path_from_url, release_upload
+)
+from app.utils.storage import get_storage
+
+# 隔离区前缀，孤立文件移动到这里而不是直接删除
+QUARANTINE_PREFIX = '.quarantine/'
+
+# 流式读取数据库时每批的行数
+BATCH_SIZE = 1000
+
+
+def is_hidden(key):
+    """键的任一部分以点开头（隔离区、写入中的临时文件、.DS_Store等）"""
+    return any(part.startswith('.') for part in key.split('/'))
+
+
+def iter_referenced_paths():
+    """流式遍历数据库中引用的所有存储路径
+
+    逐批读取提交和反馈的content，以及用户头像和课程封面，
+    不会一次性把所有记录加载到内存。原文件被引用时，其按需生成的
+    衍生文件也视为被引用。
+    """
+    for model in (Submission, Feedback):
+        query = db.session.query(model.content).filter(model.content.isnot(None))
+        for (content,) in query.yield_per(BATCH_SIZE):
+            try:
+                data = json.loads(content)
+                yield from content_paths(data)
+                for info in iter_content_files(data):
+                    if info.get('path'):
+                        yield from derived_paths(info['path'])
+            except (ValueError, TypeError, KeyError, AttributeError):
+                continue
+    
+    for column in (User.avatar_url, Course.cover_image):
+        for (url,) in db.session.query(column).filter(column.isnot(None)).yield_per(BATCH_SIZE):
+            path = path_from_url(url)
+            if path:
+                yield path
+
+
+def find_orphans(referenced, grace_seconds, now=None):
+    """找出存储中未被引用且超过宽限期的文件
+
+    存储按字典序列出文件，与排好序的引用列表做归并比较，
+    每个文件只需一次比较即可判断是否被引用。
+
+    Args:
+        referenced: 已排序的引用路径列表
+        grace_seconds: 宽限期，较新的文件可能属于尚未提交的上传
+        now: 当前时间戳
+
+    Yields:
+        tuple: (键, 文件大小, 是否在宽限期内)
+    """
+    now = now or time.time()
+    i = 0
+    for key, mtime, size in get_storage().iter_keys():
+        if is_hidden(key):
+            continue
+        
+        while i < len(referenced) and referenced[i] < key:
+            i += 1
+        if i < len(referenced) and referenced[i] == key:
+            continue
+        
+        yield key, size, now - mtime < grace_seconds
+
+
+def collect_garbage(grace_seconds, dry_run=True, quarantine=True, progress=None):
+    """清理孤立的上传文件
+
+    Args:
+        grace_seconds: 宽限期（秒）
+        dry_run: 只统计不修改
+        quarantine: 移动到隔离区而不是直接删除
+        progress: 进度回调，参数为(阶段, 已处理数量)
+
+    Returns:
+        dict: 统计信息
+    """
+    storage = get_storage()
+    stats = {'referenced': 0, 'orphans': 0, 'orphan_bytes': 0, 'skipped_recent': 0, 'removed': 0}
+    
+    referenced = []
+    for path in iter_referenced_paths():
+        referenced.append(path)
+        if progress and len(referenced) % BATCH_SIZE == 0:
+            progress('referenced', len(referenced))
+    referenced = sorted(set(referenced))
+    stats['referenced'] = len(referenced)
+    
+    for key, size, recent in find_orphans(referenced, grace_seconds):
+        if recent:
+            stats['skipped_recent'] += 1
+            continue
+        
+        stats['orphans'] += 1
+        stats['orphan_bytes'] += size
+        if progress and stats['orphans'] % BATCH_SIZE == 0:
+            progress('orphans', stats['orphans'])
+        
+        if dry_run:
+            continue
+        
+        if quarantine:
+            storage.move(key, QUARANTINE_PREFIX + key)
+        else:
+            storage.delete(key)
+        release_upload(key)
+        stats['removed'] += 1
+    
+    db.session.commit()
+    return stats
@@ -0,0 +1,159 @@
+# app/utils/upload_migration.py
+import json
+from sqlalchemy import update
+from app import db
+from app.models import Submission, Feedback, User, Course, Upload
+from app.utils.file_handler import shard_dirs, iter_content_files, path_from_url
+from app.utils.storage import get_storage
+
+
+def sharded_key(key, depth):
+    """将日期布局的键转换为分片布局
+
+    如 image/20240101/<uuid>.jpg -> image/ab/cd/<uuid>.jpg，
+    已是分片布局或无法识别的键返回None。
+    """
+    parts = key.split('/')
+    prefix = []
+    if parts[0] == 'public':
+        prefix, parts = ['public'], parts[1:]
+
+    if len(parts) != 3 or len(parts[1]) != 8 or not parts[1].isdigit():
+        return None
+
+    file_type, _, filename = parts
+    shards = shard_dirs(filename, depth)
+    if not shards:
+        return None
+    return '/'.join(prefix + [file_type, shards, filename])
+
+
+def public_key(key, depth):
+    """公开文件（头像、课程封面）的目标键：分片布局并位于public/下
+
+    早于公开目录的头像和封面不在public/下，nginx不会直接提供，
+    迁移时一并移动。已在目标位置时返回None。
+    """
+    new_key = sharded_key(key, depth) or key
+    if not new_key.startswith('public/'):
+        new_key = f"public/{new_key}"
+    return new_key if new_key != key else None
+
+
+def _rewrite_file_info(info, depth, moves):
+    """改写单个文件元数据（包括衍生文件）中的path和url，记录需要移动的文件"""
+    storage = get_storage()
+    entries = [info] + list((info.get('derivatives') or {}).values())
+    entries += [info[extra] for extra in ('compact', 'peaks') if info.get(extra)]
+
+    for entry in entries:
+        new_key = sharded_key(entry.get('path') or '', depth)
+        if not new_key:
+            continue
+        moves[entry['path']] = new_key
+        entry['path'] = new_key
+        if 'url' in entry:
+            entry['url'] = storage.url(new_key)
+
+
+def _rewrite_content(value, depth):
+    content = json.loads(value)
+    moves = {}
+    for info in iter_content_files(content):
+        _rewrite_file_info(info, depth, moves)
+    return json.dumps(content), moves
+
+
+def _rewrite_url(value, depth):
+    key = path_from_url(value)
+    new_key = public_key(key, depth) if key else None
+    if not new_key:
+        return value, {}
+    return get_storage().url(new_key), {key: new_key}
+
+
+def _migrate_column(column, rewrite, depth, batch_size, dry_run, stats, progress):
+    """按主键分批迁移一列中引用的文件
+
+    每批先复制文件到新位置，再以旧值为条件更新记录和uploads表并提交，
+    最后删除旧文件。迁移期间记录被其他请求修改时跳过该记录，
+    复制出的新文件留给 gc-uploads 清理。
+    """
+    storage = get_storage()
+    table = column.table
+    values = {}
+    if 'updated_at' in table.c:
+        # 迁移不应改变记录的修改时间
+        values['updated_at'] = table.c.updated_at
+
+    last_id = 0
+    while True:
+        rows = db.session.query(table.c.id, column) \
+            .filter(table.c.id > last_id, column.isnot(None)) \
+            .order_by(table.c.id) \
+            .limit(batch_size) \
+            .all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        migrated = {}
+        for row_id, old_value in rows:
+            new_value, moves = rewrite(old_value, depth)
+            if not moves:
+                continue
+
+            stats['records'] += 1
+            stats['files'] += len(moves)
+            if dry_run:
+                continue
+
+            for old_key, new_key in moves.items():
+                if storage.exists(old_key):
+                    storage.copy(old_key, new_key)
+                else:
+                    stats['missing'] += 1
+
+            result = db.session.execute(
+                update(table)
+                .where(table.c.id == row_id, column == old_value)
+                .values({column.key: new_value, **values})
+            )
+            if result.rowcount:
+                for old_key, new_key in moves.items():
+                    Upload.query.filter_by(path=old_key).update({'path': new_key}, synchronize_session=False)
+                migrated.update(moves)
+            else:
+                stats['conflicts'] += 1
+
+        db.session.commit()
+
+        for old_key in migrated:
+            storage.delete(old_key)
+
+        if progress:
+            progress(table.name, last_id, stats)
+
+
+def migrate_uploads(depth, batch_size=500, dry_run=True, progress=None):
+    """将日期布局的上传文件迁移到分片布局，并改写数据库中的path和url
+
+    头像和课程封面同时移动到public/下，由nginx直接提供。
+
+    Args:
+        depth: 分片目录层数
+        batch_size: 每批处理的记录数
+        dry_run: 只统计不修改
+        progress: 进度回调，参数为(表名, 已处理到的ID, 统计信息)
+
+    Returns:
+        dict: 统计信息
+    """
+    stats = {'records': 0, 'files': 0, 'missing': 0, 'conflicts': 0}
+
+    for column in (Submission.content, Feedback.content):
+        _migrate_column(column, _rewrite_content, depth, batch_size, dry_run, stats, progress)
+    for column in (User.avatar_url, Course.cover_image):
+        _migrate_column(column, _rewrite_url, depth, batch_size, dry_run, stats, progress)
+
+    return stats
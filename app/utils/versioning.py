@@ -0,0 +1,87 @@
+# app/utils/versioning.py
+from sqlalchemy import select, func, text
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Submission
+
+# 版本号冲突时的最大重试次数
+MAX_VERSION_ATTEMPTS = 5
+
+
+def next_version_expr(homework_id, student_id):
+    """在INSERT语句中计算下一个版本号的子查询"""
+    return select(func.coalesce(func.max(Submission.version), 0) + 1) \
+        .where(Submission.homework_id == homework_id, Submission.student_id == student_id) \
+        .scalar_subquery()
+
+
+def lock_submission_versions(homework_id, student_id):
+    """PostgreSQL上按 (作业, 学生) 加事务级咨询锁，同一学生的并发提交依次分配版本号
+
+    锁在事务提交或回滚时释放，不同学生之间互不影响。
+    其他数据库不加锁，依靠唯一约束和重试保证版本号不重复。
+    """
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return
+    db.session.execute(
+        text('SELECT pg_advisory_xact_lock(:homework_id, :student_id)'),
+        {'homework_id': int(homework_id), 'student_id': int(student_id)}
+    )
+
+
+def add_submission(submission):
+    """插入提交并分配版本号
+
+    版本号在INSERT语句中由 COALESCE(MAX(version), 0) + 1 计算，
+    并由 (homework_id, student_id, version) 唯一约束保证不重复。
+    PostgreSQL上先获取该学生本作业的咨询锁，并发提交排队执行，不会冲突；
+    其他数据库上计算出相同版本号时，后插入的一方在保存点内回滚并重试，
+    会话中已有的其他改动（如上传文件记录）不受影响。
+
+    Args:
+        submission: 未保存的Submission对象
+
+    Returns:
+        Submission: 已写入数据库并分配了版本号的提交
+    """
+    lock_submission_versions(submission.homework_id, submission.student_id)
+    
+    for attempt in range(MAX_VERSION_ATTEMPTS):
+        submission.version = next_version_expr(submission.homework_id, submission.student_id)
+        try:
+            with db.session.begin_nested():
+                db.session.add(submission)
+            return submission
+        except IntegrityError:
+            if attempt == MAX_VERSION_ATTEMPTS - 1:
+                raise
+
+
+def repair_duplicate_versions():
+    """为已有数据库添加唯一约束前，重新编号重复的版本号
+
+    唯一约束加入前并发提交可能产生相同的版本号，直接创建约束会失败。
+    只处理存在重复的 (作业, 学生)，按提交时间和ID排序后从1开始连续编号。
+
+    Returns:
+        int: 重新编号的提交数量
+    """
+    groups = db.session.query(Submission.homework_id, Submission.student_id) \
+        .group_by(Submission.homework_id, Submission.student_id, Submission.version) \
+        .having(func.count(Submission.id) > 1) \
+        .distinct() \
+        .all()
+    
+    count = 0
+    for homework_id, student_id in groups:
+        rows = Submission.query \
+            .filter_by(homework_id=homework_id, student_id=student_id) \
+            .order_by(Submission.created_at, Submission.id) \
+            .all()
+        for version, submission in enumerate(rows, start=1):
+            if submission.version != version:
+                submission.version = version
+                count += 1
+    
+    db.session.commit()
+    return count
@@ -0,0 +1,98 @@
+# app/utils/waveform.py
+import subprocess
+import numpy as np
+from flask import current_app
+from app.utils.storage import get_storage
+
+# 解码用的采样率，波形显示不需要更高的精度
+PEAKS_SAMPLE_RATE = 8000
+PEAKS_FORMAT = 'int8-minmax'
+
+
+def peaks_key(key):
+    """波形数据的存储键，与原文件位于同一目录"""
+    stem = key.rsplit('.', 1)[0]
+    return f"{stem}.peaks"
+
+
+def compute_peaks(samples, buckets):
+    """计算每个区间的最小值和最大值
+
+    Args:
+        samples: int16单声道采样数组
+        buckets: 区间数量
+
+    Returns:
+        numpy.ndarray: 长度为2*buckets的int8数组，按 min, max 交替排列
+    """
+    if samples.size < buckets:
+        samples = np.pad(samples, (0, buckets - samples.size))
+    
+    # 各区间起点，区间长度相差不超过1个采样
+    edges = (np.arange(buckets, dtype=np.int64) * samples.size) // buckets
+    mins = np.minimum.reduceat(samples, edges)
+    maxs = np.maximum.reduceat(samples, edges)
+    
+    peaks = np.empty(buckets * 2, dtype=np.int8)
+    peaks[0::2] = mins >> 8
+    peaks[1::2] = maxs >> 8
+    return peaks
+
+
+def decode_samples(src_path):
+    """使用ffmpeg将音频解码为8kHz单声道int16采样"""
+    command = [
+        'ffmpeg', '-nostdin', '-hide_banner', '-loglevel', 'error',
+        '-i', src_path,
+        '-vn', '-ac', '1', '-ar', str(PEAKS_SAMPLE_RATE),
+        '-f', 's16le', '-'
+    ]
+    completed = subprocess.run(
+        command,
+        check=True,
+        capture_output=True,
+        timeout=current_app.config['AUDIO_TRANSCODE_TIMEOUT']
+    )
+    return np.frombuffer(completed.stdout, dtype='<i2')
+
+
+def generate_peaks(src_path, key):
+    """提取音频波形峰值并保存到存储
+
+    Returns:
+        dict: 波形数据的元数据（path、buckets、format、size）
+    """
+    storage = get_storage()
+    buckets = current_app.config['WAVEFORM_BUCKETS']
+    peaks = compute_peaks(decode_samples(src_path), buckets)
+    
+    pkey = peaks_key(key)
+    with storage.staging(pkey, 'application/octet-stream') as path:
+        with open(path, 'wb') as f:
+            f.write(peaks.tobytes())
+    
+    return {
+        'path': pkey,
+        'buckets': buckets,
+        'format': PEAKS_FORMAT,
+        'size': peaks.nbytes
+    }
+
+
+def load_peaks(info):
+    """读取音频的波形数据，历史音频首次访问时生成
+
+    Returns:
+        numpy.ndarray: int8数组，按 min, max 交替排列
+    """
+    from app.utils.media_workers import run_media_task
+    
+    storage = get_storage()
+    pkey = info['peaks']['path'] if info.get('peaks') else peaks_key(info['path'])
+    
+    if not storage.exists(pkey):
+        with storage.local_copy(info['path']) as src_path:
+            run_media_task(generate_peaks, src_path, info['path'])
+    
+    with storage.open(pkey) as f:
+        return np.frombuffer(f.read(), dtype=np.int8)
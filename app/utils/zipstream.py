@@ -0,0 +1,97 @@
+# app/utils/zipstream.py
+import io
+import zipfile
+from datetime import datetime
+from app.utils.file_delivery import STREAM_CHUNK_SIZE
+
+# 压缩率高的文件类型使用DEFLATED，图片、压缩音频等已压缩的媒体直接存储
+COMPRESSIBLE_EXTENSIONS = {'wav', 'csv', 'txt', 'json', 'xml', 'bmp', 'svg'}
+
+
+class _StreamBuffer(io.RawIOBase):
+    """只追加、不可定位的写缓冲区
+
+    zipfile检测到输出不可定位时，会在每个条目后写入数据描述符，
+    不需要回写本地文件头，因此可以边生成边发送。
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        """取出并清空已写入的数据"""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def compress_type_for(arcname):
+    ext = arcname.rsplit('.', 1)[-1].lower() if '.' in arcname else ''
+    return zipfile.ZIP_DEFLATED if ext in COMPRESSIBLE_EXTENSIONS else zipfile.ZIP_STORED
+
+
+def zip_stream(entries, chunk_size=STREAM_CHUNK_SIZE):
+    """边读取边生成ZIP文件的数据块
+
+    不使用临时文件，也不在内存中保存整个压缩包，
+    占用的内存只与块大小有关，与条目数量和文件大小无关。
+
+    Args:
+        entries: 可迭代对象，每项为 (压缩包内路径, 可读文件对象, 文件大小, 修改时间)，
+            文件对象读取完后会被关闭；文件大小用于决定是否需要ZIP64
+        chunk_size: 每次读取的块大小
+
+    Yields:
+        bytes: ZIP文件的数据块
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', allowZip64=True) as zf:
+        for arcname, fileobj, size, modified in entries:
+            info = zipfile.ZipInfo(arcname, date_time=(modified or datetime.now()).timetuple()[:6])
+            info.compress_type = compress_type_for(arcname)
+            info.file_size = size or 0
+
+            try:
+                with zf.open(info, 'w') as dst:
+                    for chunk in iter(lambda: fileobj.read(chunk_size), b''):
+                        dst.write(chunk)
+                        data = buffer.drain()
+                        if data:
+                            yield data
+            finally:
+                fileobj.close()
+
+            yield buffer.drain()
+
+    # 中央目录
+    yield buffer.drain()
+
+
+class IterReader(io.RawIOBase):
+    """把字节块生成器包装为可读文件对象，用于边生成边压缩的条目"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = b''
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self._pending) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._pending += chunk
+        if size < 0:
+            data, self._pending = self._pending, b''
+        else:
+            data, self._pending = self._pending[:size], self._pending[size:]
+        return data
@@ -163,21 +163,24 @@ def submit_homework(homework_id):
         student_id=current_user.id
     ).order_by(Submission.version.desc()).first()
     
-    # 设置版本号
-    version = 1
-    if prev_submission:
-        version = prev_submission.version + 1
-    
     if request.method == 'POST':
+        from app.utils.quota import check_quota
+        
+        # 在解析上传内容之前检查存储配额
+        error = check_quota('user', current_user.id, request.content_length) or \
+            check_quota('course', course.id, request.content_length)
+        if error:
+            flash(error, 'danger')
+            return redirect(url_for('student_views.submit_homework', homework_id=homework_id))
+        
         # 处理提交
         comment = request.form.get('comment', '')
         
-        # 创建提交记录
+        # 创建提交记录，版本号在插入时分配
         submission = Submission(
             homework_id=homework_id,
             student_id=current_user.id,
             comment=comment,
-            version=version,
             status='submitted'
         )
         
@@ -191,17 +194,15 @@ def submit_homework(homework_id):
             if text_content:
                 content_data['text'] = text_content
             
-            # 处理图像上传
+            # 并行处理图像上传
             if 'essay_images' in request.files:
-                from app.utils.file_handler import save_file
+                from app.utils.file_handler import save_files
                 
-                images = request.files.getlist('essay_images')
-                image_data = []
-                for img in images:
-                    if img.filename:
-                        file_info = save_file(img, 'image')
-                        if file_info:
-                            image_data.append(file_info)
+                try:
+                    image_data = save_files(request.files.getlist('essay_images'), 'image', owner_id=current_user.id)
+                except ValueError as e:
+                    flash(str(e), 'danger')
+                    return redirect(url_for('student_views.submit_homework', homework_id=homework_id))
                 
                 if image_data:
                     content_data['images'] = image_data
@@ -213,14 +214,18 @@ def submit_homework(homework_id):
                 
                 audio = request.files['oral_audio']
                 if audio.filename:
-                    file_info = save_file(audio, 'audio')
+                    file_info = save_file(audio, 'audio', owner_id=current_user.id)
                     if file_info:
                         content_data['audio'] = file_info
         
         # 设置内容
         submission.content_data = content_data
         
-        db.session.add(submission)
+        from app.utils.file_handler import link_uploads
+        from app.utils.versioning import add_submission
+        
+        add_submission(submission)
+        link_uploads(content_data, submission_id=submission.id, course_id=course.id)
         db.session.commit()
         
         flash('作业提交成功', 'success')
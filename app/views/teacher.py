@@ -1,8 +1,10 @@
 # app/views/teacher.py
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, jsonify, make_response
 from flask_login import login_required, current_user
 from app import db
 from app.models import Course, Homework, Submission, Feedback, User
+from app.utils.grading_queue import release_claims, submission_with_next
+from app.utils.file_delivery import delivery_content, preload_links
 from datetime import datetime, timedelta
 
 teacher_views = Blueprint('teacher_views', __name__)
@@ -151,7 +153,11 @@ def create_course():
             
             cover_image = request.files['cover_image']
             if cover_image.filename:
-                file_info = save_file(cover_image, 'image')
+                try:
+                    file_info = save_file(cover_image, 'image', public=True, owner_id=current_user.id)
+                except ValueError as e:
+                    flash(str(e), 'danger')
+                    return redirect(url_for('teacher_views.create_course'))
                 if file_info:
                     course.cover_image = file_info['url']
         
@@ -250,18 +256,23 @@ def edit_course(course_id):
         
         # 处理封面图片
         if 'cover_image' in request.files:
-            from app.utils.file_handler import save_file, delete_file
+            from app.utils.file_handler import save_file, delete_file, path_from_url
             
             cover_image = request.files['cover_image']
             if cover_image.filename:
-                # 删除旧图片
-                if course.cover_image:
-                    old_path = course.cover_image.replace('/static/uploads/', '')
-                    delete_file(old_path)
+                # 保存新图片，图片无效时保留旧图片
+                try:
+                    file_info = save_file(cover_image, 'image', public=True, owner_id=current_user.id)
+                except ValueError as e:
+                    flash(str(e), 'danger')
+                    return redirect(url_for('teacher_views.edit_course', course_id=course_id))
                 
-                # 保存新图片
-                file_info = save_file(cover_image, 'image')
                 if file_info:
+                    # 删除旧图片
+                    if course.cover_image:
+                        old_path = path_from_url(course.cover_image)
+                        if old_path:
+                            delete_file(old_path)
                     course.cover_image = file_info['url']
         
         db.session.commit()
@@ -477,14 +488,15 @@ def edit_homework(homework_id):
         
         # 处理新附件
         if 'attachment' in request.files:
-            from app.utils.file_handler import save_file, delete_file
+            from app.utils.file_handler import save_file, delete_file, path_from_url
             
             attachment = request.files['attachment']
             if attachment.filename:
                 # 删除旧附件
                 if homework.attachment:
-                    old_path = homework.attachment.replace('/static/uploads/', '')
-                    delete_file(old_path)
+                    old_path = path_from_url(homework.attachment)
+                    if old_path:
+                        delete_file(old_path)
                 
                 # 保存新附件
                 file_info = save_file(attachment, 'homework')
@@ -535,9 +547,15 @@ def homework_submissions(homework_id):
 @teacher_views.route('/submissions/<int:submission_id>/grade', methods=['GET', 'POST'])
 @teacher_required
 def grade_submission(submission_id):
-    """给作业提交评分"""
-    # 获取提交
-    submission = Submission.query.get_or_404(submission_id)
+    """给作业提交评分
+    
+    同时确定批改队列中的下一个待批改提交，页面通过Link头预加载当前提交的媒体
+    并预取下一个提交的页面和图片；表单带 save_and_next 时评分后直接进入下一个。
+    """
+    # 获取提交及下一个待批改的提交
+    submission, next_submission = submission_with_next(submission_id, current_user.id)
+    if submission is None:
+        abort(404)
     
     # 验证课程归属
     if submission.homework.course.teacher_id != current_user.id and not current_user.is_admin():
@@ -558,7 +576,7 @@ def grade_submission(submission_id):
         # 创建或更新反馈
         feedback = Feedback.query.filter_by(submission_id=submission_id).first()
         if not feedback:
-            feedback = Feedback(submission_id=submission_id)
+            feedback = Feedback(submission_id=submission_id, teacher_id=current_user.id)
             db.session.add(feedback)
         
         feedback.score = score
@@ -568,9 +586,33 @@ def grade_submission(submission_id):
         # 更新提交状态
         submission.status = 'graded'
         
+        # 已批改，释放批改队列中的认领
+        release_claims([submission.id])
         db.session.commit()
         
         flash('作业评分成功', 'success')
+        if next_submission and 'save_and_next' in request.form:
+            return redirect(url_for('teacher_views.grade_submission', submission_id=next_submission.id))
         return redirect(url_for('teacher_views.homework_submissions', homework_id=submission.homework_id))
     
-    return render_template('teacher/grade_submission.html', submission=submission)
+    # 当前页面的媒体预加载，下一个提交的页面和图片预取
+    content = delivery_content(submission.content_data, 'submission', submission.id)
+    links = preload_links(content)
+    next_url = None
+    if next_submission:
+        next_url = url_for('teacher_views.grade_submission', submission_id=next_submission.id)
+        links.append(f'<{next_url}>; rel=prefetch')
+        next_content = delivery_content(next_submission.content_data, 'submission', next_submission.id)
+        links.extend(preload_links(next_content, rel='prefetch', limit=2))
+    
+    response = make_response(render_template(
+        'teacher/grade_submission.html',
+        submission=submission,
+        content=content,
+        feedback=Feedback.query.filter_by(submission_id=submission.id).first(),
+        next_submission=next_submission,
+        next_url=next_url
+    ))
+    if links:
+        response.headers['Link'] = ', '.join(links)
+    return response
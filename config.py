@@ -19,6 +19,77 @@ class Config:
     ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
     ALLOWED_AUDIO_EXTENSIONS = {'mp3', 'wav', 'ogg'}
     
+    # 上传目录布局：hash 按文件名前缀分片（如 image/ab/cd/xxx.jpg），date 按日期（image/20240101/xxx.jpg）
+    UPLOAD_LAYOUT = os.environ.get('UPLOAD_LAYOUT', 'hash')
+    UPLOAD_SHARD_DEPTH = int(os.environ.get('UPLOAD_SHARD_DEPTH', '2'))  # 分片目录层数，每层两位十六进制
+    
+    # 存储配额（字节，0表示不限制）：每个学生、每门课程的上传总量
+    USER_STORAGE_QUOTA = int(os.environ.get('USER_STORAGE_QUOTA', str(500 * 1024 * 1024)))  # 500MB
+    COURSE_STORAGE_QUOTA = int(os.environ.get('COURSE_STORAGE_QUOTA', str(20 * 1024 * 1024 * 1024)))  # 20GB
+    
+    # 每个进程缓存的课程级计算结果（成绩矩阵、统计分析）数量
+    COURSE_CACHE_SIZE = int(os.environ.get('COURSE_CACHE_SIZE', '256'))
+    
+    # 批改队列：认领的有效期（秒）、单次最多认领的提交数
+    GRADING_LEASE_SECONDS = int(os.environ.get('GRADING_LEASE_SECONDS', '900'))
+    GRADING_CLAIM_MAX = int(os.environ.get('GRADING_CLAIM_MAX', '50'))
+    
+    # 事件推送：auto 在PostgreSQL上使用LISTEN/NOTIFY跨进程分发，其他数据库只在进程内分发；
+    # 也可设为 postgres 或 local
+    EVENT_BUS = os.environ.get('EVENT_BUS', 'auto')
+    EVENT_CHANNEL = os.environ.get('EVENT_CHANNEL', 'homework_events')
+    # SSE连接的心跳间隔和最长保持时间（秒），超时后浏览器自动重连
+    SSE_HEARTBEAT_SECONDS = int(os.environ.get('SSE_HEARTBEAT_SECONDS', '15'))
+    SSE_MAX_SECONDS = int(os.environ.get('SSE_MAX_SECONDS', '300'))
+    # 每个worker进程同时保持的SSE连接上限，超出时返回503让浏览器稍后重连，
+    # 需小于worker的线程数，为普通请求留出线程
+    SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', '16'))
+    
+    # 幂等请求配置：保存响应的时间、处理中请求的最长锁定时间（秒）
+    IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', str(24 * 3600)))
+    IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', '600'))
+    
+    # 图像规范化配置：像素预算、最长边限制
+    IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', str(40 * 1000 * 1000)))  # 4000万像素
+    IMAGE_MAX_SIDE = int(os.environ.get('IMAGE_MAX_SIDE', '4096'))
+    
+    # 每个进程同时处理图像、音频的最大线程数
+    MEDIA_WORKERS = int(os.environ.get('MEDIA_WORKERS', '4'))
+    
+    # 单个请求并行保存上传文件的最大线程数
+    INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', '4'))
+    
+    # 图像衍生图配置：上传时生成缩略图、预览图和WebP全图
+    IMAGE_DERIVATIVES_ON_INGEST = os.environ.get('IMAGE_DERIVATIVES_ON_INGEST', 'true').lower() in ['true', 'on', '1']
+    WEBP_QUALITY = int(os.environ.get('WEBP_QUALITY', '80'))
+    
+    # 音频转码配置：上传时生成响度归一化的Opus/WebM紧凑版本
+    AUDIO_TRANSCODE_ENABLED = os.environ.get('AUDIO_TRANSCODE_ENABLED', 'true').lower() in ['true', 'on', '1']
+    AUDIO_OPUS_BITRATE = os.environ.get('AUDIO_OPUS_BITRATE', '32k')
+    AUDIO_TARGET_LOUDNESS = float(os.environ.get('AUDIO_TARGET_LOUDNESS', '-16'))  # LUFS
+    AUDIO_TRANSCODE_TIMEOUT = int(os.environ.get('AUDIO_TRANSCODE_TIMEOUT', '120'))  # 秒
+    WAVEFORM_BUCKETS = int(os.environ.get('WAVEFORM_BUCKETS', '1000'))  # 波形峰值区间数
+    
+    # 存储后端配置：local 或 s3（兼容MinIO）
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+    UPLOAD_URL_PREFIX = os.environ.get('UPLOAD_URL_PREFIX', '/static/uploads')
+    S3_BUCKET = os.environ.get('S3_BUCKET')
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')
+    # 浏览器可访问的存储地址，只用于签名预签名URL；为空时与S3_ENDPOINT_URL相同
+    S3_PRESIGN_ENDPOINT_URL = os.environ.get('S3_PRESIGN_ENDPOINT_URL')
+    S3_REGION = os.environ.get('S3_REGION', 'us-east-1')
+    S3_ACCESS_KEY = os.environ.get('S3_ACCESS_KEY')
+    S3_SECRET_KEY = os.environ.get('S3_SECRET_KEY')
+    S3_PUBLIC_URL = os.environ.get('S3_PUBLIC_URL')
+    S3_PREFIX = os.environ.get('S3_PREFIX', '')
+    PRESIGNED_URL_EXPIRES = int(os.environ.get('PRESIGNED_URL_EXPIRES', '3600'))  # 1小时
+    # 启动时自动创建存储桶（也可以手动执行 flask init-storage）
+    STORAGE_CREATE_BUCKET = os.environ.get('STORAGE_CREATE_BUCKET', 'false').lower() in ['true', 'on', '1']
+    
+    # 受保护文件下载：权限检查后由nginx通过X-Accel-Redirect发送
+    USE_X_ACCEL_REDIRECT = os.environ.get('USE_X_ACCEL_REDIRECT', 'false').lower() in ['true', 'on', '1']
+    X_ACCEL_REDIRECT_PREFIX = os.environ.get('X_ACCEL_REDIRECT_PREFIX', '/protected/uploads')
+    
     # 安全配置
     SESSION_COOKIE_SECURE = os.environ.get('SESSION_COOKIE_SECURE', 'false').lower() in ['true', 'on', '1']
     SESSION_COOKIE_HTTPONLY = True
@@ -117,6 +188,9 @@ class ProductionConfig(Config):
     # 生产环境额外安全配置
     SESSION_COOKIE_SECURE = True
     
+    # 生产环境由nginx发送受保护文件
+    USE_X_ACCEL_REDIRECT = os.environ.get('USE_X_ACCEL_REDIRECT', 'true').lower() in ['true', 'on', '1']
+    
     @classmethod
     def init_app(cls, app):
         Config.init_app(app)
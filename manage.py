@@ -48,6 +48,156 @@ def create_admin(username, email, password):
     
     click.echo('管理员创建成功')
 
+@app.cli.command()
+@click.option('--dry-run', is_flag=True, help='只统计孤立文件，不做修改')
+@click.option('--grace-hours', default=24, show_default=True, help='宽限期（小时），较新的文件不会被清理')
+@click.option('--delete', 'hard_delete', is_flag=True, help='直接删除孤立文件，默认移动到隔离区')
+def gc_uploads(dry_run, grace_hours, hard_delete):
+    """清理未被任何记录引用的上传文件"""
+    from app.utils.upload_gc import collect_garbage
+    
+    def progress(stage, count):
+        label = '已读取引用' if stage == 'referenced' else '已发现孤立文件'
+        click.echo(f'{label}: {count}')
+    
+    stats = collect_garbage(
+        grace_seconds=grace_hours * 3600,
+        dry_run=dry_run,
+        quarantine=not hard_delete,
+        progress=progress
+    )
+    
+    click.echo(f"引用文件: {stats['referenced']}")
+    click.echo(f"孤立文件: {stats['orphans']} ({stats['orphan_bytes'] / 1024 / 1024:.1f} MB)")
+    click.echo(f"宽限期内跳过: {stats['skipped_recent']}")
+    if dry_run:
+        click.echo('试运行模式，未做任何修改')
+    else:
+        action = '删除' if hard_delete else '移动到隔离区'
+        click.echo(f"已{action}: {stats['removed']}")
+
+@app.cli.command()
+@click.option('--dry-run', is_flag=True, help='只统计需要迁移的文件，不做修改')
+@click.option('--batch-size', default=500, show_default=True, help='每批处理的记录数')
+@click.option('--depth', type=int, default=None, help='分片目录层数，默认使用UPLOAD_SHARD_DEPTH')
+def migrate_uploads(dry_run, batch_size, depth):
+    """将按日期存放的上传文件迁移到分片目录布局，并将头像和课程封面移动到公开目录"""
+    from app.utils.upload_migration import migrate_uploads as run_migration
+    
+    def progress(table, last_id, stats):
+        click.echo(f"{table}: 已处理到ID {last_id}，迁移记录 {stats['records']}，文件 {stats['files']}")
+    
+    stats = run_migration(
+        depth=depth or app.config['UPLOAD_SHARD_DEPTH'],
+        batch_size=batch_size,
+        dry_run=dry_run,
+        progress=progress
+    )
+    
+    click.echo(f"迁移记录: {stats['records']}")
+    click.echo(f"迁移文件: {stats['files']}")
+    click.echo(f"缺失文件: {stats['missing']}")
+    click.echo(f"并发修改跳过: {stats['conflicts']}")
+    if dry_run:
+        click.echo('试运行模式，未做任何修改')
+
+@app.cli.command()
+@click.option('--batch-size', default=500, show_default=True, help='每批处理的记录数')
+@click.option('--hash', 'compute_hash', is_flag=True, help='读取文件计算SHA-256（较慢）')
+def backfill_uploads(batch_size, compute_hash):
+    """根据已有记录补全uploads表"""
+    from app.utils.upload_backfill import backfill_uploads as run_backfill
+    
+    db.create_all()
+    
+    def progress(table, last_id, stats):
+        click.echo(f"{table}: 已处理到ID {last_id}，登记文件 {stats['uploads']}")
+    
+    stats = run_backfill(batch_size=batch_size, compute_hash=compute_hash, progress=progress)
+    
+    click.echo(f"处理记录: {stats['records']}")
+    click.echo(f"登记文件: {stats['uploads']}")
+    click.echo(f"缺失文件: {stats['missing']}")
+    
+    # 补登记的文件没有经过计数器，根据uploads表重建
+    from app.utils.quota import recount_usage
+    click.echo(f'已重建 {recount_usage()} 个存储用量计数器')
+
+@app.cli.command()
+def init_storage():
+    """创建存储后端的存储桶（本地存储为上传目录）"""
+    from app.utils.storage import get_storage
+    
+    if get_storage().ensure_bucket():
+        click.echo('已创建存储位置')
+    else:
+        click.echo('存储位置已存在')
+
+@app.cli.command()
+def recount_storage():
+    """根据uploads表重建用户和课程的存储用量计数器"""
+    from app.utils.quota import recount_usage
+    
+    count = recount_usage()
+    click.echo(f'已重建 {count} 个计数器')
+
+@app.cli.command()
+def purge_idempotency_keys():
+    """删除过期的幂等键"""
+    from app.utils.idempotency import purge_expired_keys
+    
+    click.echo(f'已删除 {purge_expired_keys()} 个过期的幂等键')
+
+@app.cli.command()
+@click.option('--course-id', type=int, default=None, help='只重新计算该课程，默认为全部课程')
+def recompute_final_grades(course_id):
+    """按课程评分规则重新计算总评成绩"""
+    from app.utils.final_grades import recompute_final_grades as recompute
+    
+    course_ids = [course_id] if course_id else [course.id for course in Course.query.order_by(Course.id)]
+    for cid in course_ids:
+        count = recompute(cid)
+        db.session.commit()
+        click.echo(f'课程 {cid}: 已计算 {count} 名学生的总评')
+
+@app.cli.command()
+def refresh_final_grades():
+    """重新计算被标记为过期的总评（可由定时任务执行，避免读取时计算）"""
+    from app.utils.final_grades import refresh_all_stale_final_grades
+    
+    click.echo(f'已重新计算 {refresh_all_stale_final_grades()} 个课程的总评')
+
+@app.cli.command()
+def upgrade_submission_versions():
+    """为已有数据库的提交表添加 (作业, 学生, 版本号) 唯一约束
+
+    新建的数据库由模型直接创建约束，无需执行。先重新编号历史上重复的版本号，
+    再创建约束；PostgreSQL上等价于：
+    ALTER TABLE submissions ADD CONSTRAINT uq_submission_version UNIQUE (homework_id, student_id, version);
+    """
+    from sqlalchemy import inspect, text
+    from app.utils.versioning import repair_duplicate_versions
+    
+    inspector = inspect(db.engine)
+    names = {c['name'] for c in inspector.get_unique_constraints('submissions')} | \
+        {i['name'] for i in inspector.get_indexes('submissions')}
+    if 'uq_submission_version' in names:
+        click.echo('唯一约束已存在')
+        return
+    
+    click.echo(f'已重新编号 {repair_duplicate_versions()} 个重复版本')
+    
+    if db.engine.dialect.name == 'postgresql':
+        ddl = ('ALTER TABLE submissions ADD CONSTRAINT uq_submission_version '
+               'UNIQUE (homework_id, student_id, version)')
+    else:
+        # SQLite不支持ALTER TABLE ADD CONSTRAINT，唯一索引效果相同
+        ddl = ('CREATE UNIQUE INDEX uq_submission_version '
+               'ON submissions (homework_id, student_id, version)')
+    with db.engine.begin() as conn:
+        conn.execute(text(ddl))
+    click.echo('已创建唯一约束')
+
 @app.cli.command()
 def init_db():
     """初始化数据库并创建测试数据"""
@@ -0,0 +1,62 @@
+# tests/base.py
+import os
+import sys
+import types
+import shutil
+import tempfile
+import unittest
+from flask import Blueprint
+
+# 管理后台视图尚未提交到仓库，导入失败时注册一个空蓝图以便创建应用
+try:
+    import app.views.admin  # noqa: F401
+except ImportError:
+    admin_stub = types.ModuleType('app.views.admin')
+    admin_stub.admin_views = Blueprint('admin_views', 'app.views.admin')
+    sys.modules['app.views.admin'] = admin_stub
+
+from app import create_app, db
+from app.models import User, Course, Homework
+from app.utils.auth import generate_token
+
+
+class AppTestCase(unittest.TestCase):
+    """创建测试应用和基础数据（教师、学生、课程、作业）"""
+
+    # 子类可覆盖的应用配置
+    config_overrides = {}
+
+    def setUp(self):
+        self.upload_folder = tempfile.mkdtemp()
+        self.app = create_app('testing')
+        self.app.config['UPLOAD_FOLDER'] = self.upload_folder
+        self.app.config.update(self.config_overrides)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.client = self.app.test_client()
+
+        db.create_all()
+        self.teacher = User(username='teacher', email='teacher@example.com', role='teacher')
+        self.teacher.password = 'password'
+        self.student = User(username='student', email='student@example.com', role='student')
+        self.student.password = 'password'
+        db.session.add_all([self.teacher, self.student])
+        db.session.flush()
+
+        self.course = Course(name='英语写作', teacher_id=self.teacher.id)
+        self.course.students.append(self.student)
+        db.session.add(self.course)
+        db.session.flush()
+
+        self.homework = Homework(title='第一篇作文', course_id=self.course.id, assignment_type='essay')
+        db.session.add(self.homework)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.upload_folder, ignore_errors=True)
+
+    def auth_headers(self, user):
+        return {'Authorization': f'Bearer {generate_token(user.id)}'}
@@ -0,0 +1,44 @@
+# tests/test_course_cache.py
+import unittest
+from base import AppTestCase
+from app import db
+from app.models import Homework, CourseRevision
+from app.utils.course_cache import get_course_revision
+
+
+class CourseRevisionTestCase(AppTestCase):
+
+    def stored_revision(self):
+        # 修订号由单独的事务写入，从新的连接读取
+        with db.engine.connect() as connection:
+            return connection.execute(
+                db.select(CourseRevision.revision).where(CourseRevision.course_id == self.course.id)
+            ).scalar() or 0
+
+    def test_revision_bumped_once_after_commit(self):
+        before = get_course_revision(self.course.id)
+        db.session.commit()
+
+        db.session.add(Homework(title='第二篇作文', course_id=self.course.id, assignment_type='essay'))
+        db.session.flush()
+        db.session.add(Homework(title='第三篇作文', course_id=self.course.id, assignment_type='essay'))
+        db.session.flush()
+        # 业务事务中不写修订号
+        self.assertEqual(self.stored_revision(), before)
+
+        db.session.commit()
+        self.assertEqual(self.stored_revision(), before + 1)
+
+    def test_rollback_does_not_bump(self):
+        before = get_course_revision(self.course.id)
+        db.session.commit()
+
+        db.session.add(Homework(title='草稿', course_id=self.course.id, assignment_type='essay'))
+        db.session.flush()
+        db.session.rollback()
+        db.session.commit()
+        self.assertEqual(self.stored_revision(), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+# tests/test_events.py
+import unittest
+from base import AppTestCase
+from app.utils.events import hub
+
+
+class EventStreamTestCase(AppTestCase):
+
+    config_overrides = {'SSE_MAX_STREAMS': 1, 'EVENT_BUS': 'local'}
+
+    def open_stream(self):
+        return self.client.get('/api/events/stream', headers=self.auth_headers(self.teacher), buffered=False)
+
+    def test_rejects_streams_over_limit(self):
+        first = self.open_stream()
+        self.assertEqual(first.status_code, 200)
+
+        second = self.open_stream()
+        self.assertEqual(second.status_code, 503)
+        self.assertTrue(second.get_data(as_text=True).startswith('retry: '))
+        self.assertTrue(second.headers.get('Retry-After'))
+
+        # 关闭连接后释放名额
+        first.close()
+        third = self.open_stream()
+        self.assertEqual(third.status_code, 200)
+        third.close()
+        self.assertEqual(len(hub._subscriptions), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+# tests/test_final_grades.py
+import unittest
+from base import AppTestCase
+from app import db
+from app.models import Submission, Feedback, FinalGrade, StaleFinalGrade
+
+
+class FinalGradesTestCase(AppTestCase):
+
+    def grade(self, score):
+        submission = Submission(homework_id=self.homework.id, student_id=self.student.id,
+                                version=1, status='graded')
+        db.session.add(submission)
+        db.session.flush()
+        feedback = Feedback(submission_id=submission.id, teacher_id=self.teacher.id, score=score)
+        db.session.add(feedback)
+        db.session.commit()
+        return feedback
+
+    def get_final_grades(self):
+        resp = self.client.get(f'/api/courses/{self.course.id}/final-grades',
+                               headers=self.auth_headers(self.teacher))
+        self.assertEqual(resp.status_code, 200)
+        return {row['student_id']: row['grade'] for row in resp.get_json()['final_grades']}
+
+    def test_commit_only_marks_stale(self):
+        self.get_final_grades()
+        self.grade(80)
+
+        # 写入成绩的事务只追加标记，不计算总评
+        self.assertEqual(FinalGrade.query.filter_by(student_id=self.student.id).one().grade, None)
+        self.assertEqual([m.student_id for m in StaleFinalGrade.query], [self.student.id])
+
+        self.assertEqual(self.get_final_grades(), {self.student.id: 80.0})
+        self.assertEqual(StaleFinalGrade.query.count(), 0)
+
+    def test_rollback_discards_marks(self):
+        self.get_final_grades()
+        submission = Submission(homework_id=self.homework.id, student_id=self.student.id, version=1)
+        db.session.add(submission)
+        db.session.flush()
+        db.session.rollback()
+
+        self.assertEqual(StaleFinalGrade.query.count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
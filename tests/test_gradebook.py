@@ -0,0 +1,41 @@
+# tests/test_gradebook.py
+import unittest
+from base import AppTestCase
+from app import db
+from app.models import Submission, Feedback
+from app.utils.gradebook import course_homeworks, iter_gradebook_rows
+
+
+class GradebookExportTestCase(AppTestCase):
+
+    def submit(self, version, score=None):
+        submission = Submission(homework_id=self.homework.id, student_id=self.student.id,
+                                version=version, status='submitted')
+        db.session.add(submission)
+        db.session.flush()
+        if score is not None:
+            submission.status = 'graded'
+            db.session.add(Feedback(submission_id=submission.id, teacher_id=self.teacher.id, score=score))
+        db.session.commit()
+
+    def export_score(self):
+        rows = list(iter_gradebook_rows(self.course.id, course_homeworks(self.course.id)))
+        self.assertEqual(len(rows), 1)
+        return rows[0][3]
+
+    def test_resubmission_keeps_last_graded_score(self):
+        self.submit(1, score=70)
+        self.submit(2, score=85)
+        self.assertEqual(self.export_score(), 85)
+
+        # 批改后重新提交，新版本尚未批改
+        self.submit(3)
+        self.assertEqual(self.export_score(), 85)
+
+    def test_ungraded_homework_is_blank(self):
+        self.submit(1)
+        self.assertIsNone(self.export_score())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+# tests/test_grading_queue.py
+import unittest
+from datetime import datetime, timedelta
+from base import AppTestCase
+from app import db
+from app.models import User, Submission, GradingClaim
+from app.utils.grading_queue import claim_submissions, _insert_claims
+
+
+class GradingQueueTestCase(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other = User(username='teacher2', email='teacher2@example.com', role='teacher')
+        self.other.password = 'password'
+        db.session.add(self.other)
+        self.submission = Submission(homework_id=self.homework.id, student_id=self.student.id,
+                                     version=1, status='submitted')
+        db.session.add(self.submission)
+        db.session.commit()
+
+    def claim_row(self, grader_id, now):
+        return {
+            'submission_id': self.submission.id,
+            'grader_id': grader_id,
+            'course_id': self.course.id,
+            'claimed_at': now,
+            'expires_at': now + timedelta(minutes=15)
+        }
+
+    def test_live_claim_is_not_replaced(self):
+        claims = claim_submissions(self.teacher.id, self.course.id, 5)
+        db.session.commit()
+        self.assertEqual([claim.grader_id for claim, _ in claims], [self.teacher.id])
+
+        # 模拟另一名教师在认领提交前读取了候选行：写入时不能覆盖未过期的认领
+        now = datetime.utcnow()
+        self.assertEqual(_insert_claims([self.claim_row(self.other.id, now)], now), set())
+        db.session.commit()
+        self.assertEqual(db.session.get(GradingClaim, self.submission.id).grader_id, self.teacher.id)
+
+    def test_expired_claim_is_replaced(self):
+        past = datetime.utcnow() - timedelta(hours=1)
+        db.session.add(GradingClaim(submission_id=self.submission.id, grader_id=self.teacher.id,
+                                    course_id=self.course.id, claimed_at=past, expires_at=past))
+        db.session.commit()
+
+        claims = claim_submissions(self.other.id, self.course.id, 5)
+        db.session.commit()
+        self.assertEqual([(claim.submission_id, claim.grader_id) for claim, _ in claims],
+                         [(self.submission.id, self.other.id)])
+        self.assertGreater(db.session.get(GradingClaim, self.submission.id).expires_at, datetime.utcnow())
+
+
+if __name__ == '__main__':
+    unittest.main()
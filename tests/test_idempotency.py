@@ -0,0 +1,49 @@
+# tests/test_idempotency.py
+import io
+import unittest
+from unittest import mock
+from base import AppTestCase
+from app.models import IdempotencyKey, Submission
+
+
+class IdempotencyTestCase(AppTestCase):
+
+    def post_submission(self, key, **data):
+        headers = self.auth_headers(self.student)
+        headers['Idempotency-Key'] = key
+        return self.client.post('/api/submissions/', headers=headers, data=data)
+
+    def test_replays_success_and_validation_errors(self):
+        first = self.post_submission('a', homework_id=self.homework.id, text_content='hello')
+        second = self.post_submission('a', homework_id=self.homework.id, text_content='hello')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.headers.get('Idempotent-Replayed'), 'true')
+        self.assertEqual(Submission.query.count(), 1)
+
+        self.assertEqual(self.post_submission('b').status_code, 400)
+        self.assertEqual(self.post_submission('b').headers.get('Idempotent-Replayed'), 'true')
+
+    def test_does_not_store_state_dependent_errors(self):
+        self.app.config['USER_STORAGE_QUOTA'] = 1
+        resp = self.post_submission('c', homework_id=self.homework.id, text_content='hello')
+        self.assertEqual(resp.status_code, 413)
+        self.assertIsNone(IdempotencyKey.query.filter_by(key='c').first())
+
+        # 配额调整后使用同一个键重试可以成功
+        self.app.config['USER_STORAGE_QUOTA'] = 0
+        resp = self.post_submission('c', homework_id=self.homework.id, text_content='hello')
+        self.assertEqual(resp.status_code, 201)
+        self.assertIsNone(resp.headers.get('Idempotent-Replayed'))
+
+    def test_storage_failure_is_retryable(self):
+        with mock.patch('app.utils.file_handler.save_file', side_effect=OSError('disk full')):
+            resp = self.post_submission('d', homework_id=self.homework.id,
+                                        essay_images=(io.BytesIO(b'x'), 'essay.png'))
+        self.assertEqual(resp.status_code, 503)
+        self.assertIn('message', resp.get_json())
+        self.assertIsNone(IdempotencyKey.query.filter_by(key='d').first())
+
+
+if __name__ == '__main__':
+    unittest.main()
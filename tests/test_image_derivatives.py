@@ -0,0 +1,55 @@
+# tests/test_image_derivatives.py
+import io
+import os
+import unittest
+from PIL import Image
+from base import AppTestCase
+from app.utils.storage import get_storage
+from app.utils.image_derivatives import ensure_derivative, derivative_key
+
+
+class ImageDerivativesTestCase(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.storage = get_storage()
+        self.key = 'image/ab/cd/abcd1234.jpg'
+        with self.storage.staging(self.key, 'image/jpeg') as path:
+            Image.new('RGB', (1600, 900), (10, 120, 200)).save(path, 'JPEG')
+
+    def test_ensure_derivative_generates_only_requested_variant(self):
+        dkey = ensure_derivative({'path': self.key}, 'thumb')
+
+        self.assertEqual(dkey, derivative_key(self.key, 'thumb'))
+        with Image.open(self.storage.local_path(dkey)) as img:
+            self.assertEqual(max(img.size), 320)
+        self.assertFalse(self.storage.exists(derivative_key(self.key, 'preview')))
+        self.assertFalse(self.storage.exists(derivative_key(self.key, 'full')))
+
+    def test_staging_publishes_only_complete_files(self):
+        key = 'image/ab/cd/abcd5678.webp'
+        with self.assertRaises(RuntimeError):
+            with self.storage.staging(key) as path:
+                with open(path, 'wb') as f:
+                    f.write(b'partial')
+                self.assertFalse(self.storage.exists(key))
+                raise RuntimeError('写入中断')
+
+        self.assertFalse(self.storage.exists(key))
+        # 不留下临时文件
+        self.assertEqual(os.listdir(os.path.dirname(self.storage.local_path(key))),
+                         [os.path.basename(self.key)])
+
+    def test_invalid_public_image_is_rejected(self):
+        resp = self.client.post('/api/users/avatar', headers=self.auth_headers(self.student),
+                                data={'avatar': (io.BytesIO(b'not an image'), 'avatar.png')})
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn('message', resp.get_json())
+
+        resp = self.client.put(f'/api/courses/{self.course.id}', headers=self.auth_headers(self.teacher),
+                               data={'cover_image': (io.BytesIO(b'not an image'), 'cover.png')})
+        self.assertEqual(resp.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+# tests/test_s3_storage.py
+import io
+import unittest
+from urllib.parse import urlparse
+
+try:
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+from base import AppTestCase
+from app.models import Upload, Submission
+from app.utils.storage import get_storage
+from app.utils.file_handler import save_file
+from app.utils.quota import get_usage
+
+
+def png_bytes(size=(64, 48)):
+    buf = io.BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(buf, 'PNG')
+    return buf.getvalue()
+
+
+@unittest.skipIf(mock_aws is None, '需要安装moto')
+class S3StorageTestCase(AppTestCase):
+    """使用moto模拟的S3存储测试上传、直传登记和删除"""
+
+    config_overrides = {
+        'STORAGE_BACKEND': 's3',
+        'S3_BUCKET': 'homework-test',
+        'S3_REGION': 'us-east-1',
+        'S3_ACCESS_KEY': 'testing',
+        'S3_SECRET_KEY': 'testing',
+        'S3_PRESIGN_ENDPOINT_URL': 'http://localhost:9000',
+        'IMAGE_DERIVATIVES_ON_INGEST': False
+    }
+
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        super().setUp()
+        self.storage = get_storage()
+        self.storage.ensure_bucket()
+
+    def tearDown(self):
+        super().tearDown()
+        self.mock.stop()
+
+    def test_ensure_bucket_is_idempotent(self):
+        self.assertFalse(self.storage.ensure_bucket())
+        self.storage.client.head_bucket(Bucket='homework-test')
+
+    def test_save_file_sets_content_type(self):
+        file = FileStorage(io.BytesIO(png_bytes()), filename='photo.png')
+        info = save_file(file, 'image', owner_id=self.student.id)
+
+        head = self.storage.head(info['path'])
+        self.assertEqual(head['mime_type'], 'image/png')
+        self.assertEqual(head['size'], info['size'])
+
+    def test_presigned_urls_use_public_endpoint(self):
+        put_url = urlparse(self.storage.presigned_put('image/a.png', content_type='image/png'))
+        get_url = urlparse(self.storage.presigned_get('image/a.png'))
+
+        self.assertEqual(put_url.netloc, 'localhost:9000')
+        self.assertEqual(get_url.netloc, 'localhost:9000')
+        self.assertIn('X-Amz-Signature', put_url.query)
+
+    def test_presign_register_and_delete(self):
+        headers = self.auth_headers(self.student)
+        resp = self.client.post('/api/uploads/presign', headers=headers,
+                                json={'filename': 'essay.png', 'file_type': 'image'})
+        self.assertEqual(resp.status_code, 200)
+        ticket = resp.get_json()
+        self.assertEqual(urlparse(ticket['upload_url']).netloc, 'localhost:9000')
+
+        # 模拟浏览器按预签名地址直传
+        content = png_bytes()
+        self.storage.client.put_object(Bucket='homework-test', Key=ticket['path'],
+                                       Body=content, ContentType='image/png')
+
+        resp = self.client.post('/api/submissions/', headers=headers, data={
+            'homework_id': self.homework.id,
+            'essay_image_tokens': ticket['upload_token']
+        })
+        self.assertEqual(resp.status_code, 201, resp.get_data(as_text=True))
+
+        upload = Upload.query.filter_by(path=ticket['path']).one()
+        self.assertEqual(upload.size, len(content))
+        self.assertEqual(upload.owner_id, self.student.id)
+        submission = Submission.query.one()
+        self.assertEqual(submission.content_data['images'][0]['path'], ticket['path'])
+
+        self.assertEqual(get_usage('user', self.student.id), len(content))
+        self.assertEqual(get_usage('course', self.course.id), len(content))
+
+        resp = self.client.delete(f'/api/submissions/{submission.id}', headers=headers)
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(self.storage.exists(ticket['path']))
+        self.assertIsNone(Upload.query.filter_by(path=ticket['path']).first())
+        self.assertEqual(get_usage('user', self.student.id), 0)
+        self.assertEqual(get_usage('course', self.course.id), 0)
+
+    def test_register_checks_actual_size(self):
+        self.app.config['USER_STORAGE_QUOTA'] = 1024
+        headers = self.auth_headers(self.student)
+        # 声明的大小在配额内，实际上传的文件超出配额
+        resp = self.client.post('/api/uploads/presign', headers=headers,
+                                json={'filename': 'essay.png', 'file_type': 'image', 'size': 100})
+        ticket = resp.get_json()
+        self.storage.client.put_object(Bucket='homework-test', Key=ticket['path'],
+                                       Body=b'x' * 4096, ContentType='image/png')
+
+        resp = self.client.post('/api/submissions/', headers=headers, data={
+            'homework_id': self.homework.id,
+            'essay_image_tokens': ticket['upload_token']
+        })
+        self.assertEqual(resp.status_code, 413)
+        self.assertFalse(self.storage.exists(ticket['path']))
+        self.assertEqual(Upload.query.count(), 0)
+        self.assertEqual(get_usage('user', self.student.id), 0)
+
+    def test_idempotent_error_discards_partial_writes(self):
+        headers = self.auth_headers(self.student)
+        ticket = self.client.post('/api/uploads/presign', headers=headers,
+                                  json={'filename': 'essay.png', 'file_type': 'image'}).get_json()
+        self.storage.client.put_object(Bucket='homework-test', Key=ticket['path'],
+                                       Body=png_bytes(), ContentType='image/png')
+
+        # 第一个凭证登记成功后第二个凭证无效，请求整体失败
+        headers['Idempotency-Key'] = 'partial'
+        resp = self.client.post('/api/submissions/', headers=headers, data={
+            'homework_id': self.homework.id,
+            'essay_image_tokens': [ticket['upload_token'], 'invalid']
+        })
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(Upload.query.count(), 0)
+        self.assertEqual(get_usage('user', self.student.id), 0)
+        self.assertEqual(Submission.query.count(), 0)
+
+    def test_retry_after_direct_upload_completes(self):
+        headers = self.auth_headers(self.student)
+        ticket = self.client.post('/api/uploads/presign', headers=headers,
+                                  json={'filename': 'essay.png', 'file_type': 'image'}).get_json()
+        headers['Idempotency-Key'] = 'early'
+        data = {'homework_id': self.homework.id, 'essay_image_tokens': ticket['upload_token']}
+
+        # 直传完成前提交，错误不应被缓存
+        resp = self.client.post('/api/submissions/', headers=headers, data=data)
+        self.assertEqual(resp.status_code, 409)
+
+        self.storage.client.put_object(Bucket='homework-test', Key=ticket['path'],
+                                       Body=png_bytes(), ContentType='image/png')
+        resp = self.client.post('/api/submissions/', headers=headers, data=data)
+        self.assertEqual(resp.status_code, 201, resp.get_data(as_text=True))
+        self.assertIsNone(resp.headers.get('Idempotent-Replayed'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+# tests/test_upload_gc.py
+import os
+import unittest
+from base import AppTestCase
+from app import db
+from app.models import Submission
+from app.utils.storage import get_storage
+from app.utils.upload_gc import collect_garbage
+from app.utils.image_derivatives import derivative_key
+from app.utils.waveform import peaks_key
+
+
+class UploadGcTestCase(AppTestCase):
+
+    def put(self, key):
+        storage = get_storage()
+        with storage.staging(key) as path:
+            with open(path, 'wb') as f:
+                f.write(b'x' * 10)
+        # 超出宽限期
+        os.utime(storage.local_path(key), (0, 0))
+
+    def test_keeps_on_demand_derivatives_and_skips_dotfiles(self):
+        image = 'image/20200101/a.jpg'
+        audio = 'audio/20200101/b.mp3'
+        submission = Submission(homework_id=self.homework.id, student_id=self.student.id)
+        submission.content_data = {'images': [{'path': image}], 'audio': {'path': audio}}
+        db.session.add(submission)
+        db.session.commit()
+
+        kept = [image, derivative_key(image, 'thumb'), audio, peaks_key(audio), '.DS_Store', 'image/.DS_Store']
+        for key in kept + ['image/20200101/orphan.jpg']:
+            self.put(key)
+
+        stats = collect_garbage(grace_seconds=60, dry_run=False, quarantine=False)
+
+        self.assertEqual(stats['orphans'], 1)
+        storage = get_storage()
+        self.assertFalse(storage.exists('image/20200101/orphan.jpg'))
+        for key in kept:
+            self.assertTrue(storage.exists(key), key)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+# tests/test_upload_migration.py
+import os
+import unittest
+from base import AppTestCase
+from app import db
+from app.models import User, Course
+from app.utils.storage import get_storage
+from app.utils.upload_migration import migrate_uploads
+
+AVATAR = 'image/20240101/0123abcd-0000-0000-0000-000000000000.jpg'
+COVER = 'image/45/67/4567abcd-0000-0000-0000-000000000000.png'
+
+
+class UploadMigrationTestCase(AppTestCase):
+
+    def write(self, key):
+        path = os.path.join(self.upload_folder, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'x')
+
+    def test_moves_legacy_avatar_and_cover_to_public(self):
+        storage = get_storage()
+        for key in (AVATAR, COVER):
+            self.write(key)
+        self.student.avatar_url = storage.url(AVATAR)
+        self.course.cover_image = storage.url(COVER)
+        db.session.commit()
+
+        stats = migrate_uploads(depth=2, dry_run=False)
+        self.assertEqual(stats['files'], 2)
+
+        avatar_key = storage.key_from_url(db.session.get(User, self.student.id).avatar_url)
+        cover_key = storage.key_from_url(db.session.get(Course, self.course.id).cover_image)
+        self.assertEqual(avatar_key, 'public/image/01/23/0123abcd-0000-0000-0000-000000000000.jpg')
+        self.assertEqual(cover_key, 'public/' + COVER)
+        for old_key, new_key in ((AVATAR, avatar_key), (COVER, cover_key)):
+            self.assertTrue(storage.exists(new_key))
+            self.assertFalse(storage.exists(old_key))
+
+        # 再次运行时没有需要迁移的文件
+        self.assertEqual(migrate_uploads(depth=2, dry_run=False)['files'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()